@@ -0,0 +1,134 @@
+"""Measure cold-start cost: module import time and the first script render.
+
+Every sample runs in a fresh interpreter, as a new container replica would:
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --repeat 10 --top 15
+
+Import time comes from ``python -X importtime``; the render is timed with
+Streamlit's AppTest, first on a cold process and then on a warm rerun.
+Azure credentials are not needed: nothing contacts a service until the
+first message is sent.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+RENDER_SNIPPET = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({script!r}, default_timeout=120)
+at.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+print(json.dumps({{"first_render_ms": first * 1000, "rerun_ms": rerun * 1000, "exceptions": len(at.exception)}}))
+"""
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, float]]:
+    """Return (module name, cumulative ms) for every line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        entries.append((name, int(cumulative) / 1000))
+    return entries
+
+
+def import_profile(module: str) -> tuple[float, dict[str, float]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        (total import time in ms, cumulative ms per top-level package the
+        module pulls in, excluding what the interpreter loads at startup)
+    """
+    baseline = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"],
+        capture_output=True, text=True, check=True,
+    )
+    startup = {name for name, _ in parse_importtime(baseline.stderr)}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    total = 0.0
+    for name, cumulative_ms in parse_importtime(completed.stderr):
+        if name == module:
+            total = cumulative_ms
+        # A package's own entry includes the submodules it imports
+        if "." not in name and name not in startup:
+            packages[name] = max(packages.get(name, 0.0), cumulative_ms)
+    return total, packages
+
+
+def render_profile(script: str) -> dict:
+    """Run the app once cold and once warm with AppTest in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-c", RENDER_SNIPPET.format(script=script)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="module whose import is measured")
+    parser.add_argument("--script", default="app.py", help="Streamlit script whose render is measured")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="heaviest top-level imports to list")
+    parser.add_argument("--skip-render", action="store_true", help="only measure imports")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    totals = []
+    packages = {}
+    for _ in range(args.repeat):
+        total, per_package = import_profile(args.module)
+        totals.append(total)
+        for name, ms in per_package.items():
+            packages.setdefault(name, []).append(ms)
+
+    results = {
+        "import_ms": {"p50": percentile(totals, 50), "p95": percentile(totals, 95), "max": max(totals)},
+        "heaviest_imports_ms": {
+            name: statistics.median(samples)
+            for name, samples in sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        },
+    }
+
+    print(f"import {args.module}: p50 {results['import_ms']['p50']:.0f} ms, p95 {results['import_ms']['p95']:.0f} ms")
+    print("heaviest top-level imports (median cumulative):")
+    for name, ms in results["heaviest_imports_ms"].items():
+        print(f"  {name:<32}{ms:>8.1f} ms")
+
+    if not args.skip_render:
+        renders = [render_profile(args.script) for _ in range(args.repeat)]
+        first = [r["first_render_ms"] for r in renders]
+        rerun = [r["rerun_ms"] for r in renders]
+        results["first_render_ms"] = {"p50": percentile(first, 50), "p95": percentile(first, 95)}
+        results["rerun_ms"] = {"p50": percentile(rerun, 50), "p95": percentile(rerun, 95)}
+        results["render_exceptions"] = sum(r["exceptions"] for r in renders)
+        print(f"first render: p50 {results['first_render_ms']['p50']:.0f} ms, p95 {results['first_render_ms']['p95']:.0f} ms")
+        print(f"warm rerun:   p50 {results['rerun_ms']['p50']:.0f} ms, p95 {results['rerun_ms']['p95']:.0f} ms")
+        if results["render_exceptions"]:
+            print(f"warning: {results['render_exceptions']} renders raised exceptions")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
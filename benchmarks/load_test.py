@@ -0,0 +1,280 @@
+"""Find how many concurrent chat sessions one app process sustains.
+
+Simulated users drive app.py end to end with Streamlit's AppTest, each in
+its own thread: they upload a test image, send a message, poll the turn's
+background job like the progress fragment does, rerun the script once the
+job has finished, think, and repeat. Azure OpenAI and Vision are replaced by the in-process fakes
+and the upscaler by the local stub server, as in offline_benchmark.py.
+
+The session count is ramped up in steps; sessions of earlier steps keep
+running. Each step reports turn throughput and latency, script run
+(render) latency, process RSS and the marginal RSS per added session (the
+first step's also includes importing the app). The
+ramp stops at the first saturated step: p95 turn latency above the SLO,
+errors above the allowed rate, or per-session throughput below half of
+the first step's. The last step before that is the recommended number of
+sessions per replica.
+
+AppTest keeps its mock runtime in a global, so script runs of different
+sessions are serialized by a lock. On a real server they run in parallel
+threads but share one GIL, so this approximates their CPU contention;
+background jobs and backend calls still overlap freely.
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --sessions 1,5,10,20,40 --step-sec 60 --json load.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.offline_benchmark import (
+    IMAGE_DIR, IMAGES, SCENARIOS_PATH, configure_environment, image_variant, load_smart_crop_results, percentile,
+)
+
+MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+# AppTest installs its mock runtime globally for the duration of a script run
+script_run_lock = threading.Lock()
+
+
+def rss_bytes() -> int:
+    """Return the process's current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def install_fakes(args) -> tuple[dict, object]:
+    """Route the app's OpenAI and Vision clients to the in-process fakes.
+
+    Returns:
+        (Assistants run scenarios by name, the fake Vision client)
+    """
+    from benchmarks.stubs.fake_openai import FakeAsyncOpenAI
+    from benchmarks.stubs.fake_vision import FakeVisionClient
+    from interface import async_conversation, conversation
+    from services import assistant, thread_pool
+    from tools import smart_crop
+
+    with open(SCENARIOS_PATH) as f:
+        scenarios = json.load(f)
+    openai = FakeAsyncOpenAI(
+        scenarios,
+        latency_sec=args.openai_latency,
+        event_latency_sec=args.event_latency,
+        jitter=args.jitter,
+        default_scenario="chat",
+    )
+    sync_openai = openai.sync_client()
+    assistant.get_azure_openai_client = lambda: sync_openai
+    thread_pool.get_azure_openai_client = lambda: sync_openai
+    conversation.get_azure_openai_client = lambda: sync_openai
+    async_conversation.get_async_azure_openai_client = lambda: openai
+
+    vision = FakeVisionClient(latency_sec=args.vision_latency, jitter=args.jitter)
+    smart_crop.get_vision_client = lambda: vision
+    smart_crop.get_async_vision_client = vision.async_client
+    return scenarios, vision
+
+
+class Session(threading.Thread):
+    """One simulated user, running turns through AppTest until stopped."""
+
+    def __init__(self, index: int, args, scenarios: dict, images: dict, vision, smart_crops: dict,
+                 stop: threading.Event, results: list):
+        super().__init__(name=f"session-{index}", daemon=True)
+        self.index = index
+        self.args = args
+        self.scenarios = list(scenarios.items())
+        self.images = images
+        self.vision = vision
+        self.smart_crops = smart_crops
+        self.stop = stop
+        self.results = results  # shared; list.append is atomic
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+        from services.jobs import FINISHED_STATES, get_job_runner
+
+        runner = get_job_runner()
+        at = AppTest.from_file(os.path.abspath(self.args.script), default_timeout=self.args.turn_timeout)
+        self.timed_run(at)
+        turn = 0
+        while not self.stop.is_set():
+            name, scenario = self.scenarios[(self.index + turn) % len(self.scenarios)]
+            image_name = IMAGES[(self.index + turn) % len(IMAGES)]
+            start = time.perf_counter()
+            try:
+                if name != "chat":
+                    variant = image_variant(self.images[image_name], self.index * 100_000 + turn)
+                    # The fake answers with the original's crops instead of analyzing every variant
+                    self.vision.recordings[hashlib.sha256(variant).hexdigest()] = self.smart_crops[image_name]
+                    at.file_uploader[0].upload(image_name, variant, MIME_TYPES[os.path.splitext(image_name)[1]])
+                at.chat_input[0].set_value(scenario["user_message"])
+                start = time.perf_counter()
+                self.timed_run(at)
+                if "active_job_id" in at.session_state:
+                    # The progress fragment only reads the job; the script reruns once it finishes
+                    job_id = at.session_state["active_job_id"]
+                    while (job := runner.get(job_id)) is not None and job["status"] not in FINISHED_STATES:
+                        if time.perf_counter() - start > self.args.turn_timeout:
+                            raise TimeoutError("turn did not finish")
+                        time.sleep(self.args.poll_interval)
+                    self.timed_run(at)
+                reply = at.session_state["messages"][-1]["content"]
+                ok = not at.exception and not reply.startswith(("Something went wrong", "The assistant is busy"))
+            except Exception:
+                ok = False
+            self.results.append(("turn", time.monotonic(), time.perf_counter() - start, ok))
+            turn += 1
+            self.stop.wait(self.args.think_time)
+
+    def timed_run(self, at) -> None:
+        """Run the script once, recording how long the run itself took."""
+        with script_run_lock:
+            start = time.perf_counter()
+            at.run()
+            elapsed = time.perf_counter() - start
+        self.results.append(("render", time.monotonic(), elapsed, not at.exception))
+
+
+def step_report(sessions: int, results: list, start: float, end: float, rss: int, marginal_rss: float) -> dict:
+    """Summarize the turns and renders that finished within a step's window."""
+    turns = [r for r in results if r[0] == "turn" and start <= r[1] < end]
+    renders = [r[2] for r in results if r[0] == "render" and start <= r[1] < end]
+    latencies = [r[2] for r in turns if r[3]] or [0.0]
+    errors = sum(not r[3] for r in turns)
+    return {
+        "sessions": sessions,
+        "turns": len(turns),
+        "errors": errors,
+        "error_rate": errors / len(turns) if turns else 0.0,
+        "turns_per_sec": len(turns) / (end - start),
+        "turn_sec": {f"p{pct}": percentile(latencies, pct) for pct in (50, 95, 99)},
+        "render_ms": {f"p{pct}": percentile(renders or [0.0], pct) * 1000 for pct in (50, 95, 99)},
+        "rss_mb": rss / 2 ** 20,
+        "marginal_rss_mb_per_session": marginal_rss / 2 ** 20,
+    }
+
+
+def saturated(step: dict, first: dict, args) -> str | None:
+    """Return why a step counts as saturated, or None."""
+    if step["turns"] == 0:
+        return "no turns completed"
+    if step["turn_sec"]["p95"] > args.slo_p95:
+        return f"p95 turn latency {step['turn_sec']['p95']:.1f} s above the {args.slo_p95:.1f} s SLO"
+    if step["error_rate"] > args.max_error_rate:
+        return f"error rate {step['error_rate']:.1%} above {args.max_error_rate:.1%}"
+    per_session = step["turns_per_sec"] / step["sessions"]
+    baseline = first["turns_per_sec"] / first["sessions"]
+    if per_session < baseline / 2:
+        return f"throughput per session fell to {per_session / baseline:.0%} of a single session's"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="app.py", help="Streamlit script the sessions run")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="comma-separated session counts to ramp through")
+    parser.add_argument("--step-sec", type=float, default=30.0, help="measurement window per step")
+    parser.add_argument("--think-time", type=float, default=2.0, help="pause between a reply and the next message")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="job polling interval while a turn runs, like the progress fragment")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="seconds before a turn counts as failed")
+    parser.add_argument("--slo-p95", type=float, default=10.0, help="p95 turn latency, in seconds, that marks saturation")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="error rate that marks saturation")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="seconds per OpenAI call")
+    parser.add_argument("--event-latency", type=float, default=0.02, help="seconds between streamed run events")
+    parser.add_argument("--vision-latency", type=float, default=0.3, help="seconds per Vision analyze call")
+    parser.add_argument("--upscaler-latency", type=float, default=0.3, help="seconds per upscaler request")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency jitter (0.2 = +/-20%%)")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the configured OpenAI/Vision rate limits")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    steps = [int(n) for n in args.sessions.split(",")]
+
+    from benchmarks.stubs.upscaler_server import start_server
+
+    server, _ = start_server(latency_sec=args.upscaler_latency, jitter_sec=args.upscaler_latency * args.jitter)
+    work_dir = tempfile.mkdtemp(prefix="vision-bot-load-")
+    configure_environment(args, work_dir, f"http://127.0.0.1:{server.server_address[1]}/upscale")
+    # Streamlit logs bare-mode and deprecation warnings on every simulated script run
+    for name in ("streamlit.runtime.scriptrunner_utils.script_run_context", "streamlit.deprecation_util"):
+        logging.getLogger(name).disabled = True
+
+    scenarios, vision = install_fakes(args)
+    smart_crops = load_smart_crop_results()
+    images = {}
+    for name in IMAGES:
+        with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+            images[name] = f.read()
+
+    stop = threading.Event()
+    results = []
+    sessions = []
+    report = []
+    recommended = None
+    reason = None
+    rss_before = rss_bytes()
+    try:
+        for target in steps:
+            while len(sessions) < target:
+                session = Session(len(sessions), args, scenarios, images, vision, smart_crops, stop, results)
+                session.start()
+                sessions.append(session)
+            start = time.monotonic()
+            time.sleep(args.step_sec)
+            end = time.monotonic()
+
+            rss = rss_bytes()
+            added = target - (report[-1]["sessions"] if report else 0)
+            marginal = (rss - rss_before) / added if added else 0.0
+            rss_before = rss
+            step = step_report(target, results, start, end, rss, marginal)
+            report.append(step)
+            print(
+                f"{target:>4} sessions: {step['turns_per_sec']:6.2f} turns/s, "
+                f"turn p50 {step['turn_sec']['p50']:5.1f} s p95 {step['turn_sec']['p95']:5.1f} s, "
+                f"render p95 {step['render_ms']['p95']:6.0f} ms, errors {step['errors']}, "
+                f"RSS {step['rss_mb']:6.0f} MB (+{step['marginal_rss_mb_per_session']:.1f} MB/session)",
+                flush=True,
+            )
+            reason = saturated(step, report[0], args)
+            if reason:
+                break
+            recommended = target
+    finally:
+        stop.set()
+        for session in sessions:
+            session.join(timeout=args.turn_timeout)
+        server.shutdown()
+
+    if reason:
+        print(f"saturated at {report[-1]['sessions']} sessions: {reason}")
+    else:
+        print(f"not saturated at {steps[-1]} sessions; ramp further to find the limit")
+    print(f"recommended sessions per replica: {recommended if recommended is not None else 'fewer than ' + str(steps[0])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "settings": {k: v for k, v in vars(args).items() if k != "json"},
+                "steps": report,
+                "saturated_at": report[-1]["sessions"] if reason else None,
+                "saturation_reason": reason,
+                "recommended_sessions_per_replica": recommended,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""Benchmark conversation turns and image tools offline, against local stand-ins.
+
+Azure OpenAI and Azure Vision are replaced by in-process fakes and the
+upscaler by the local stub server, each with injected latency, so the
+numbers measure the app's own overhead on top of a known backend latency:
+
+    python -m benchmarks.offline_benchmark
+    python -m benchmarks.offline_benchmark --iterations 50 --openai-latency 0.2
+    python -m benchmarks.offline_benchmark --save-baseline
+
+Turns replay the recorded Assistants run sequences in
+benchmarks/data/assistant_runs.json through run_conversation_async, the
+pipeline chat jobs run. Smart crops come from
+benchmarks/data/vision_smart_crops.json when it has been recorded (see
+smart_crop_benchmark.py), otherwise from the local saliency engine.
+
+Every sample is split into stages: "openai", "vision" and "upscaler" are
+time spent waiting on a backend, "tools" is tool execution within a turn,
+and "local" is everything else. Backend stages count the latency the
+stand-ins inject, not the client calls around it, so the app's retries,
+tiling and decoding stay in "local". Each iteration uses a slightly altered copy
+of a test image, so no result is served from a cache.
+
+Results are compared with benchmarks/baselines/offline.json when it exists,
+and the command exits with status 1 if a median or p95 regressed by more
+than the tolerance.
+"""
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+IMAGE_DIR = "test_images"
+IMAGES = ["tennis.jpg", "low_res.jpg", "presentation.png"]
+SCENARIOS_PATH = os.path.join("benchmarks", "data", "assistant_runs.json")
+RECORDINGS_PATH = os.path.join("benchmarks", "data", "vision_smart_crops.json")
+BASELINE_PATH = os.path.join("benchmarks", "baselines", "offline.json")
+SMART_CROP_RATIOS = [0.75, 0.9, 1.0, 1.33, 1.78]
+
+# Stage times of the sample being measured; shared with tasks and worker threads
+current_sample = contextvars.ContextVar("current_sample", default=None)
+
+
+# The same sample, for the upscaler stub, which reports its delays from its own
+# request threads; benchmarks run one sample at a time
+measured_sample = None
+_upscaler_lock = threading.Lock()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    sample = current_sample.get()
+    if sample is not None:
+        sample[stage] = sample.get(stage, 0.0) + seconds
+
+
+def record_upscaler_latency(seconds: float) -> None:
+    """Count a delay the upscaler stub injects towards the measured sample's "upscaler" stage.
+
+    Concurrent requests, such as the tiles of one image, count the time any
+    of them is waiting once.
+    """
+    now = time.perf_counter()
+    with _upscaler_lock:
+        sample = measured_sample
+        if sample is None:
+            return
+        busy_until = sample.pop("_upscaler_busy_until", now)
+        sample["upscaler"] = sample.get("upscaler", 0.0) + max(0.0, now + seconds - max(now, busy_until))
+        sample["_upscaler_busy_until"] = max(busy_until, now + seconds)
+
+
+def timed(fn, stage: str):
+    """Wrap a function or coroutine function so its wall time counts towards a stage."""
+    if asyncio.iscoroutinefunction(fn):
+        async def timed_async(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - start)
+        return timed_async
+
+    def timed_sync(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record_stage(stage, time.perf_counter() - start)
+    return timed_sync
+
+
+async def measure(coro_fn, *args, outer_stages: tuple[str, ...]) -> tuple[object, dict]:
+    """Await coro_fn(*args) and return its result with the sample's stage times in seconds.
+
+    "local" is the total minus the outer stages, which must not overlap.
+    """
+    global measured_sample
+    sample = {}
+    token = current_sample.set(sample)
+    measured_sample = sample
+    start = time.perf_counter()
+    try:
+        result = await coro_fn(*args)
+    finally:
+        current_sample.reset(token)
+        with _upscaler_lock:
+            measured_sample = None
+            sample.pop("_upscaler_busy_until", None)
+    sample["total"] = time.perf_counter() - start
+    sample["local"] = max(0.0, sample["total"] - sum(sample.get(stage, 0.0) for stage in outer_stages))
+    return result, sample
+
+
+def configure_environment(args, work_dir: str, upscaler_url: str) -> None:
+    """Point the app's settings at the stand-ins; must run before app modules are imported."""
+    os.environ["BLOB_STORE_DIR"] = os.path.join(work_dir, "blobs")
+    os.environ["UPSCALE_CACHE_DIR"] = os.path.join(work_dir, "upscales")
+    os.environ["UPSCALER_ENDPOINT"] = upscaler_url
+    os.environ["SMART_CROP_BACKEND"] = "azure"
+    # Only the job engine's async clients are faked end to end; a RUN_MODE from the shell would bypass them
+    os.environ["RUN_MODE"] = "job"
+    if not args.rate_limit:
+        # The fakes are not rate limited; keep the token buckets from pacing the benchmark
+        for name in ("OPENAI_RATE_LIMIT_RPS", "OPENAI_RATE_LIMIT_BURST", "VISION_RATE_LIMIT_RPS", "VISION_RATE_LIMIT_BURST"):
+            os.environ[name] = "1000000"
+
+
+def image_variant(image_bytes: bytes, iteration: int) -> bytes:
+    """Return a copy of an image with one pixel changed, so it gets a new blob reference."""
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes))
+    image_format = image.format
+    image = image.convert("RGB")
+    image.putpixel((0, 0), (iteration % 256, iteration // 256 % 256, 128))
+    output = BytesIO()
+    image.save(output, format=image_format, **({"quality": 95} if image_format == "JPEG" else {}))
+    return output.getvalue()
+
+
+def load_smart_crop_results() -> dict:
+    """Return a smart crop result per test image: recorded by Vision if available, else local."""
+    from tools.saliency_crop import local_smart_crops
+
+    recorded = {}
+    if os.path.exists(RECORDINGS_PATH):
+        with open(RECORDINGS_PATH) as f:
+            recorded = json.load(f).get("images", {})
+
+    results = {}
+    for name in IMAGES:
+        if name in recorded:
+            results[name] = recorded[name]["result"]
+        else:
+            with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+                results[name] = local_smart_crops(f.read(), SMART_CROP_RATIOS)
+    return results
+
+
+async def run_benchmarks(args) -> tuple[dict, dict]:
+    """Run every benchmark and return (samples per benchmark, error count per benchmark)."""
+    from benchmarks.stubs.fake_openai import FakeAsyncOpenAI
+    from benchmarks.stubs.fake_vision import FakeVisionClient
+    from interface import async_conversation
+    from interface.async_conversation import call_tool_async, run_conversation_async
+    from services.async_http import close_aiohttp_session
+    from services.blob_store import put_blob
+    from tools import smart_crop
+
+    # Tools run outside a Streamlit session here, which Streamlit warns about on every call
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+    with open(SCENARIOS_PATH) as f:
+        scenarios = json.load(f)
+
+    openai = FakeAsyncOpenAI(
+        scenarios,
+        latency_sec=args.openai_latency,
+        event_latency_sec=args.event_latency,
+        jitter=args.jitter,
+        on_latency=lambda seconds: record_stage("openai", seconds),
+    )
+    vision = FakeVisionClient(
+        latency_sec=args.vision_latency,
+        jitter=args.jitter,
+        on_latency=lambda seconds: record_stage("vision", seconds),
+    )
+    smart_crop.async_vision_clients[asyncio.get_running_loop()] = vision.async_client()
+
+    async_conversation.execute_tool_calls_async = timed(async_conversation.execute_tool_calls_async, "tools")
+
+    smart_crops = load_smart_crop_results()
+    originals = {}
+    for name in IMAGES:
+        with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+            originals[name] = f.read()
+
+    def next_image(iteration: int) -> str:
+        """Store a fresh variant of the next test image and return its reference."""
+        name = IMAGES[iteration % len(IMAGES)]
+        variant = image_variant(originals[name], iteration)
+        vision.recordings[hashlib.sha256(variant).hexdigest()] = smart_crops[name]
+        return put_blob(variant)
+
+    tool_calls = {
+        "crop_image": json.dumps({"x": 0, "y": 0, "width": 100, "height": 100}),
+        "smart_crop_image": json.dumps({}),
+        "upscale_image": json.dumps({"scale": 2}),
+    }
+
+    async def run_tool(func_name: str, image_ref: str):
+        result = await call_tool_async(func_name, tool_calls[func_name], image_ref)
+        return not result.is_error
+
+    async def run_turn(scenario: str, image_ref: str):
+        thread = await openai.beta.threads.create()
+        openai.use_scenario(thread.id, scenario)
+        result = await run_conversation_async(
+            openai, thread.id, "asst_offline", scenarios[scenario]["user_message"], image_ref=image_ref,
+        )
+        return not any("error" in str(value).lower() for value in result.values())
+
+    benchmarks = [(name, run_tool, name, ("vision", "upscaler")) for name in tool_calls]
+    benchmarks += [
+        (f"run_conversation[{scenario}]", run_turn, scenario, ("openai", "tools"))
+        for scenario in scenarios
+    ]
+
+    samples = {}
+    errors = {}
+    iteration = 0
+    try:
+        for label, fn, arg, outer_stages in benchmarks:
+            samples[label] = []
+            errors[label] = 0
+            for i in range(args.warmup + args.iterations):
+                image_ref = next_image(iteration)
+                iteration += 1
+                ok, sample = await measure(fn, arg, image_ref, outer_stages=outer_stages)
+                if i < args.warmup:
+                    continue
+                samples[label].append(sample)
+                errors[label] += not ok
+    finally:
+        await close_aiohttp_session()
+    return samples, errors
+
+
+def summarize(samples: dict) -> dict:
+    """Return p50/p95/p99 in ms per benchmark and stage."""
+    summary = {}
+    for label, runs in samples.items():
+        stages = sorted({stage for run in runs for stage in run}, key=lambda s: (s == "total", s))
+        summary[label] = {
+            stage: {
+                f"p{pct}": round(percentile([run.get(stage, 0.0) for run in runs], pct) * 1000, 2)
+                for pct in (50, 95, 99)
+            }
+            for stage in stages
+        }
+    return summary
+
+
+def compare(summary: dict, baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    """Return a description of every total p50/p95 that regressed beyond the tolerance."""
+    regressions = []
+    for label, stages in summary.items():
+        previous = baseline.get(label, {}).get("total")
+        if previous is None:
+            continue
+        for pct in ("p50", "p95"):
+            limit = previous[pct] * (1 + tolerance) + slack_ms
+            if stages["total"][pct] > limit:
+                regressions.append(
+                    f"{label} {pct}: {stages['total'][pct]:.1f} ms (baseline {previous[pct]:.1f} ms, limit {limit:.1f} ms)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="measured runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured runs per benchmark")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="seconds per OpenAI call")
+    parser.add_argument("--event-latency", type=float, default=0.02, help="seconds between streamed run events")
+    parser.add_argument("--vision-latency", type=float, default=0.3, help="seconds per Vision analyze call")
+    parser.add_argument("--upscaler-latency", type=float, default=0.3, help="seconds per upscaler request")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency jitter (0.2 = +/-20%%)")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the configured OpenAI/Vision rate limits")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression of p50/p95")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute regression on top of the tolerance")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    from benchmarks.stubs.upscaler_server import start_server
+
+    server, _ = start_server(
+        latency_sec=args.upscaler_latency,
+        jitter_sec=args.upscaler_latency * args.jitter,
+        on_latency=record_upscaler_latency,
+    )
+    work_dir = tempfile.mkdtemp(prefix="vision-bot-bench-")
+    configure_environment(args, work_dir, f"http://127.0.0.1:{server.server_address[1]}/upscale")
+
+    try:
+        samples, errors = asyncio.run(run_benchmarks(args))
+    finally:
+        server.shutdown()
+
+    summary = summarize(samples)
+    settings = {
+        "iterations": args.iterations,
+        "openai_latency_sec": args.openai_latency,
+        "event_latency_sec": args.event_latency,
+        "vision_latency_sec": args.vision_latency,
+        "upscaler_latency_sec": args.upscaler_latency,
+        "jitter": args.jitter,
+        "rate_limit": args.rate_limit,
+    }
+
+    print(f"{'benchmark':<40}{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, stages in summary.items():
+        for stage, values in stages.items():
+            print(f"{label:<40}{stage:<10}{values['p50']:>10.1f}{values['p95']:>10.1f}{values['p99']:>10.1f}")
+        if errors[label]:
+            print(f"{label:<40}warning: {errors[label]} of {args.iterations} runs returned an error")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "results": summary, "errors": errors}, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings, "results": summary}, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print("warning: baseline was recorded with different settings; comparing anyway")
+    regressions = compare(summary, baseline["results"], args.tolerance, args.slack_ms)
+    if regressions:
+        print("regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Summarize the rerun profiler's log and point out the costliest sessions.
+
+Run the app with RERUN_PROFILE=true (see interface/profiler.py), use it or
+drive it with load_test.py, then:
+
+    python -m benchmarks.rerun_report
+    python -m benchmarks.rerun_report /tmp/vision-bot-reruns.jsonl --top 20 --slow-ms 300
+
+The report shows p50/p95 rerun time and bytes per render section overall,
+then the sessions with the slowest p95 full reruns. For each one it gives
+the growth of rerun time and bytes per history message, estimated by a
+least-squares fit over the session's full reruns. A session is flagged when
+its p95 exceeds --slow-ms, or when its projected rerun time at 100 history
+messages does.
+"""
+import argparse
+import json
+from collections import defaultdict
+
+from benchmarks.offline_benchmark import percentile
+from config.settings import Config
+
+
+def slope(points: list[tuple[float, float]]) -> float:
+    """Least-squares slope of y over x, 0 when x does not vary."""
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def load_records(path: str) -> list[dict]:
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def session_summary(session_id: str, records: list[dict]) -> dict:
+    """Describe one session's rerun cost and how it grows with its history."""
+    full = [r for r in records if r["kind"] == "script"] or records
+    times = [r["total_ms"] for r in full]
+    sizes = [r["forward_msg_bytes"] + r["media_bytes"] for r in full]
+    history = [(r.get("history_messages", 0), r["total_ms"]) for r in full]
+    history_bytes = [(r.get("history_messages", 0), r["forward_msg_bytes"] + r["media_bytes"]) for r in full]
+    ms_per_message = slope(history)
+    return {
+        "session_id": session_id,
+        "reruns": len(records),
+        "full_reruns": len(full),
+        "p50_ms": percentile(times, 50),
+        "p95_ms": percentile(times, 95),
+        "max_ms": max(times),
+        "p95_bytes": percentile(sizes, 95),
+        "history_messages": max(x for x, _ in history),
+        "history_images": max(r.get("history_images", 0) for r in full),
+        "ms_per_message": ms_per_message,
+        "bytes_per_message": slope(history_bytes),
+        "projected_ms_at_100": percentile(times, 50) + ms_per_message * (100 - history[len(history) // 2][0]),
+        "total_ms": records[-1]["session_total_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", default=Config.RERUN_PROFILE_LOG, help="rerun profile log (JSON lines)")
+    parser.add_argument("--top", type=int, default=10, help="sessions to list")
+    parser.add_argument("--slow-ms", type=float, default=500.0, help="full rerun time that flags a session")
+    args = parser.parse_args()
+
+    records = load_records(args.log)
+    if not records:
+        print("no reruns logged")
+        return
+    sessions = defaultdict(list)
+    sections = defaultdict(list)
+    for record in records:
+        sessions[record["session_id"]].append(record)
+        for name, ms in record["sections_ms"].items():
+            sections[name].append(ms)
+    full = [r for r in records if r["kind"] == "script"]
+
+    print(f"{len(records)} reruns ({len(full)} full) across {len(sessions)} sessions")
+    print(f"{'section':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, values in sorted(sections.items()):
+        print(f"{name:<28}{len(values):>8}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}")
+    if full:
+        totals = [r["total_ms"] for r in full]
+        sizes = [r["forward_msg_bytes"] + r["media_bytes"] for r in full]
+        print(f"{'full rerun':<28}{len(full):>8}{percentile(totals, 50):>10.1f}{percentile(totals, 95):>10.1f}")
+        print(f"bytes per full rerun: p50 {percentile(sizes, 50):,.0f}, p95 {percentile(sizes, 95):,.0f}")
+
+    summaries = sorted(
+        (session_summary(session_id, rs) for session_id, rs in sessions.items()),
+        key=lambda s: s["p95_ms"],
+        reverse=True,
+    )
+    print()
+    print(f"{'session':<38}{'reruns':>7}{'p50 ms':>9}{'p95 ms':>9}{'p95 KB':>9}{'msgs':>6}{'imgs':>6}"
+          f"{'ms/msg':>8}{'KB/msg':>8}")
+    for s in summaries[:args.top]:
+        flagged = s["p95_ms"] > args.slow_ms or s["projected_ms_at_100"] > args.slow_ms
+        print(
+            f"{s['session_id']:<38}{s['reruns']:>7}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p95_bytes'] / 1024:>9.1f}"
+            f"{s['history_messages']:>6}{s['history_images']:>6}{s['ms_per_message']:>8.2f}"
+            f"{s['bytes_per_message'] / 1024:>8.1f}{'  <- slow' if flagged else ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Compare the local saliency smart-crop engine with recorded Azure Vision results.
+
+Record Vision results once (requires VISION_STUDIO_ENDPOINT and VISION_STUDIO_KEY):
+
+    python -m benchmarks.smart_crop_benchmark --record
+
+Then compare latency and crop overlap (IoU) offline:
+
+    python -m benchmarks.smart_crop_benchmark
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from tools.saliency_crop import local_smart_crops
+
+IMAGE_DIR = "test_images"
+RECORDINGS_PATH = os.path.join("benchmarks", "data", "vision_smart_crops.json")
+DEFAULT_RATIOS = [0.75, 0.9, 1.0, 1.33, 1.78]
+
+
+def list_images(image_dir: str) -> list[str]:
+    return sorted(
+        name for name in os.listdir(image_dir)
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".gif"))
+    )
+
+
+def iou(a: dict, b: dict) -> float:
+    """Intersection over union of two {"x", "y", "w", "h"} boxes."""
+    ix = max(0, min(a["x"] + a["w"], b["x"] + b["w"]) - max(a["x"], b["x"]))
+    iy = max(0, min(a["y"] + a["h"], b["y"] + b["h"]) - max(a["y"], b["y"]))
+    intersection = ix * iy
+    union = a["w"] * a["h"] + b["w"] * b["h"] - intersection
+    return intersection / union if union else 0.0
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def record(image_dir: str, ratios: list[float], path: str) -> None:
+    """Call Azure Vision for every image and save the results with their latency."""
+    from tools.smart_crop import analyze_smart_crops
+
+    recordings = {"ratios": ratios, "images": {}}
+    for name in list_images(image_dir):
+        with open(os.path.join(image_dir, name), "rb") as f:
+            image_bytes = f.read()
+        start = time.perf_counter()
+        result = analyze_smart_crops(image_bytes, ratios)
+        latency_ms = (time.perf_counter() - start) * 1000
+        recordings["images"][name] = {"latency_ms": latency_ms, "result": result}
+        print(f"recorded {name} in {latency_ms:.0f} ms")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(recordings, f, indent=2)
+    print(f"saved {len(recordings['images'])} recordings to {path}")
+
+
+def compare(image_dir: str, ratios: list[float], path: str, repeat: int) -> None:
+    """Time the local engine and compare its crops with the recordings."""
+    recordings = None
+    if os.path.exists(path):
+        with open(path) as f:
+            recordings = json.load(f)
+        ratios = recordings["ratios"]
+    else:
+        print(f"no recordings at {path}; reporting local latency only (run with --record)")
+
+    print(f"{'image':<24}{'local p50':>11}{'local p95':>11}{'vision':>10}{'mean IoU':>10}")
+    all_ious = []
+    for name in list_images(image_dir):
+        with open(os.path.join(image_dir, name), "rb") as f:
+            image_bytes = f.read()
+
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = local_smart_crops(image_bytes, ratios)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        vision_ms = "-"
+        mean_iou = "-"
+        recorded = (recordings or {}).get("images", {}).get(name)
+        if recorded is not None:
+            vision_ms = f"{recorded['latency_ms']:.0f} ms"
+            ious = [
+                iou(local["bounding_box"], remote["bounding_box"])
+                for local, remote in zip(result["smart_crops"], recorded["result"]["smart_crops"])
+            ]
+            all_ious.extend(ious)
+            mean_iou = f"{statistics.mean(ious):.2f}" if ious else "-"
+
+        print(f"{name:<24}{percentile(latencies, 50):>8.1f} ms{percentile(latencies, 95):>8.1f} ms{vision_ms:>10}{mean_iou:>10}")
+
+    if all_ious:
+        print(f"overall mean IoU: {statistics.mean(all_ious):.3f} over {len(all_ious)} crops")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="record Azure Vision results instead of comparing")
+    parser.add_argument("--images", default=IMAGE_DIR, help="directory of images to benchmark")
+    parser.add_argument("--recordings", default=RECORDINGS_PATH, help="path of the recorded Vision results")
+    parser.add_argument("--ratios", type=float, nargs="+", default=DEFAULT_RATIOS, help="aspect ratios to request")
+    parser.add_argument("--repeat", type=int, default=10, help="local engine runs per image")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.images, args.ratios, args.recordings)
+    else:
+        compare(args.images, args.ratios, args.recordings, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
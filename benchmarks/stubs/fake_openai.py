@@ -0,0 +1,249 @@
+"""In-process stand-in for the async Azure OpenAI Assistants client.
+
+Replays recorded run sequences instead of calling a model. A scenario is a
+list of phases; each phase is streamed as run events and ends either with
+the run requiring tool calls or with an assistant message and completion:
+
+    "upscale": {"user_message": "Upscale this image", "phases": [
+        {"statuses": ["queued", "in_progress"],
+         "tool_calls": [{"name": "upscale_image", "arguments": {"scale": 2}}]},
+        {"statuses": ["in_progress"], "message": "Done! Here is the 2x image."}
+    ]}
+
+Scenarios are read from benchmarks/data/assistant_runs.json. A run replays
+the scenario chosen for its thread with use_scenario(), else the one whose
+user_message matches the thread's latest user message, else the default.
+
+Only the calls made by interface/async_conversation.py are implemented,
+plus, through sync_client(), the sync calls that set up the shared
+assistant and the thread pool. Every call waits for the configured latency
+first, and events are spaced by event_latency_sec, so the time spent "in
+OpenAI" is known exactly.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from types import SimpleNamespace
+
+
+def jittered(latency_sec: float, jitter: float) -> float:
+    return max(0.0, latency_sec * (1 + random.uniform(-jitter, jitter)))
+
+
+class FakeAsyncStream:
+    """Async iterator over (delay, event) pairs, usable as an async context manager."""
+
+    def __init__(self, events: list, on_wait):
+        self._events = events
+        self._on_wait = on_wait
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for delay, event in self._events:
+            await self._on_wait(delay)
+            yield event
+
+
+class FakeAsyncOpenAI:
+    """Replays one scenario per thread with injected latency.
+
+    Args:
+        scenarios: Scenario dicts by name
+        latency_sec: Latency of each API call and of the first streamed event
+        event_latency_sec: Delay between streamed run events
+        delta_chunks: Number of message.delta events a message is split into
+        jitter: Relative jitter applied to every delay (0.2 = +/-20%)
+        on_latency: Optional callback receiving every injected delay in seconds
+        default_scenario: Scenario replayed when no other one applies
+    """
+
+    def __init__(self, scenarios: dict, latency_sec: float = 0.05, event_latency_sec: float = 0.02,
+                 delta_chunks: int = 8, jitter: float = 0.2, on_latency=None, default_scenario: str = None):
+        self._scenarios = scenarios
+        self._default_scenario = default_scenario
+        self._latency_sec = latency_sec
+        self._event_latency_sec = event_latency_sec
+        self._delta_chunks = delta_chunks
+        self._jitter = jitter
+        self._on_latency = on_latency
+        self._ids = itertools.count(1)
+        self._thread_scenarios = {}  # thread ID -> scenario name
+        self._runs = {}  # run ID -> {"thread_id", "phase", "status"}
+        self._messages = {}  # thread ID -> list of message objects, newest first
+
+        threads = SimpleNamespace(
+            create=self._create_thread,
+            messages=SimpleNamespace(create=self._create_message, list=self._list_messages),
+            runs=SimpleNamespace(
+                create=self._create_run,
+                submit_tool_outputs=self._submit_tool_outputs,
+                retrieve=self._retrieve_run,
+                cancel=self._cancel_run,
+            ),
+        )
+        self.beta = SimpleNamespace(threads=threads)
+
+    def use_scenario(self, thread_id: str, name: str) -> None:
+        """Choose the scenario replayed by the next runs on a thread."""
+        self._thread_scenarios[thread_id] = name
+
+    def sync_client(self):
+        """Return a sync client sharing this fake's threads, for assistant and thread setup."""
+        def wait():
+            time.sleep(self._jittered_latency(self._latency_sec))
+
+        def create_thread(**kwargs):
+            wait()
+            thread_id = self._new_id("thread")
+            self._messages[thread_id] = []
+            return SimpleNamespace(id=thread_id)
+
+        def delete_thread(thread_id: str, **kwargs):
+            wait()
+            self._messages.pop(thread_id, None)
+
+        def list_assistants(**kwargs):
+            wait()
+            return []
+
+        def create_assistant(**kwargs):
+            wait()
+            return SimpleNamespace(id=self._new_id("asst"), **kwargs)
+
+        def update_assistant(assistant_id: str, **kwargs):
+            wait()
+            return SimpleNamespace(id=assistant_id, **kwargs)
+
+        return SimpleNamespace(beta=SimpleNamespace(
+            assistants=SimpleNamespace(list=list_assistants, create=create_assistant, update=update_assistant),
+            threads=SimpleNamespace(create=create_thread, delete=delete_thread),
+        ))
+
+    async def close(self) -> None:
+        pass
+
+    def _jittered_latency(self, delay: float) -> float:
+        delay = jittered(delay, self._jitter)
+        if self._on_latency:
+            self._on_latency(delay)
+        return delay
+
+    async def _wait(self, delay: float) -> None:
+        await asyncio.sleep(self._jittered_latency(delay))
+
+    def _scenario_for(self, thread_id: str) -> dict:
+        name = self._thread_scenarios.get(thread_id)
+        if name is None:
+            latest = next((m for m in self._messages.get(thread_id, []) if m.role == "user"), None)
+            text = latest.content[0].text.value if latest else None
+            name = next((n for n, s in self._scenarios.items() if s.get("user_message") == text), self._default_scenario)
+        return self._scenarios[name]
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids):06d}"
+
+    async def _create_thread(self, **kwargs):
+        await self._wait(self._latency_sec)
+        thread_id = self._new_id("thread")
+        self._messages[thread_id] = []
+        return SimpleNamespace(id=thread_id)
+
+    async def _create_message(self, thread_id: str, role: str, content, **kwargs):
+        await self._wait(self._latency_sec)
+        message = self._message(thread_id, role, content[0]["text"] if isinstance(content, list) else content)
+        self._messages.setdefault(thread_id, []).insert(0, message)
+        return message
+
+    async def _list_messages(self, thread_id: str, **kwargs):
+        await self._wait(self._latency_sec)
+        return SimpleNamespace(data=list(self._messages.get(thread_id, [])))
+
+    async def _create_run(self, thread_id: str, assistant_id: str, stream: bool = False, **kwargs):
+        await self._wait(self._latency_sec)
+        run_id = self._new_id("run")
+        self._runs[run_id] = {"thread_id": thread_id, "phase": 0, "status": "queued"}
+        return FakeAsyncStream(self._phase_events(run_id, first=True), self._wait)
+
+    async def _submit_tool_outputs(self, thread_id: str, run_id: str, tool_outputs: list, stream: bool = False, **kwargs):
+        await self._wait(self._latency_sec)
+        run = self._runs[run_id]
+        if run["status"] != "requires_action":
+            raise RuntimeError(f"Run {run_id} is not waiting for tool outputs")
+        run["phase"] += 1
+        return FakeAsyncStream(self._phase_events(run_id, first=False), self._wait)
+
+    async def _retrieve_run(self, thread_id: str, run_id: str, **kwargs):
+        await self._wait(self._latency_sec)
+        return self._run_object(run_id)
+
+    async def _cancel_run(self, thread_id: str, run_id: str, **kwargs):
+        await self._wait(self._latency_sec)
+        self._runs[run_id]["status"] = "cancelled"
+        return self._run_object(run_id)
+
+    def _phase_events(self, run_id: str, first: bool) -> list:
+        """Build the (delay, event) pairs of the run's current phase."""
+        run = self._runs[run_id]
+        scenario = self._scenario_for(run["thread_id"])
+        phase = scenario["phases"][run["phase"]]
+        events = []
+
+        def emit(event_name, data, delay=self._event_latency_sec):
+            events.append((delay, SimpleNamespace(event=event_name, data=data)))
+
+        if first:
+            emit("thread.run.created", self._run_object(run_id, "queued"), delay=0)
+        for status in phase.get("statuses", []):
+            emit(f"thread.run.{status}", self._run_object(run_id, status))
+
+        if phase.get("tool_calls"):
+            tool_calls = [
+                SimpleNamespace(
+                    id=self._new_id("call"),
+                    type="function",
+                    function=SimpleNamespace(name=call["name"], arguments=json.dumps(call.get("arguments", {}))),
+                )
+                for call in phase["tool_calls"]
+            ]
+            run["status"] = "requires_action"
+            emit("thread.run.requires_action", self._run_object(run_id, "requires_action", tool_calls))
+            return events
+
+        text = phase.get("message", "")
+        message = self._message(run["thread_id"], "assistant", text)
+        self._messages.setdefault(run["thread_id"], []).insert(0, message)
+        emit("thread.message.created", message)
+        size = max(1, -(-len(text) // self._delta_chunks))
+        for start in range(0, len(text), size):
+            part = SimpleNamespace(type="text", text=SimpleNamespace(value=text[start:start + size]))
+            emit("thread.message.delta", SimpleNamespace(delta=SimpleNamespace(content=[part])))
+        run["status"] = "completed"
+        emit("thread.run.completed", self._run_object(run_id, "completed"))
+        return events
+
+    def _run_object(self, run_id: str, status: str = None, tool_calls: list = None):
+        run = self._runs[run_id]
+        if status is not None:
+            run["status"] = status
+        required_action = None
+        if tool_calls is not None:
+            required_action = SimpleNamespace(submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls))
+        return SimpleNamespace(id=run_id, status=run["status"], required_action=required_action, last_error=None)
+
+    def _message(self, thread_id: str, role: str, text: str):
+        return SimpleNamespace(
+            id=self._new_id("msg"),
+            thread_id=thread_id,
+            role=role,
+            content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))],
+        )
@@ -0,0 +1,75 @@
+"""In-process stand-in for the Azure Vision ImageAnalysisClient (sync and async).
+
+analyze() answers smart-crop requests with a recorded Vision result for the
+image when one is known (see benchmarks/smart_crop_benchmark.py --record),
+and otherwise with the local saliency engine's crops, after an injected
+latency. Results have the attribute layout tools.smart_crop reads from an
+ImageAnalysisResult.
+"""
+import asyncio
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+
+from tools.saliency_crop import local_smart_crops
+
+
+def result_from_dict(result: dict):
+    """Build an ImageAnalysisResult look-alike from a smart crop result dict."""
+    crops = [
+        SimpleNamespace(aspect_ratio=crop["aspect_ratio"], bounding_box=dict(crop["bounding_box"]))
+        for crop in result["smart_crops"]
+    ]
+    return SimpleNamespace(
+        smart_crops=SimpleNamespace(list=crops),
+        metadata=SimpleNamespace(height=result["image_height"], width=result["image_width"]),
+        model_version=result["model_version"],
+    )
+
+
+class FakeVisionClient:
+    """Replays smart crop results with injected latency.
+
+    Args:
+        recordings: Smart crop result dicts keyed by SHA-256 of the image bytes
+        latency_sec: Latency of each analyze call
+        jitter: Relative jitter applied to the latency (0.2 = +/-20%)
+        on_latency: Optional callback receiving every injected delay in seconds
+    """
+
+    def __init__(self, recordings: dict = None, latency_sec: float = 0.3, jitter: float = 0.2, on_latency=None):
+        self.recordings = recordings if recordings is not None else {}
+        self._latency_sec = latency_sec
+        self._jitter = jitter
+        self._on_latency = on_latency
+
+    def analyze(self, image_data: bytes, smart_crops_aspect_ratios: list[float] = None, **kwargs):
+        time.sleep(self._delay())
+        return self._result(image_data, smart_crops_aspect_ratios)
+
+    async def analyze_async(self, image_data: bytes, smart_crops_aspect_ratios: list[float] = None, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._result(image_data, smart_crops_aspect_ratios)
+
+    def async_client(self):
+        """Return a view of this client whose analyze is a coroutine, like the aio client."""
+        return SimpleNamespace(analyze=self.analyze_async, close=self._close_async)
+
+    async def _close_async(self) -> None:
+        pass
+
+    def _delay(self) -> float:
+        delay = max(0.0, self._latency_sec * (1 + random.uniform(-self._jitter, self._jitter)))
+        if self._on_latency:
+            self._on_latency(delay)
+        return delay
+
+    def _result(self, image_data: bytes, ratios: list[float]):
+        ratios = ratios or [1.0]
+        recorded = self.recordings.get(hashlib.sha256(image_data).hexdigest())
+        if recorded is not None:
+            by_ratio = {round(c["aspect_ratio"], 2): c for c in recorded["smart_crops"]}
+            if all(round(r, 2) in by_ratio for r in ratios):
+                return result_from_dict({**recorded, "smart_crops": [by_ratio[round(r, 2)] for r in ratios]})
+        return result_from_dict(local_smart_crops(image_data, ratios))
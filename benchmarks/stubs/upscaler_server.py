@@ -0,0 +1,119 @@
+"""Local stand-in for the EDSR upscaling service.
+
+Accepts the same multipart POST /upscale?scale=N request and answers with a
+Lanczos-resized PNG, after an optional injected latency. A fraction of
+requests can be failed with 503 to exercise retries.
+
+    python -m benchmarks.stubs.upscaler_server --port 8765 --latency 0.5
+    UPSCALER_ENDPOINT=http://127.0.0.1:8765/upscale streamlit run app.py
+"""
+import argparse
+import email.parser
+import email.policy
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+from PIL import Image
+
+
+def parse_multipart_file(content_type: str, body: bytes) -> bytes | None:
+    """Return the payload of the first file part of a multipart/form-data body."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    for part in message.iter_parts():
+        if part.get_filename() is not None:
+            return part.get_payload(decode=True)
+    return None
+
+
+def upscale_bytes(image_bytes: bytes, scale: int) -> bytes:
+    image = Image.open(BytesIO(image_bytes))
+    upscaled = image.resize((image.width * scale, image.height * scale), Image.LANCZOS)
+    output = BytesIO()
+    upscaled.save(output, format="PNG")
+    return output.getvalue()
+
+
+def make_handler(latency_sec: float, jitter_sec: float, fail_rate: float, stats: dict, on_latency=None):
+    lock = threading.Lock()
+
+    class UpscalerHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                stats["requests"] += 1
+
+            if url.path != "/upscale":
+                return self._reply(404, b"not found", "text/plain")
+            if random.random() < fail_rate:
+                with lock:
+                    stats["failed"] += 1
+                return self._reply(503, b"service unavailable", "text/plain")
+
+            scale = int(parse_qs(url.query).get("scale", ["2"])[0])
+            image_bytes = parse_multipart_file(self.headers.get("Content-Type", ""), body)
+            if not image_bytes:
+                return self._reply(400, b"missing file", "text/plain")
+
+            delay = max(0.0, latency_sec + random.uniform(-jitter_sec, jitter_sec))
+            if on_latency:
+                on_latency(delay)
+            time.sleep(delay)
+            self._reply(200, upscale_bytes(image_bytes, scale), "image/png")
+
+        def _reply(self, status: int, payload: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return UpscalerHandler
+
+
+def start_server(port: int = 0, latency_sec: float = 0.0, jitter_sec: float = 0.0, fail_rate: float = 0.0,
+                 on_latency=None):
+    """Start the stand-in server on a background thread.
+
+    Args:
+        on_latency: Optional callback receiving every injected delay in
+            seconds, called on the request's handler thread
+
+    Returns:
+        (server, stats) where server.server_address holds the bound port and
+        stats counts requests and injected failures
+    """
+    stats = {"requests": 0, "failed": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_sec, jitter_sec, fail_rate, stats, on_latency))
+    threading.Thread(target=server.serve_forever, name="fake-upscaler", daemon=True).start()
+    return server, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected latency per request, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform latency jitter, in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.port, args.latency, args.jitter, args.fail_rate)
+    print(f"fake upscaler listening on http://127.0.0.1:{server.server_address[1]}/upscale")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
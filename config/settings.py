@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     """Configuration for the vision bot"""
@@ -12,12 +13,64 @@ class Config:
     # Azure Vision Studio settings
     VISION_STUDIO_ENDPOINT = os.getenv("VISION_STUDIO_ENDPOINT")
     VISION_STUDIO_KEY = os.getenv("VISION_STUDIO_KEY")
+    VISION_MODEL_VERSION = os.getenv("VISION_MODEL_VERSION", "latest")
+
+    # Smart crop backend: "azure" (Vision), "local" (NumPy saliency) or
+    # "auto" (Vision, falling back to local when slow or failing)
+    SMART_CROP_BACKEND = os.getenv("SMART_CROP_BACKEND", "azure")
+    SMART_CROP_FALLBACK_SEC = float(os.getenv("SMART_CROP_FALLBACK_SEC", "3"))
+
+    # Smart crop cache settings
+    SMART_CROP_CACHE_MAX_ENTRIES = 2048
+    SMART_CROP_CACHE_TTL_SEC = 3600
+
+    # Upscaler service settings
+    UPSCALER_ENDPOINT = os.getenv(
+        "UPSCALER_ENDPOINT",
+        "https://willseff-upscaler.nicerock-8f679d6b.eastus.azurecontainerapps.io/upscale",
+    )
+    UPSCALER_CONNECT_TIMEOUT_SEC = float(os.getenv("UPSCALER_CONNECT_TIMEOUT_SEC", "5"))
+    UPSCALER_READ_TIMEOUT_SEC = float(os.getenv("UPSCALER_READ_TIMEOUT_SEC", "30"))
+    UPSCALER_READ_TIMEOUT_PER_MP_SEC = float(os.getenv("UPSCALER_READ_TIMEOUT_PER_MP_SEC", "10"))  # per output megapixel
+    UPSCALER_MAX_READ_TIMEOUT_SEC = float(os.getenv("UPSCALER_MAX_READ_TIMEOUT_SEC", "55"))  # below the upscale_image tool timeout
+    UPSCALER_MAX_RETRIES = int(os.getenv("UPSCALER_MAX_RETRIES", "3"))
+    UPSCALER_BACKOFF_SEC = float(os.getenv("UPSCALER_BACKOFF_SEC", "0.5"))
+    # A longer Retry-After gives up on the service instead of waiting out the tool timeout
+    UPSCALER_MAX_RETRY_AFTER_SEC = float(os.getenv("UPSCALER_MAX_RETRY_AFTER_SEC", "10"))
+    UPSCALER_POOL_SIZE = int(os.getenv("UPSCALER_POOL_SIZE", "10"))
+
+    # Tiled upscaling: "auto" (images above UPSCALE_TILING_MIN_MEGAPIXELS), "always" or "never"
+    UPSCALE_TILING = os.getenv("UPSCALE_TILING", "auto")
+    UPSCALE_TILING_MIN_MEGAPIXELS = float(os.getenv("UPSCALE_TILING_MIN_MEGAPIXELS", "1.0"))
+    UPSCALE_TILE_SIZE = int(os.getenv("UPSCALE_TILE_SIZE", "512"))
+    UPSCALE_TILE_OVERLAP = int(os.getenv("UPSCALE_TILE_OVERLAP", "32"))
+    UPSCALE_TILE_WORKERS = int(os.getenv("UPSCALE_TILE_WORKERS", "4"))
+
+    # Hedged upscaling: answer with a local Lanczos upscale if the remote
+    # service hasn't replied within this many seconds (0 disables hedging)
+    # or fails. Past UPSCALE_HEDGE_MAX_PENDING remote calls still running,
+    # hedged upscales answer locally at once instead of queueing behind them.
+    UPSCALE_HEDGE_SEC = float(os.getenv("UPSCALE_HEDGE_SEC", "10"))
+    UPSCALE_HEDGE_MAX_PENDING = int(os.getenv("UPSCALE_HEDGE_MAX_PENDING", "8"))
+    UPSCALE_LOCAL_SHARPEN_AMOUNT = float(os.getenv("UPSCALE_LOCAL_SHARPEN_AMOUNT", "0.6"))  # 0 disables the unsharp pass
+
+    # Upscaled output cache
+    UPSCALE_CACHE_DIR = os.getenv("UPSCALE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vision-bot-upscales"))
+    UPSCALE_CACHE_MAX_MB = int(os.getenv("UPSCALE_CACHE_MAX_MB", "1024"))
 
     # Weather API Settings
     OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+    WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))  # cache cell size, ~11 km
+    WEATHER_CACHE_TTL_SEC = int(os.getenv("WEATHER_CACHE_TTL_SEC", "600"))
+    WEATHER_STALE_SEC = int(os.getenv("WEATHER_STALE_SEC", "1800"))  # served stale while refreshing
+    WEATHER_CACHE_MAX_ENTRIES = 4096
+    WEATHER_POOL_SIZE = 8
+    WEATHER_CONNECT_TIMEOUT_SEC = 3.05
+    WEATHER_READ_TIMEOUT_SEC = 10
 
     # Assistant Settings
     ASSISTANT_NAME = "Vision Assistant"
+    ASSISTANT_METADATA_APP = "vision-bot"  # tags the shared assistant for lookup
     ASSISTANT_INSTRUCTIONS = (
         "You are a vision assistant that assists the user with computer vision related tasks. "
         "When a user uploads an image, you can use the smart_crop_image tool to analyze it and provide smart cropping suggestions. "
@@ -27,6 +80,107 @@ class Config:
         "Always ask the user what aspect ratio they want if they don't specify one, and offer to crop the image for them."
     )
 
-    # conversation settings
+    # Thread pool settings (pre-created threads handed to new sessions)
+    THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "4"))
+    THREAD_POOL_TTL_SEC = int(os.getenv("THREAD_POOL_TTL_SEC", "3600"))
+
+    # conversation settings: "job" runs each turn as a background job on the
+    # shared event loop (see JOB_* below); "stream" and "poll" run it on the
+    # session's script thread, streaming or polling the run, with tool calls
+    # on the TOOL_MAX_WORKERS thread pool
+    RUN_MODE = os.getenv("RUN_MODE", "job")
     POLL_INTERVAL_SEC = 1.5
-    MAX_WAIT_SEC = 120
\ No newline at end of file
+    MAX_WAIT_SEC = 120
+
+    # Async pipeline settings
+    ASYNC_HTTP_POOL_SIZE = int(os.getenv("ASYNC_HTTP_POOL_SIZE", "100"))
+
+    # Background job settings (conversation turns run off the script thread)
+    JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", "32"))
+    JOB_RESULT_TTL_SEC = int(os.getenv("JOB_RESULT_TTL_SEC", "600"))
+    JOB_POLL_INTERVAL_SEC = 0.5
+    JOB_CANCEL_WAIT_SEC = 10
+
+    # Admission control: concurrent calls per backend, waiting callers allowed
+    # before new ones are rejected, and the longest a caller may wait
+    ADMISSION_LIMITS = {
+        "openai": int(os.getenv("ADMISSION_OPENAI_LIMIT", "16")),
+        "vision": int(os.getenv("ADMISSION_VISION_LIMIT", "8")),
+        "upscaler": int(os.getenv("ADMISSION_UPSCALER_LIMIT", "4")),
+    }
+    ADMISSION_MAX_QUEUE = {
+        "openai": int(os.getenv("ADMISSION_OPENAI_MAX_QUEUE", "64")),
+        "vision": int(os.getenv("ADMISSION_VISION_MAX_QUEUE", "32")),
+        "upscaler": int(os.getenv("ADMISSION_UPSCALER_MAX_QUEUE", "16")),
+    }
+    ADMISSION_QUEUE_TIMEOUT_SEC = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_SEC", "60"))
+
+    # Rate limiting per endpoint as (requests per second, burst). New work may
+    # not use the last RATE_LIMIT_NEW_WORK_RESERVE share of a bucket, which is
+    # kept for in-progress runs. A RATE_LIMIT_STATE_PATH shares the buckets
+    # between processes through a SQLite file.
+    RATE_LIMITS = {
+        "openai": (float(os.getenv("OPENAI_RATE_LIMIT_RPS", "10")), float(os.getenv("OPENAI_RATE_LIMIT_BURST", "20"))),
+        "vision": (float(os.getenv("VISION_RATE_LIMIT_RPS", "10")), float(os.getenv("VISION_RATE_LIMIT_BURST", "10"))),
+    }
+    RATE_LIMIT_NEW_WORK_RESERVE = 0.25
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+    RATE_LIMIT_BACKOFF_SEC = 1.0
+    RATE_LIMIT_MAX_BACKOFF_SEC = 30.0
+    RATE_LIMIT_STATE_PATH = os.getenv("RATE_LIMIT_STATE_PATH", "")
+    # SDK-level retries; 429s and 5xx are retried by the rate limiter instead
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+    # Prometheus metrics exporter port (0 disables it)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # Per-turn traces kept for the debug panel, which shows the last turn's
+    # stages as a waterfall when DEBUG_PANEL is "true"
+    TRACE_MAX_ENTRIES = 1024
+    TRACE_TTL_SEC = 3600
+    DEBUG_PANEL = os.getenv("DEBUG_PANEL", "false").lower() == "true"
+
+    # Rerun profiler: when RERUN_PROFILE is "true", the time, messages and
+    # bytes of every script rerun are appended to RERUN_PROFILE_LOG as JSON lines
+    RERUN_PROFILE = os.getenv("RERUN_PROFILE", "false").lower() == "true"
+    RERUN_PROFILE_LOG = os.getenv("RERUN_PROFILE_LOG", os.path.join(tempfile.gettempdir(), "vision-bot-reruns.jsonl"))
+
+    # Tool execution settings
+    TOOL_MAX_WORKERS = 8
+    TOOL_TIMEOUT_SEC = 30
+    TOOL_TIMEOUTS_SEC = {
+        "upscale_image": 60,
+    }
+
+    # Image blob store settings
+    BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "vision-bot-blobs"))
+    BLOB_MEMORY_BUDGET_MB = int(os.getenv("BLOB_MEMORY_BUDGET_MB", "256"))
+    BLOB_SESSION_BUDGET_MB = int(os.getenv("BLOB_SESSION_BUDGET_MB", "32"))
+    BLOB_DISK_BUDGET_MB = int(os.getenv("BLOB_DISK_BUDGET_MB", "2048"))
+
+    # Decoded image and preview caches
+    DECODED_IMAGE_CACHE_MAX_PIXELS = 64_000_000
+    PREVIEW_CACHE_MAX_ENTRIES = 512
+    PREVIEW_CACHE_TTL_SEC = 3600
+
+    # Chat history rendering: images are shown as thumbnails no larger than
+    # CHAT_THUMBNAIL_MAX_SIDE, and only the latest CHAT_HISTORY_PAGE_SIZE
+    # messages are rendered until older pages are requested
+    CHAT_THUMBNAIL_MAX_SIDE = int(os.getenv("CHAT_THUMBNAIL_MAX_SIDE", "800"))
+    CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+
+
+# A bucket that never refills or cannot hold a whole token would make every call wait forever
+for _endpoint, (_rate, _burst) in Config.RATE_LIMITS.items():
+    if _rate <= 0 or _burst < 1:
+        raise ValueError(
+            f"Rate limit for {_endpoint} needs a rate above 0 and a burst of at least 1, "
+            f"got {_rate} requests per second and a burst of {_burst}"
+        )
+
+# Tiles must advance by at least one pixel
+if not 0 <= Config.UPSCALE_TILE_OVERLAP < Config.UPSCALE_TILE_SIZE:
+    raise ValueError(
+        f"UPSCALE_TILE_OVERLAP must be at least 0 and less than UPSCALE_TILE_SIZE ({Config.UPSCALE_TILE_SIZE}), "
+        f"got {Config.UPSCALE_TILE_OVERLAP}"
+    )
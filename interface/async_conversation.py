@@ -0,0 +1,303 @@
+import asyncio
+import json
+import time
+from interface.conversation import RunPhases
+from services.admission import AdmissionRejected, admission
+from services.assistant import assistant_fingerprint, get_shared_assistant_id
+from services.azure_client import get_async_azure_openai_client
+from services.blob_store import job_session_id
+from services.rate_limit import PRIORITY_IN_PROGRESS, rate_limiter
+from services.telemetry import OUTCOME_ERROR, OUTCOME_OK, image_size_class, image_size_classes, record_span, span, start_trace, use_trace
+from tools.registry import ASYNC_TOOL_REGISTRY, IMAGE_TOOLS
+from tools.result import ToolResult, as_tool_result, tool_error
+from config.settings import Config
+
+
+async def create_conversation_async(client) -> tuple[str, str]:
+    """Resolve the shared assistant and create a new thread for a conversation.
+
+    Args:
+        client: AsyncAzureOpenAI client
+
+    Returns:
+        (assistant_id, thread_id)
+    """
+    # The assistant lookup is cached per process, so this only blocks on the first call
+    assistant_id = await asyncio.to_thread(get_shared_assistant_id, assistant_fingerprint())
+    thread = await rate_limiter.call_async("openai", client.beta.threads.create)
+    return assistant_id, thread.id
+
+
+async def call_tool_async(func_name: str, arguments: str, image_ref: str = None) -> ToolResult:
+    """Await a registered async tool, isolating any failure into an error result.
+
+    Args:
+        func_name: Name of the tool in ASYNC_TOOL_REGISTRY
+        arguments: JSON-encoded tool arguments
+        image_ref: Blob store reference of the conversation's image, passed to image tools
+
+    Returns:
+        ToolResult of the tool
+    """
+    if func_name not in ASYNC_TOOL_REGISTRY:
+        return tool_error(f"Unknown function: {func_name}")
+
+    attributes = {"tool": func_name}
+    if func_name in IMAGE_TOOLS:
+        # Known from the upload; otherwise the blob is read and classified off the loop
+        attributes["image_size"] = (
+            image_size_classes.get(image_ref) if image_ref else None
+        ) or await asyncio.to_thread(image_size_class, image_ref)
+    with span("tool", **attributes) as attributes:
+        try:
+            # Malformed arguments from the model become an error output, as in call_tool
+            kwargs = json.loads(arguments)
+            if func_name in IMAGE_TOOLS:
+                kwargs["image_ref"] = image_ref
+            result = as_tool_result(await ASYNC_TOOL_REGISTRY[func_name](**kwargs))
+        except Exception as e:
+            result = tool_error(f"Tool {func_name} failed: {str(e)}")
+        attributes["outcome"] = OUTCOME_ERROR if result.is_error else OUTCOME_OK
+        return result
+
+
+async def execute_tool_calls_async(run_status, image_ref: str = None) -> tuple[list[dict], dict]:
+    """Execute the tool calls required by a run concurrently on the event loop.
+
+    Each call gets its own timeout, and outputs are kept in the order the
+    model requested them.
+
+    Args:
+        run_status: Run object in the requires_action state
+        image_ref: Blob store reference of the conversation's image
+
+    Returns:
+        (tool outputs ready for submit_tool_outputs, artifacts of the results
+        keyed like "cropped_image_data")
+    """
+    actions = run_status.required_action.submit_tool_outputs.tool_calls
+
+    async def run_action(action) -> ToolResult:
+        func_name = action.function.name
+        timeout = Config.TOOL_TIMEOUTS_SEC.get(func_name, Config.TOOL_TIMEOUT_SEC)
+        try:
+            return await asyncio.wait_for(call_tool_async(func_name, action.function.arguments, image_ref), timeout)
+        except asyncio.TimeoutError:
+            return tool_error(f"Tool {func_name} timed out. Please try again.")
+
+    results = await asyncio.gather(*(run_action(action) for action in actions))
+
+    tool_outputs = []
+    artifacts = {}
+    for action, result in zip(actions, results):
+        artifacts.update(result.artifacts)
+        tool_outputs.append({"tool_call_id": action.id, "output": result.output})
+    return tool_outputs, artifacts
+
+
+async def extract_assistant_response_async(client, thread_id: str) -> str:
+    """Async counterpart of extract_assistant_response."""
+    with span("message_list"):
+        messages = (await rate_limiter.call_async(
+            "openai", client.beta.threads.messages.list, priority=PRIORITY_IN_PROGRESS, idempotent=True,
+            thread_id=thread_id,
+        )).data
+    last_response = next((m for m in messages if m.role == "assistant"), None)
+    if last_response:
+        try:
+            content = last_response.content[0].text.value
+            return content if content.strip() else "Task completed successfully."
+        except Exception:
+            return "Response received but could not extract text content."
+    return "No response received from assistant."
+
+
+async def stream_run_completion_async(client, thread_id: str, assistant_id: str, max_wait_sec: int,
+                                      image_ref: str = None, on_text=None, on_progress=None) -> tuple[str, dict]:
+    """Async counterpart of stream_run_completion.
+
+    The whole run, stalled stream reads included, is bounded by max_wait_sec.
+
+    Args:
+        on_progress: Optional callback receiving (run_id, run status, names of
+            the tools being executed) whenever the run changes state
+
+    Returns:
+        (assistant response or error message, artifacts of the tool calls)
+    """
+    text = ""
+    artifacts = {}
+    run_id = None
+    phase = RunPhases()
+
+    try:
+        async with asyncio.timeout(max_wait_sec):
+            with span("run_create"):
+                stream = await rate_limiter.call_async(
+                    "openai", client.beta.threads.runs.create,
+                    thread_id=thread_id,
+                    assistant_id=assistant_id,
+                    stream=True,
+                )
+
+            while stream is not None:
+                next_stream = None
+                async with stream:
+                    async for event in stream:
+                        if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step."):
+                            run_id = event.data.id
+                            phase.update(event.data.status)
+                            if on_progress:
+                                on_progress(event.data.id, event.data.status, [])
+
+                        if event.event == "thread.message.created":
+                            # Only the latest assistant message is returned, matching polling mode
+                            text = ""
+
+                        elif event.event == "thread.message.delta":
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    text += part.text.value
+                                    if on_text:
+                                        on_text(text)
+
+                        elif event.event == "thread.run.requires_action":
+                            if on_progress:
+                                tools = [call.function.name for call in event.data.required_action.submit_tool_outputs.tool_calls]
+                                on_progress(event.data.id, event.data.status, tools)
+                            tool_outputs, tool_artifacts = await execute_tool_calls_async(event.data, image_ref)
+                            artifacts.update(tool_artifacts)
+                            with span("submit_tool_outputs"):
+                                next_stream = await rate_limiter.call_async(
+                                    "openai", client.beta.threads.runs.submit_tool_outputs,
+                                    priority=PRIORITY_IN_PROGRESS,
+                                    thread_id=thread_id,
+                                    run_id=event.data.id,
+                                    tool_outputs=tool_outputs,
+                                    stream=True,
+                                )
+                            break
+
+                        elif event.event == "thread.run.completed":
+                            if not text.strip():
+                                text = await extract_assistant_response_async(client, thread_id)
+                            return text, artifacts
+
+                        elif event.event in {"thread.run.failed", "thread.run.cancelled", "thread.run.expired"}:
+                            status = event.event.rsplit(".", 1)[-1]
+                            err = getattr(event.data, "last_error", None)
+                            return f"Run {status}. {err if err else ''}", artifacts
+
+                        elif event.event == "error":
+                            phase.end("error")
+                            return f"Run failed. {event.data}", artifacts
+
+                stream = next_stream
+
+            # Stream ended without a terminal event
+            phase.end()
+            return await extract_assistant_response_async(client, thread_id), artifacts
+    except TimeoutError:
+        # Cancel the run so the thread accepts the next message
+        phase.end("timeout")
+        if run_id:
+            await cancel_run_async(client, thread_id, run_id, Config.JOB_CANCEL_WAIT_SEC)
+        return "Timed out waiting for the assistant. Please try again.", artifacts
+
+
+async def run_conversation_async(client, thread_id: str, assistant_id: str, user_message: str,
+                                 image_ref: str = None, max_wait_sec: int = None, on_text=None, on_progress=None) -> dict:
+    """Run one conversation turn without blocking the event loop.
+
+    Unlike run_conversation, nothing is read from or written to Streamlit
+    session state, so many turns can run concurrently on one event loop.
+
+    Args:
+        client: AsyncAzureOpenAI client, e.g. from create_async_azure_openai_client()
+        thread_id: Thread of the conversation, e.g. from create_conversation_async()
+        assistant_id: Assistant to run
+        user_message: Text of the user's message
+        image_ref: Blob store reference of the image the image tools work on, if any
+        max_wait_sec: Maximum time to wait
+        on_text: Optional callback receiving the assistant text streamed so far
+        on_progress: Optional callback receiving (run_id, run status, tool names)
+
+    Returns:
+        dict with "content" key and the artifacts of the turn's tool calls,
+        keyed like "cropped_image_data" (see tools.result.ToolResult)
+    """
+    if max_wait_sec is None:
+        max_wait_sec = Config.MAX_WAIT_SEC
+
+    with span("message_create"):
+        await rate_limiter.call_async(
+            "openai", client.beta.threads.messages.create,
+            thread_id=thread_id,
+            role="user",
+            content=[{"type": "text", "text": user_message}],
+        )
+    content, artifacts = await stream_run_completion_async(
+        client, thread_id, assistant_id, max_wait_sec, image_ref=image_ref, on_text=on_text, on_progress=on_progress,
+    )
+    return {"content": content, **artifacts}
+
+
+async def cancel_run_async(client, thread_id: str, run_id: str, max_wait_sec: float) -> None:
+    """Cancel a run and wait briefly until it stops, so the thread accepts new messages."""
+    terminal = {"cancelled", "completed", "failed", "expired"}
+    try:
+        run = await rate_limiter.call_async(
+            "openai", client.beta.threads.runs.cancel, priority=PRIORITY_IN_PROGRESS, thread_id=thread_id, run_id=run_id,
+        )
+        deadline = time.time() + max_wait_sec
+        while run.status not in terminal and time.time() < deadline:
+            await asyncio.sleep(0.5)
+            run = await rate_limiter.call_async(
+                "openai", client.beta.threads.runs.retrieve, priority=PRIORITY_IN_PROGRESS, idempotent=True,
+                thread_id=thread_id, run_id=run_id,
+            )
+    except Exception:
+        pass  # The run may already have finished
+
+
+async def run_conversation_job(job, thread_id: str, assistant_id: str, user_message: str, image_ref: str = None,
+                               trace=None, session_id: str = None) -> dict:
+    """Run one conversation turn as a background job (see services.jobs).
+
+    Everything the turn needs is passed in explicitly, since session state is
+    not available off the script thread. Streamed text and run progress are
+    reported on the job, and cancelling the job cancels the run server-side.
+    The turn's stages are recorded in trace, or in a new trace if none is given.
+    Images the tools store count against session_id's blob budget.
+    """
+    token = job_session_id.set(session_id)
+    try:
+        with use_trace(trace or start_trace()):
+            return await _run_conversation_job(job, thread_id, assistant_id, user_message, image_ref)
+    finally:
+        job_session_id.reset(token)
+
+
+async def _run_conversation_job(job, thread_id: str, assistant_id: str, user_message: str, image_ref: str = None) -> dict:
+    client = get_async_azure_openai_client()
+
+    def on_progress(run_id, status, tools):
+        job.update(run_id=run_id, run_status=status, current_tools=tools)
+
+    admission_start = time.perf_counter()
+    try:
+        # Wait in line for an OpenAI run slot, showing the queue position
+        async with admission.admit_async("openai", on_position=lambda position: job.update(queue_position=position)):
+            record_span("admission_wait", admission_start)
+            return await run_conversation_async(
+                client, thread_id, assistant_id, user_message, image_ref=image_ref,
+                on_text=lambda text: job.update(text=text), on_progress=on_progress,
+            )
+    except AdmissionRejected as e:
+        record_span("admission_wait", admission_start, outcome="rejected")
+        return {"content": f"The assistant is busy right now. {e}"}
+    except asyncio.CancelledError:
+        run_id = job.snapshot()["run_id"]
+        if run_id:
+            await cancel_run_async(client, thread_id, run_id, Config.JOB_CANCEL_WAIT_SEC)
+        raise
@@ -1,14 +1,25 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import base64
-from interface.conversation import run_conversation
+import os
+from interface.async_conversation import run_conversation_job
+from interface.conversation import run_conversation, validate_assistant_setup
+from interface.profiler import annotate, message_block, profiled
+from services.assistant import warm_thread_pool
+from services.blob_store import current_session_id, get_blob, put_blob
+from services.jobs import JOB_CANCELLING, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, FINISHED_STATES, get_job_runner
+from services.telemetry import OUTCOME_ERROR, classify_image, finish_trace, get_trace, start_trace, use_trace
+from config.settings import Config
 
+@profiled("render_chat_interface")
 def render_chat_interface():
     """Render the main chat interface."""
     # Surface any setup errors immediately (without blocking render)
     if "assistant_error" in st.session_state:
         st.warning("Assistant init error detected. It will be retried on first message.")
 
+    # Pre-create threads in the background before the first message is sent
+    warm_thread_pool()
+
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []  # list of dicts: {"role": "user"|"assistant", "content": str}
@@ -18,86 +29,24 @@ def render_chat_interface():
         st.session_state.upload_key = 0
     
     # Render chat history FIRST
-    for i, msg in enumerate(st.session_state.messages):
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
-            
-            # For user messages with images, display the image
-            if msg["role"] == "user" and "image_data" in msg:
-                try:
-                    image_bytes = base64.b64decode(msg["image_data"])
-                    st.image(image_bytes, caption="Uploaded image", width=300)
-                except:
-                    pass
-            
-            # For assistant messages with cropped images, display the cropped image
-            if msg["role"] == "assistant" and "cropped_image_data" in msg:
-                crop_data = msg["cropped_image_data"]
-                st.image(f"data:image/jpeg;base64,{crop_data['cropped_image_b64']}", 
-                       caption=f"Cropped image ({crop_data['cropped_size']['width']}x{crop_data['cropped_size']['height']})",
-                       width=300)
-                st.success("Image cropped successfully!")
-                st.download_button(
-                    "Download Cropped Image",
-                    data=base64.b64decode(crop_data['cropped_image_b64']),
-                    file_name="cropped_image.jpg",
-                    mime="image/jpeg",
-                    key=f"download_cropped_{i}"
-                )
-            
-            # For assistant messages with upscaled images, display the upscaled image
-            if msg["role"] == "assistant" and "upscaled_image_data" in msg:
-                upscale_data = msg["upscaled_image_data"]
-                scale = upscale_data.get('scale_factor', 'unknown')
-                new_size = upscale_data.get('upscaled_size', {})
-                width = new_size.get('width', 'unknown')
-                height = new_size.get('height', 'unknown')
-                st.image(f"data:image/png;base64,{upscale_data['upscaled_image_b64']}", 
-                       caption=f"Upscaled {scale}x ({width}x{height}) - Enhanced with OpenCV EDSR",
-                       width=400)  # Larger display for upscaled images
-                st.success(f"Image upscaled {scale}x successfully using OpenCV EDSR model!")
-                st.download_button(
-                    "Download Upscaled Image",
-                    data=base64.b64decode(upscale_data['upscaled_image_b64']),
-                    file_name="upscaled_image.png",
-                    mime="image/png",
-                    key=f"download_upscaled_{i}"
-                )
-
-    # Check if we're currently processing a message (show spinner below messages, above input)
-    if "processing" in st.session_state and st.session_state.processing:
-        # Show spinner below chat history but above input controls
-        with st.spinner("Thinking..."):
-            # Get the message data from session state
-            message_content = st.session_state.pending_message
-            image_data = st.session_state.get("pending_image_data")
-            
-            # Call the assistant and add response to history
-            response = run_conversation(message_content, image_data=image_data)
-            
-            # Add assistant message to history (include image data if present)
-            assistant_message = {"role": "assistant", "content": response["content"]}
-            if "cropped_image_data" in response:
-                assistant_message["cropped_image_data"] = response["cropped_image_data"]
-            if "upscaled_image_data" in response:
-                assistant_message["upscaled_image_data"] = response["upscaled_image_data"]
-            st.session_state.messages.append(assistant_message)
-            
-            # Clear processing state
-            del st.session_state.processing
-            del st.session_state.pending_message
-            if "pending_image_data" in st.session_state:
-                del st.session_state.pending_image_data
-            
-            # Rerun to update the display
-            st.rerun()
-    
-    # Create input controls at the BOTTOM (only when not processing)
+    render_chat_history()
+
+    # A turn in flight runs as a background job; follow its progress below the history
+    if "active_job_id" in st.session_state:
+        render_active_job()
+    elif "pending_turn" in st.session_state:
+        render_pending_turn()
+
+    if Config.DEBUG_PANEL:
+        render_trace_panel()
+    
+    # Create input controls at the BOTTOM (disabled while a turn is running)
     col1, col2 = st.columns([3, 1])
     
     with col1:
         # Chat input
-        prompt = st.chat_input("Ask about the weather or upload an image for analysis")
+        prompt = st.chat_input("Ask about the weather or upload an image for analysis",
+                               disabled="active_job_id" in st.session_state)
     
     with col2:
         # Image upload (in a column next to chat input)
@@ -112,29 +61,273 @@ def render_chat_interface():
         message_content = prompt
         
         # Handle uploaded image
-        image_data = None
+        image_ref = None
         if uploaded_file is not None:
-            # Read and encode image
+            # Read the image into the blob store; session state only keeps its reference
             image_bytes = uploaded_file.read()
-            image_data = base64.b64encode(image_bytes).decode('utf-8')
+            image_ref = put_blob(image_bytes)
+            classify_image(image_ref, image_bytes)
             # Increment upload key to reset the uploader for next message
             st.session_state.upload_key = upload_key + 1
         
-        # Store message data in session state for processing
-        st.session_state.pending_message = message_content
-        if image_data:
-            st.session_state.pending_image_data = image_data
-        
         # Add user message to history immediately
         message_data = {"role": "user", "content": message_content}
-        if image_data:
-            message_data["image_data"] = image_data
+        if image_ref:
+            message_data["image_ref"] = image_ref
         st.session_state.messages.append(message_data)
         
-        # Set processing flag and rerun to show spinner
-        st.session_state.processing = True
+        # Start the turn in the background and rerun to show its progress
+        submit_turn(message_content, image_ref)
         st.rerun()
 
+
+@profiled("render_chat_history")
+def render_chat_history():
+    """Render the latest page of messages, with a button to reveal older ones."""
+    messages = st.session_state.messages
+    page_size = Config.CHAT_HISTORY_PAGE_SIZE
+    pages = st.session_state.get("history_pages", 1)
+    first = max(0, len(messages) - pages * page_size)
+
+    if first > 0 and st.button(f"Show {min(first, page_size)} earlier messages", key="show_earlier_messages"):
+        st.session_state.history_pages = pages + 1
+        first = max(0, first - page_size)
+
+    image_keys = ("image_ref", "cropped_image_data", "upscaled_image_data")
+    annotate(
+        history_messages=len(messages),
+        history_images=sum(any(key in msg for key in image_keys) for msg in messages),
+    )
+    for i in range(first, len(messages)):
+        with message_block(i):
+            render_message(i, messages[i])
+
+
+def render_message(i: int, msg: dict):
+    """Render one history message with thumbnails of its images."""
+    # Image modules load PIL and NumPy, so they are imported on first use
+    from tools.image_cache import get_thumbnail
+
+    with st.chat_message(msg["role"]):
+        st.write(msg["content"])
+        
+        # For user messages with images, display the image
+        if msg["role"] == "user" and "image_ref" in msg:
+            thumbnail = get_thumbnail(msg["image_ref"], Config.CHAT_THUMBNAIL_MAX_SIDE)
+            if thumbnail:
+                st.image(thumbnail, caption="Uploaded image", width=300)
+            else:
+                st.caption("Uploaded image is no longer available.")
+        
+        # For assistant messages with cropped images, display the cropped image
+        if msg["role"] == "assistant" and "cropped_image_data" in msg:
+            crop_data = msg["cropped_image_data"]
+            thumbnail = get_thumbnail(crop_data['cropped_image_ref'], Config.CHAT_THUMBNAIL_MAX_SIDE)
+            if thumbnail:
+                st.image(thumbnail, 
+                       caption=f"Cropped image ({crop_data['cropped_size']['width']}x{crop_data['cropped_size']['height']})",
+                       width=300)
+                st.success("Image cropped successfully!")
+                render_download(crop_data['cropped_image_ref'], "Download Cropped Image",
+                                "cropped_image.jpg", "image/jpeg", key=f"download_cropped_{i}")
+            else:
+                st.caption("Cropped image is no longer available.")
+        
+        # For assistant messages with upscaled images, display the upscaled image
+        if msg["role"] == "assistant" and "upscaled_image_data" in msg:
+            from tools.local_upscale import LOCAL_ENGINE
+            from tools.upscale import resolve_upscaled_ref
+
+            upscale_data = msg["upscaled_image_data"]
+            scale = upscale_data.get('scale_factor', 'unknown')
+            new_size = upscale_data.get('upscaled_size', {})
+            width = new_size.get('width', 'unknown')
+            height = new_size.get('height', 'unknown')
+            # A late EDSR result replaces a local fallback once it arrives
+            upscaled_ref, replaced = resolve_upscaled_ref(upscale_data['upscaled_image_ref'])
+            local = upscale_data.get('engine') == LOCAL_ENGINE and not replaced
+            method = "Lanczos (EDSR result pending)" if local else "OpenCV EDSR"
+            thumbnail = get_thumbnail(upscaled_ref, Config.CHAT_THUMBNAIL_MAX_SIDE)
+            if thumbnail:
+                st.image(thumbnail, 
+                       caption=f"Upscaled {scale}x ({width}x{height}) - Enhanced with {method}",
+                       width=400)  # Larger display for upscaled images
+                st.success(f"Image upscaled {scale}x successfully using {method}!")
+                render_download(upscaled_ref, "Download Upscaled Image",
+                                "upscaled_image.png", "image/png", key=f"download_upscaled_{i}")
+            else:
+                st.caption("Upscaled image is no longer available.")
+
+
+def render_download(image_ref: str, label: str, file_name: str, mime: str, key: str):
+    """Offer a full-resolution download that loads the image only when asked for.
+    
+    A first button marks the download as requested; only then are the full
+    bytes read from the blob store and sent with the download button.
+    """
+    requested = st.session_state.setdefault("requested_downloads", set())
+    if key not in requested:
+        if not st.button(label, key=f"{key}_prepare"):
+            return
+        requested.add(key)
+
+    image_bytes = get_blob(image_ref)
+    if not image_bytes:
+        st.caption("Full-resolution image is no longer available.")
+        return
+    st.download_button(
+        f"Save {file_name}",
+        data=image_bytes,
+        file_name=file_name,
+        mime=mime,
+        key=key,
+        on_click=requested.discard,
+        args=(key,),
+    )
+
+
+def submit_turn(message_content: str, image_ref: str = None) -> None:
+    """Start a conversation turn the way Config.RUN_MODE selects.
+    
+    In "job" mode the turn is submitted as a background job and its ID is
+    remembered. The job cannot read session state, so the thread, assistant
+    and image it works on are captured here. In "stream" and "poll" modes the
+    turn runs on the script thread in the next rerun (see render_pending_turn).
+    """
+    if Config.RUN_MODE != "job":
+        st.session_state.pending_turn = {"message": message_content, "image_ref": image_ref}
+        return
+
+    # The job records the rest of the turn into the same trace
+    trace = start_trace(mode="job")
+    st.session_state.last_trace_id = trace.id
+    with use_trace(trace, finish=False):
+        error = validate_assistant_setup()
+    if error:
+        finish_trace(trace, OUTCOME_ERROR)
+        st.session_state.messages.append({"role": "assistant", "content": error})
+        return
+
+    # Image tools keep working on the most recent upload until a new one arrives
+    if image_ref:
+        st.session_state.uploaded_image_ref = image_ref
+    image_ref = st.session_state.get("uploaded_image_ref")
+
+    st.session_state.active_job_id = get_job_runner().submit(
+        run_conversation_job,
+        st.session_state.thread_id,
+        st.session_state.assistant_id,
+        message_content,
+        image_ref,
+        trace=trace,
+        session_id=current_session_id(),
+    )
+
+
+def render_pending_turn():
+    """Run the pending turn on the script thread, streaming its text below the history."""
+    turn = st.session_state.pop("pending_turn")
+    with st.spinner("Thinking..."):
+        with st.chat_message("assistant"):
+            stream_placeholder = st.empty()
+        response = run_conversation(turn["message"], image_ref=turn["image_ref"], on_text=stream_placeholder.markdown)
+
+    # Includes the artifacts of the turn's tool calls, such as cropped or upscaled images
+    st.session_state.messages.append({"role": "assistant", **response})
+    st.rerun()
+
+
+def describe_job_progress(job: dict) -> str:
+    """Describe what a running job is doing, for the status line."""
+    if job["status"] == JOB_QUEUED:
+        return "Waiting for a free worker..."
+    if job["queue_position"]:
+        return f"Waiting in line (position {job['queue_position']})..."
+    if job["status"] == JOB_CANCELLING:
+        return "Cancelling..."
+    if job["current_tools"]:
+        return f"Running {', '.join(job['current_tools'])}..."
+    if job["run_status"]:
+        return f"Assistant run {job['run_status'].replace('_', ' ')}..."
+    return "Thinking..."
+
+
+def finish_job(job: dict | None) -> None:
+    """Move a finished job's outcome into the chat history."""
+    if job is None:
+        assistant_message = {"role": "assistant", "content": "The response is no longer available. Please try again."}
+    elif job["status"] == JOB_COMPLETED:
+        # Includes the artifacts of the turn's tool calls, such as cropped or upscaled images
+        assistant_message = {"role": "assistant", **job["result"]}
+    elif job["status"] == JOB_FAILED:
+        assistant_message = {"role": "assistant", "content": f"Something went wrong: {job['error']}"}
+    else:
+        assistant_message = {"role": "assistant", "content": job["text"] + "\n\n*Cancelled.*" if job["text"] else "*Cancelled.*"}
+    st.session_state.messages.append(assistant_message)
+    del st.session_state.active_job_id
+
+
+@st.fragment(run_every=Config.JOB_POLL_INTERVAL_SEC)
+@profiled("render_active_job")
+def render_active_job():
+    """Show the active job's streamed text and status, refreshing on its own until it finishes."""
+    job_id = st.session_state.get("active_job_id")
+    if job_id is None:
+        return
+
+    runner = get_job_runner()
+    job = runner.get(job_id)
+    if job is None or job["status"] in FINISHED_STATES:
+        finish_job(job)
+        st.rerun()  # Full rerun so the history and input pick up the result
+
+    with st.chat_message("assistant"):
+        if job["text"]:
+            st.markdown(job["text"])
+        st.caption(describe_job_progress(job))
+        if job["status"] != JOB_CANCELLING and st.button("Cancel", key=f"cancel_{job_id}"):
+            runner.cancel(job_id)
+
+
+def render_trace_panel():
+    """Show the stages of the session's last turn as a waterfall, for debugging."""
+    trace = get_trace(st.session_state.last_trace_id) if "last_trace_id" in st.session_state else None
+    with st.expander("Debug: last turn trace"):
+        if trace is None:
+            st.caption("No turn has been traced yet.")
+            return
+
+        if trace["duration_ms"] is None:
+            st.caption("Turn in progress")
+        else:
+            st.caption(f"Turn {trace['outcome']} in {trace['duration_ms']:.0f} ms")
+
+        rows = []
+        for i, span in enumerate(trace["spans"], start=1):
+            label = span["name"]
+            if "tool" in span["attributes"]:
+                label += f" ({span['attributes']['tool']})"
+            rows.append({
+                "stage": f"{i:02d} {label}",
+                "start_ms": round(span["start_ms"], 1),
+                "end_ms": round(span["start_ms"] + span["duration_ms"], 1),
+                "duration_ms": round(span["duration_ms"], 1),
+                "outcome": span["outcome"],
+            })
+        st.vega_lite_chart(spec={
+            "data": {"values": rows},
+            "mark": "bar",
+            "encoding": {
+                "y": {"field": "stage", "type": "nominal", "sort": None, "title": None},
+                "x": {"field": "start_ms", "type": "quantitative", "title": "ms since the turn started"},
+                "x2": {"field": "end_ms"},
+                "color": {"field": "outcome", "type": "nominal"},
+                "tooltip": [{"field": field} for field in ("stage", "duration_ms", "outcome")],
+            },
+        }, width="stretch")
+
+
+@profiled("render_architecture_page")
 def render_architecture_page():
     """Render the architecture/how it was built page."""
     st.title("How Vision Bot Was Built")
@@ -160,11 +353,10 @@ def render_architecture_page():
     **Architecture Flow (Scroll right to view entire image)**
     """)
     
-    # Display the flowchart SVG
+    # Display the flowchart SVG; it is about 1 MB, so it is only sent once asked for
     try:
-        with open("test_images/Vision Bot.drawio.svg", "r") as f:
-            svg_content = f.read()
-        st.components.v1.html(svg_content, height=520, width=1400, scrolling=True)
+        if st.toggle("Show the architecture diagram", key="show_architecture_diagram"):
+            components.html(get_architecture_svg(), height=520, width=1400, scrolling=True)
     except FileNotFoundError:
         st.error("Architecture diagram not found. Please ensure 'Vision Bot.drawio.svg' exists in the test_images directory.")
     except Exception as e:
@@ -219,22 +411,24 @@ def render_architecture_page():
     
     """)
 
-def render_sidebar():
-    """Render the sidebar with a summary of app capabilities."""
-    with st.sidebar:
-        st.header("What you can do")
-        
-        # Prepare test image links
-        test_image_links = {}
-        with open("test_images/presentation.png", "rb") as f:
-            b64_data = base64.b64encode(f.read()).decode()
-            test_image_links["presentation"] = f'data:image/png;base64,{b64_data}'
-        
-        with open("test_images/low_res.jpg", "rb") as f:
-            b64_data = base64.b64encode(f.read()).decode()
-            test_image_links["low_res"] = f'data:image/jpeg;base64,{b64_data}'
-        
-        st.markdown(f"""
+# Test images offered for download in the sidebar, with their MIME types.
+# Download buttons serve them as media files, so reruns don't resend the bytes.
+SIDEBAR_TEST_IMAGES = {
+    "presentation.png": "image/png",
+    "low_res.jpg": "image/jpeg",
+}
+
+ARCHITECTURE_SVG_PATH = os.path.join("test_images", "Vision Bot.drawio.svg")
+
+
+@st.cache_resource(show_spinner=False)
+def get_test_image(name: str) -> bytes:
+    """Read a sidebar test image once per process."""
+    with open(os.path.join("test_images", name), "rb") as f:
+        return f.read()
+
+
+SIDEBAR_MARKDOWN = """
         **Chat with AI Assistant**
         - Ask questions and get intelligent responses powered by Azure OpenAI
         
@@ -243,12 +437,29 @@ def render_sidebar():
         
         **Smart Crop Images**
         - Upload an image and ask the assistant to crop it intelligently
-        - Example: Upload [{"presentation.png"}] and ask "Crop this presentation slide to focus on the main content"
+        - Example: Upload **presentation.png** (download it below) and ask "Crop this presentation slide to focus on the main content"
         - The cropped image will be displayed and you can download it
         
         **Upscale Images**
         - Upload a low-resolution image and ask to upscale it using AI
-        - Example: Upload [{"low_res.jpg"}] and ask "Upscale this image"
+        - Example: Upload **low_res.jpg** (download it below) and ask "Upscale this image"
         - The upscaled image will be displayed and you can download it
-        """.replace("[", "<a href='" + test_image_links.get("presentation", "#") + "' download='presentation.png'>").replace("]", "</a>").replace("{{", "<a href='" + test_image_links.get("low_res", "#") + "' download='low_res.jpg'>").replace("}}", "</a>"), unsafe_allow_html=True)
-        
+        """
+
+
+@st.cache_resource(show_spinner=False)
+def get_architecture_svg() -> str:
+    """Read the architecture diagram once per process."""
+    with open(ARCHITECTURE_SVG_PATH, "r") as f:
+        return f.read()
+
+
+@profiled("render_sidebar")
+def render_sidebar():
+    """Render the sidebar with a summary of app capabilities."""
+    with st.sidebar:
+        st.header("What you can do")
+        st.markdown(SIDEBAR_MARKDOWN)
+        for name, mime in SIDEBAR_TEST_IMAGES.items():
+            st.download_button(f"Download {name}", data=get_test_image(name), file_name=name, mime=mime,
+                               key=f"test_image_{name}")
@@ -1,9 +1,17 @@
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import streamlit as st
+from contextvars import copy_context
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from services.azure_client import get_azure_openai_client
+from services.admission import AdmissionRejected, admission
 from services.assistant import ensure_assistant_and_thread
-from tools.registry import TOOL_REGISTRY
+from services.rate_limit import PRIORITY_IN_PROGRESS, rate_limiter
+from services.telemetry import OUTCOME_ERROR, OUTCOME_OK, image_size_class, record_span, span, start_trace, use_trace
+from tools.registry import IMAGE_TOOLS, TOOL_REGISTRY
+from tools.result import ToolResult, as_tool_result, tool_error
 from config.settings import Config
 
 
@@ -13,7 +21,8 @@ def validate_assistant_setup() -> str | None:
     Returns:
         Error message if validation fails, None if successful.
     """
-    ensure_assistant_and_thread()
+    with span("assistant_setup"):
+        ensure_assistant_and_thread()
     if "assistant_error" in st.session_state:
         return f"Assistant setup failed: {st.session_state.assistant_error}"
     if "assistant_id" not in st.session_state or "thread_id" not in st.session_state:
@@ -21,31 +30,35 @@ def validate_assistant_setup() -> str | None:
     return None
 
 
-def create_user_message(client, user_message: str, image_data: str = None) -> None:
+def create_user_message(client, user_message: str, image_ref: str = None) -> None:
     """Create a user message in the thread."""
     content = []
     
     # Add text content
     content.append({"type": "text", "text": user_message})
     
-    # If image data is provided, store it in session state for tools to access
-    if image_data:
-        st.session_state.uploaded_image_data = image_data
+    # If an image is provided, store its blob reference in session state for tools to access
+    if image_ref:
+        st.session_state.uploaded_image_ref = image_ref
         # Don't append technical instructions - assistant's system prompt handles this automatically
     
-    client.beta.threads.messages.create(
-        thread_id=st.session_state.thread_id,
-        role="user",
-        content=content,
-    )
+    with span("message_create"):
+        rate_limiter.call(
+            "openai", client.beta.threads.messages.create,
+            thread_id=st.session_state.thread_id,
+            role="user",
+            content=content,
+        )
 
 
 def start_assistant_run(client):
     """Start a new assistant run and return the run object."""
-    return client.beta.threads.runs.create(
-        thread_id=st.session_state.thread_id,
-        assistant_id=st.session_state.assistant_id,
-    )
+    with span("run_create"):
+        return rate_limiter.call(
+            "openai", client.beta.threads.runs.create,
+            thread_id=st.session_state.thread_id,
+            assistant_id=st.session_state.assistant_id,
+        )
 
 
 def extract_assistant_response(client) -> str:
@@ -54,9 +67,13 @@ def extract_assistant_response(client) -> str:
     Returns:
         The assistant's response text or a default message.
     """
-    messages = client.beta.threads.messages.list(
-        thread_id=st.session_state.thread_id
-    ).data
+    with span("message_list"):
+        messages = rate_limiter.call(
+            "openai", client.beta.threads.messages.list,
+            priority=PRIORITY_IN_PROGRESS,
+            idempotent=True,
+            thread_id=st.session_state.thread_id,
+        ).data
     last_response = next((m for m in messages if m.role == "assistant"), None)
     if last_response:
         try:
@@ -67,71 +84,139 @@ def extract_assistant_response(client) -> str:
     return "No response received from assistant."
 
 
-def handle_tool_calls(client, run_status, run):
-    """Handle required tool calls and submit outputs.
+class RunPhases:
+    """Times how long a run spends queued and in progress, from its status changes.
+
+    Each stretch in one of TIMED_STATUSES is recorded as a span named after
+    it ("run_queued", "run_in_progress") that ends at the next status change.
+    """
+
+    TIMED_STATUSES = ("queued", "in_progress")
+
+    def __init__(self):
+        self._status = None
+        self._start = None
+
+    def update(self, status: str | None) -> None:
+        """Note the run's current status."""
+        if status == self._status:
+            return
+        self.end()
+        if status in self.TIMED_STATUSES:
+            self._status, self._start = status, time.perf_counter()
+
+    def end(self, outcome: str = OUTCOME_OK) -> None:
+        """Close the current stretch, if any."""
+        if self._status is not None:
+            record_span(f"run_{self._status}", self._start, outcome=outcome)
+            self._status = None
+
+
+@st.cache_resource(show_spinner=False)
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Create and cache the process-wide pool that runs tool calls."""
+    return ThreadPoolExecutor(max_workers=Config.TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+def call_tool(func_name: str, arguments: str, ctx=None) -> ToolResult:
+    """Call a registered tool, isolating any failure into an error result.
     
     Args:
-        client: Azure OpenAI client
-        run_status: Current run status object
-        run: The run object
+        func_name: Name of the tool in TOOL_REGISTRY
+        arguments: JSON-encoded tool arguments
+        ctx: Streamlit script run context to attach to the worker thread
+        
+    Returns:
+        ToolResult of the tool
+    """
+    if ctx is not None:
+        # Tools read st.session_state, which needs the session's context
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+    if func_name not in TOOL_REGISTRY:
+        return tool_error(f"Unknown function: {func_name}")
+
+    attributes = {"tool": func_name}
+    if func_name in IMAGE_TOOLS:
+        attributes["image_size"] = image_size_class(st.session_state.get("uploaded_image_ref"))
+    with span("tool", **attributes) as attributes:
+        try:
+            result = as_tool_result(TOOL_REGISTRY[func_name](**json.loads(arguments)))
+        except Exception as e:
+            result = tool_error(f"Tool {func_name} failed: {str(e)}")
+        attributes["outcome"] = OUTCOME_ERROR if result.is_error else OUTCOME_OK
+        return result
+
+
+def execute_tool_calls(run_status) -> tuple[list[dict], dict]:
+    """Execute the tool calls required by a run concurrently.
+    
+    Calls are dispatched to a bounded thread pool, each with its own timeout,
+    and outputs are gathered in the order the model requested them. A tool
+    that fails or times out produces an error output without affecting the
+    others.
+    
+    Args:
+        run_status: Run object in the requires_action state
+        
+    Returns:
+        (tool outputs ready for submit_tool_outputs, artifacts of the results
+        keyed like "cropped_image_data")
     """
     ra = run_status.required_action.submit_tool_outputs.model_dump()
+    actions = ra.get("tool_calls", [])
+    executor = get_tool_executor()
+    ctx = get_script_run_ctx()
+
+    dispatched = []
+    for action in actions:
+        func_name = action["function"]["name"]
+        timeout = Config.TOOL_TIMEOUTS_SEC.get(func_name, Config.TOOL_TIMEOUT_SEC)
+        # Each call gets a copy of this thread's context, so its span lands in the current trace
+        future = executor.submit(copy_context().run, call_tool, func_name, action["function"]["arguments"], ctx)
+        dispatched.append((action, future, time.time() + timeout))
+
     tool_outputs = []
-    
-    for action in ra.get("tool_calls", []):
+    artifacts = {}
+    for action, future, deadline in dispatched:
         func_name = action["function"]["name"]
-        arguments = json.loads(action["function"]["arguments"])
-        
-        # Use the tool registry to call the appropriate function
-        if func_name in TOOL_REGISTRY:
-            output = TOOL_REGISTRY[func_name](**arguments)
-            
-            # Special handling for crop_image tool
-            if func_name == "crop_image":
-                try:
-                    crop_result = json.loads(output)
-                    if "cropped_image_b64" in crop_result:
-                        # Store the cropped image in session state for display
-                        st.session_state.cropped_image_data = crop_result
-                        # Modify the output to be more user-friendly
-                        output = json.dumps({
-                            "success": True,
-                            "message": f"Image cropped successfully to {crop_result['cropped_size']['width']}x{crop_result['cropped_size']['height']} pixels"
-                        })
-                except:
-                    pass  # If parsing fails, use original output
-            
-            # Special handling for upscale_image tool
-            if func_name == "upscale_image":
-                try:
-                    upscale_result = json.loads(output)
-                    if "upscaled_image_b64" in upscale_result:
-                        # Store the upscaled image in session state for display
-                        st.session_state.upscaled_image_data = upscale_result
-                        # Modify the output to be more user-friendly
-                        scale = upscale_result.get('scale_factor', 'unknown')
-                        new_size = upscale_result.get('upscaled_size', {})
-                        width = new_size.get('width', 'unknown')
-                        height = new_size.get('height', 'unknown')
-                        output = json.dumps({
-                            "success": True,
-                            "message": f"Image upscaled {scale}x successfully to {width}x{height} pixels using OpenCV EDSR model"
-                        })
-                except:
-                    pass  # If parsing fails, use original output
-        else:
-            output = json.dumps({"error": f"Unknown function: {func_name}"})
+        try:
+            result = future.result(timeout=max(0, deadline - time.time()))
+        except FutureTimeoutError:
+            future.cancel()
+            result = tool_error(f"Tool {func_name} timed out. Please try again.")
+
+        artifacts.update(result.artifacts)
+        tool_outputs.append({"tool_call_id": action["id"], "output": result.output})
+
+    return tool_outputs, artifacts
+
+
+def handle_tool_calls(client, run_status, run) -> dict:
+    """Handle required tool calls and submit outputs.
+    
+    Args:
+        client: Azure OpenAI client
+        run_status: Current run status object
+        run: The run object
         
-        tool_outputs.append({"tool_call_id": action["id"], "output": output})
+    Returns:
+        Artifacts of the tool results
+    """
+    tool_outputs, artifacts = execute_tool_calls(run_status)
 
-    client.beta.threads.runs.submit_tool_outputs(
-        thread_id=st.session_state.thread_id,
-        run_id=run.id,
-        tool_outputs=tool_outputs,
-    )
+    with span("submit_tool_outputs"):
+        rate_limiter.call(
+            "openai", client.beta.threads.runs.submit_tool_outputs,
+            priority=PRIORITY_IN_PROGRESS,
+            thread_id=st.session_state.thread_id,
+            run_id=run.id,
+            tool_outputs=tool_outputs,
+        )
+    return artifacts
 
 
-def poll_run_completion(client, run, poll_interval_sec: float, max_wait_sec: int) -> str:
+def poll_run_completion(client, run, poll_interval_sec: float, max_wait_sec: int) -> tuple[str, dict]:
     """Poll for run completion and handle different statuses.
     
     Args:
@@ -141,39 +226,188 @@ def poll_run_completion(client, run, poll_interval_sec: float, max_wait_sec: int
         max_wait_sec: Maximum time to wait
         
     Returns:
-        Assistant response or error message
+        (assistant response or error message, artifacts of the tool calls)
     """
     start = time.time()
+    artifacts = {}
+    phase = RunPhases()
+    phase.update(getattr(run, "status", None))
 
     while True:
         if time.time() - start > max_wait_sec:
-            return "Timed out waiting for the assistant. Please try again."
+            return run_timed_out(client, run.id, phase), artifacts
 
-        time.sleep(poll_interval_sec)
-        run_status = client.beta.threads.runs.retrieve(
-            thread_id=st.session_state.thread_id,
-            run_id=run.id,
-        )
+        with span("poll_wait"):
+            time.sleep(poll_interval_sec)
+        with span("run_retrieve"):
+            run_status = rate_limiter.call(
+                "openai", client.beta.threads.runs.retrieve,
+                priority=PRIORITY_IN_PROGRESS,
+                idempotent=True,
+                thread_id=st.session_state.thread_id,
+                run_id=run.id,
+            )
         status = getattr(run_status, "status", None)
+        phase.update(status)
 
         if status == "completed":
-            return extract_assistant_response(client)
+            return extract_assistant_response(client), artifacts
 
         elif status == "requires_action":
-            handle_tool_calls(client, run_status, run)
+            artifacts.update(handle_tool_calls(client, run_status, run))
 
         elif status in {"failed", "cancelled", "expired"}:
             err = getattr(run_status, "last_error", None)
-            return f"Run {status}. {err if err else ''}"
+            return f"Run {status}. {err if err else ''}", artifacts
 
         # Continue polling for other statuses
 
 
-def run_conversation(user_message: str, image_data: str = None, poll_interval_sec: float = None, max_wait_sec: int = None) -> dict:
+def stream_run_completion(client, max_wait_sec: int, on_text=None) -> tuple[str, dict]:
+    """Run the assistant on the event stream and handle events as they arrive.
+    
+    Tool calls are executed as soon as the run requires action and their
+    outputs are submitted on a new stream, so no time is spent sleeping
+    between status checks. Each stream request times out at the turn's
+    deadline, so a stalled stream cannot outlive max_wait_sec; a run that
+    times out is cancelled, so the thread accepts the next message.
+    
+    Args:
+        client: Azure OpenAI client
+        max_wait_sec: Maximum time to wait
+        on_text: Optional callback receiving the assistant text streamed so far
+        
+    Returns:
+        (assistant response or error message, artifacts of the tool calls)
+    """
+    deadline = time.time() + max_wait_sec
+    text = ""
+    artifacts = {}
+    run_id = None
+    phase = RunPhases()
+
+    try:
+        with span("run_create"):
+            stream = rate_limiter.call(
+                "openai", client.beta.threads.runs.create,
+                thread_id=st.session_state.thread_id,
+                assistant_id=st.session_state.assistant_id,
+                stream=True,
+                timeout=max_wait_sec,
+            )
+
+        while stream is not None:
+            next_stream = None
+            with stream:
+                for event in stream:
+                    if time.time() > deadline:
+                        return run_timed_out(client, run_id, phase), artifacts
+
+                    if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step."):
+                        run_id = event.data.id
+                        phase.update(event.data.status)
+
+                    if event.event == "thread.message.created":
+                        # Only the latest assistant message is returned, matching polling mode
+                        text = ""
+
+                    elif event.event == "thread.message.delta":
+                        for part in event.data.delta.content or []:
+                            if part.type == "text" and part.text and part.text.value:
+                                text += part.text.value
+                                if on_text:
+                                    on_text(text)
+
+                    elif event.event == "thread.run.requires_action":
+                        tool_outputs, tool_artifacts = execute_tool_calls(event.data)
+                        artifacts.update(tool_artifacts)
+                        with span("submit_tool_outputs"):
+                            next_stream = rate_limiter.call(
+                                "openai", client.beta.threads.runs.submit_tool_outputs,
+                                priority=PRIORITY_IN_PROGRESS,
+                                thread_id=st.session_state.thread_id,
+                                run_id=event.data.id,
+                                tool_outputs=tool_outputs,
+                                stream=True,
+                                timeout=max(1.0, deadline - time.time()),
+                            )
+                        break
+
+                    elif event.event == "thread.run.completed":
+                        return (text if text.strip() else extract_assistant_response(client)), artifacts
+
+                    elif event.event in {"thread.run.failed", "thread.run.cancelled", "thread.run.expired"}:
+                        status = event.event.rsplit(".", 1)[-1]
+                        err = getattr(event.data, "last_error", None)
+                        return f"Run {status}. {err if err else ''}", artifacts
+
+                    elif event.event == "error":
+                        phase.end("error")
+                        return f"Run failed. {event.data}", artifacts
+
+            stream = next_stream
+    except Exception as e:
+        if not is_timeout(e):
+            raise
+        return run_timed_out(client, run_id, phase), artifacts
+
+    # Stream ended without a terminal event
+    phase.end()
+    return extract_assistant_response(client), artifacts
+
+
+def is_timeout(error: Exception) -> bool:
+    """Tell whether an OpenAI request, or the event stream it returned, ran out of time."""
+    from openai import APITimeoutError
+
+    if isinstance(error, APITimeoutError):
+        return True
+    # Reads of a streamed response raise httpx's own timeouts, unwrapped by the SDK
+    import httpx
+
+    return isinstance(error, httpx.TimeoutException)
+
+
+def run_timed_out(client, run_id: str | None, phase: RunPhases) -> str:
+    """End a run that exceeded the turn's deadline, cancelling it if it started, and describe the timeout."""
+    phase.end("timeout")
+    if run_id:
+        cancel_run(client, run_id, Config.JOB_CANCEL_WAIT_SEC)
+    return "Timed out waiting for the assistant. Please try again."
+
+
+def cancel_run(client, run_id: str, max_wait_sec: float) -> None:
+    """Cancel a run and wait briefly until it stops, so the thread accepts new messages."""
+    terminal = {"cancelled", "completed", "failed", "expired"}
+    try:
+        run = rate_limiter.call(
+            "openai", client.beta.threads.runs.cancel, priority=PRIORITY_IN_PROGRESS,
+            thread_id=st.session_state.thread_id, run_id=run_id,
+        )
+        deadline = time.time() + max_wait_sec
+        while run.status not in terminal and time.time() < deadline:
+            time.sleep(0.5)
+            run = rate_limiter.call(
+                "openai", client.beta.threads.runs.retrieve, priority=PRIORITY_IN_PROGRESS, idempotent=True,
+                thread_id=st.session_state.thread_id, run_id=run_id,
+            )
+    except Exception:
+        pass  # The run may already have finished
+
+
+def run_conversation(user_message: str, image_ref: str = None, poll_interval_sec: float = None, max_wait_sec: int = None, on_text=None) -> dict:
     """Run a conversation with the assistant and return the response.
     
+    Uses the streaming run engine unless Config.RUN_MODE is "poll".
+    
+    Args:
+        image_ref: Blob store reference of an uploaded image, if any
+        on_text: Optional callback receiving the assistant text streamed so far
+            (streaming mode only)
+    
     Returns:
-        dict with "content" key and optionally "cropped_image_data" or "upscaled_image_data" keys
+        dict with "content" key and the artifacts of the turn's tool calls,
+        keyed like "cropped_image_data" (see tools.result.ToolResult)
     """
     # Use config defaults if not provided
     if poll_interval_sec is None:
@@ -181,6 +415,13 @@ def run_conversation(user_message: str, image_data: str = None, poll_interval_se
     if max_wait_sec is None:
         max_wait_sec = Config.MAX_WAIT_SEC
     
+    trace = start_trace(mode=Config.RUN_MODE)
+    st.session_state.last_trace_id = trace.id
+    with use_trace(trace):
+        return _run_conversation(user_message, image_ref, poll_interval_sec, max_wait_sec, on_text)
+
+
+def _run_conversation(user_message: str, image_ref: str, poll_interval_sec: float, max_wait_sec: int, on_text) -> dict:
     client = get_azure_openai_client()
     
     # Validate assistant setup
@@ -188,21 +429,20 @@ def run_conversation(user_message: str, image_data: str = None, poll_interval_se
     if error:
         return {"content": error}
 
-    # Create user message and start run
-    create_user_message(client, user_message, image_data)
-    run = start_assistant_run(client)
-
-    # Poll for completion and return result
-    content = poll_run_completion(client, run, poll_interval_sec, max_wait_sec)
-    
-    # Check if there's cropped or upscaled image data from the tool calls
-    result = {"content": content}
-    if "cropped_image_data" in st.session_state:
-        result["cropped_image_data"] = st.session_state.cropped_image_data
-        del st.session_state.cropped_image_data  # Clean up
-    
-    if "upscaled_image_data" in st.session_state:
-        result["upscaled_image_data"] = st.session_state.upscaled_image_data
-        del st.session_state.upscaled_image_data  # Clean up
+    # Create user message and run to completion once an OpenAI run slot is free
+    admission_start = time.perf_counter()
+    try:
+        with admission.admit("openai"):
+            record_span("admission_wait", admission_start)
+            create_user_message(client, user_message, image_ref)
+            if Config.RUN_MODE == "poll":
+                run = start_assistant_run(client)
+                content, artifacts = poll_run_completion(client, run, poll_interval_sec, max_wait_sec)
+            else:
+                content, artifacts = stream_run_completion(client, max_wait_sec, on_text=on_text)
+    except AdmissionRejected as e:
+        record_span("admission_wait", admission_start, outcome="rejected")
+        return {"content": f"The assistant is busy right now. {e}"}
     
-    return result
\ No newline at end of file
+    # Attach the artifacts of the turn's tool calls, such as cropped or upscaled images
+    return {"content": content, **artifacts}
\ No newline at end of file
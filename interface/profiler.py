@@ -0,0 +1,216 @@
+"""Rerun profiler for the Streamlit render passes, enabled with RERUN_PROFILE=true.
+
+Every interaction reruns app.py from the top. While profiling, each rerun
+records:
+
+- the time spent in each profiled render function (sections are inclusive,
+  so render_chat_interface includes render_chat_history)
+- the time of each chat message block
+- the ForwardMsgs enqueued for the browser, their serialized bytes, and
+  the elements they add, by type
+- the bytes of the media files (images) registered for the browser to fetch
+
+One JSON line per rerun is appended to Config.RERUN_PROFILE_LOG, with the
+session ID, a per-session sequence number and running totals, so a
+session's rerun cost can be followed over time. Fragment-only reruns (the
+active job's progress) are logged too, with the fragment's name as kind.
+benchmarks/rerun_report.py summarizes the log.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from config.settings import Config
+from services.cache import TTLCache
+
+# Profile of the rerun executing in the current script thread
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+# Per-session rerun count and running totals, for the log
+_session_totals = TTLCache(max_entries=4096, ttl_sec=24 * 3600)
+_log_lock = threading.Lock()
+_install_lock = threading.Lock()
+
+
+class RerunProfile:
+    """What one script or fragment run cost."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.sections = Counter()  # render function -> ms
+        self.message_blocks = []  # (history index, ms)
+        self.forward_msgs = 0
+        self.forward_msg_bytes = 0
+        self.elements = Counter()  # element type -> count
+        self.media_files = 0
+        self.media_bytes = 0
+        self.attributes = {}
+        self._lock = threading.Lock()  # Messages may be enqueued from fragment worker threads
+
+    def count_message(self, msg) -> None:
+        size = msg.ByteSize()
+        element = msg.delta.new_element.WhichOneof("type") if msg.WhichOneof("type") == "delta" else None
+        with self._lock:
+            self.forward_msgs += 1
+            self.forward_msg_bytes += size
+            if element:
+                self.elements[element] += 1
+
+    def count_media(self, data) -> None:
+        with self._lock:
+            self.media_files += 1
+            if isinstance(data, bytes):
+                self.media_bytes += len(data)
+
+
+def install_media_counter() -> None:
+    """Count the media files each profiled rerun registers, once per media file manager."""
+    if not runtime.exists():
+        return
+    manager = runtime.get_instance().media_file_mgr
+    with _install_lock:
+        if getattr(manager, "_rerun_profiler_installed", False):
+            return
+        add = manager.add
+
+        def counting_add(path_or_data, *args, **kwargs):
+            profile = current_profile.get()
+            if profile is not None:
+                profile.count_media(path_or_data)
+            return add(path_or_data, *args, **kwargs)
+
+        manager.add = counting_add
+        manager._rerun_profiler_installed = True
+
+
+@contextmanager
+def profile_rerun(kind: str = "script"):
+    """Profile the block as one rerun and log it, unless profiling is off or a rerun is already profiled.
+
+    Yields the RerunProfile, or None when not profiling.
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if not Config.RERUN_PROFILE or ctx is None or current_profile.get() is not None:
+        yield None
+        return
+
+    install_media_counter()
+    profile = RerunProfile(kind)
+    enqueue = ctx._enqueue
+
+    def counting_enqueue(msg):
+        profile.count_message(msg)
+        enqueue(msg)
+
+    ctx._enqueue = counting_enqueue
+    token = current_profile.set(profile)
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield profile
+    except BaseException as e:
+        # st.rerun() and st.stop() end a run by raising, too
+        outcome = type(e).__name__
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ctx._enqueue = enqueue
+        current_profile.reset(token)
+        write_profile(ctx.session_id, profile, elapsed_ms, outcome)
+
+
+@contextmanager
+def profile_section(name: str):
+    """Add the block's duration to the named section of the current rerun's profile."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[name] += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def message_block(index: int):
+    """Time the rendering of one chat history message."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.message_blocks.append((index, (time.perf_counter() - start) * 1000))
+
+
+def profiled(name: str):
+    """Decorator timing a render function as a section of the rerun.
+
+    Called outside a profiled rerun, as fragments are when they rerun on
+    their own, the call is profiled as a rerun of its own.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not Config.RERUN_PROFILE:
+                return fn(*args, **kwargs)
+            with profile_rerun(kind=name), profile_section(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes) -> None:
+    """Attach details, such as the history length, to the current rerun's log line."""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.attributes.update(attributes)
+
+
+def write_profile(session_id: str, profile: RerunProfile, elapsed_ms: float, outcome: str) -> None:
+    """Append the rerun's profile to the log, with the session's running totals."""
+    totals = _session_totals.get(session_id) or {"reruns": 0, "ms": 0.0, "bytes": 0}
+    totals = {
+        "reruns": totals["reruns"] + 1,
+        "ms": totals["ms"] + elapsed_ms,
+        "bytes": totals["bytes"] + profile.forward_msg_bytes + profile.media_bytes,
+    }
+    _session_totals.set(session_id, totals)
+
+    blocks = profile.message_blocks
+    record = {
+        "ts": time.time(),
+        "session_id": session_id,
+        "rerun": totals["reruns"],
+        "kind": profile.kind,
+        "outcome": outcome,
+        "total_ms": round(elapsed_ms, 2),
+        "sections_ms": {name: round(ms, 2) for name, ms in profile.sections.items()},
+        "message_blocks": len(blocks),
+        "message_blocks_ms": round(sum(ms for _, ms in blocks), 2),
+        "slowest_message_block": (
+            {"index": max(blocks, key=lambda block: block[1])[0], "ms": round(max(ms for _, ms in blocks), 2)}
+            if blocks else None
+        ),
+        "forward_msgs": profile.forward_msgs,
+        "forward_msg_bytes": profile.forward_msg_bytes,
+        "elements": dict(profile.elements),
+        "media_files": profile.media_files,
+        "media_bytes": profile.media_bytes,
+        **profile.attributes,
+        "session_total_ms": round(totals["ms"], 2),
+        "session_total_bytes": totals["bytes"],
+    }
+    line = json.dumps(record) + "\n"
+    with _log_lock:
+        with open(Config.RERUN_PROFILE_LOG, "a") as f:
+            f.write(line)
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from config.settings import Config
+from services.metrics import register_collector
+
+# How often a queued caller is told its position
+POSITION_REPORT_INTERVAL_SEC = 0.5
+
+
+class AdmissionRejected(Exception):
+    """Raised when a backend sheds load: its queue is full or the wait timed out."""
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake  # Called once, under the controller lock, when a slot is handed over
+        self.granted = False
+
+
+class _Backend:
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_use = 0
+        self.queue = deque()  # _Waiter, first come first served
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_sec_total = 0.0
+
+
+class AdmissionController:
+    """Per-backend concurrency limits with a FIFO queue and load shedding.
+
+    Each backend (e.g. "openai", "vision", "upscaler") has a number of slots.
+    Callers that find every slot taken wait in line and are admitted in
+    arrival order as slots are released. A caller is rejected with
+    AdmissionRejected when the queue already holds max_queue waiters or when
+    it has waited longer than the queue timeout. Slots can be taken from
+    threads with admit() and from event loops with admit_async().
+    """
+
+    def __init__(self, limits: dict[str, int], max_queue: dict[str, int], queue_timeout_sec: float):
+        self._queue_timeout_sec = queue_timeout_sec
+        self._backends = {name: _Backend(limit, max_queue.get(name, 0)) for name, limit in limits.items()}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, backend: str, on_position=None):
+        """Hold one slot of a backend for the duration of the block, waiting in line if needed.
+
+        Args:
+            backend: Backend name
+            on_position: Optional callback receiving the caller's 1-based queue
+                position while it waits, and 0 once admitted
+        """
+        granted = threading.Event()
+        waiter = self._enqueue(backend, granted.set)
+        if waiter is not None:
+            self._wait(backend, waiter, granted.wait, on_position)
+        try:
+            yield
+        finally:
+            self._release(backend)
+
+    @asynccontextmanager
+    async def admit_async(self, backend: str, on_position=None):
+        """Async counterpart of admit; waiting does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+        waiter = self._enqueue(backend, lambda: loop.call_soon_threadsafe(granted.set))
+        if waiter is not None:
+            start = time.monotonic()
+            try:
+                while not granted.is_set():
+                    self._check_timeout(backend, waiter, start)
+                    if on_position:
+                        on_position(self.position(backend, waiter))
+                    try:
+                        await asyncio.wait_for(granted.wait(), POSITION_REPORT_INTERVAL_SEC)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._abandon(backend, waiter)
+                raise
+            self._record_wait(backend, start)
+            if on_position:
+                on_position(0)
+        try:
+            yield
+        finally:
+            self._release(backend)
+
+    def position(self, backend: str, waiter: _Waiter) -> int:
+        """Return a waiter's 1-based position in its backend's queue, or 0 if admitted."""
+        with self._lock:
+            queue = self._backends[backend].queue
+            return queue.index(waiter) + 1 if waiter in queue else 0
+
+    def stats(self) -> dict:
+        """Return slot usage, queue length and counters per backend."""
+        with self._lock:
+            return {
+                name: {
+                    "limit": b.limit,
+                    "in_use": b.in_use,
+                    "queued": len(b.queue),
+                    "max_queue": b.max_queue,
+                    "admitted": b.admitted,
+                    "rejected": b.rejected,
+                    "timed_out": b.timed_out,
+                    "wait_sec_total": b.wait_sec_total,
+                }
+                for name, b in self._backends.items()
+            }
+
+    def collect_metrics(self) -> list[tuple]:
+        """Describe the controller's state as metric families for services.metrics."""
+        stats = self.stats()
+
+        def samples(field):
+            return [({"backend": name}, s[field]) for name, s in stats.items()]
+
+        return [
+            ("admission_slots_limit", "gauge", "Concurrency limit per backend", samples("limit")),
+            ("admission_slots_in_use", "gauge", "Slots currently held per backend", samples("in_use")),
+            ("admission_queue_length", "gauge", "Callers waiting for a slot per backend", samples("queued")),
+            ("admission_admitted_total", "counter", "Callers admitted per backend", samples("admitted")),
+            ("admission_rejected_total", "counter", "Callers rejected because the queue was full", samples("rejected")),
+            ("admission_timed_out_total", "counter", "Callers rejected after waiting too long", samples("timed_out")),
+            ("admission_wait_seconds_total", "counter", "Total time spent waiting for a slot", samples("wait_sec_total")),
+        ]
+
+    def _enqueue(self, backend: str, wake) -> _Waiter | None:
+        """Take a free slot, or join the queue; returns None when admitted immediately.
+
+        wake is set on the waiter before it becomes visible to _release, so a
+        slot handed over right after the lock is released is never lost.
+        """
+        with self._lock:
+            b = self._backends[backend]
+            if b.in_use < b.limit and not b.queue:
+                b.in_use += 1
+                b.admitted += 1
+                return None
+            if len(b.queue) >= b.max_queue:
+                b.rejected += 1
+                raise AdmissionRejected(f"{backend} is overloaded ({len(b.queue)} requests waiting). Please try again shortly.")
+            waiter = _Waiter(wake)
+            b.queue.append(waiter)
+            return waiter
+
+    def _wait(self, backend: str, waiter: _Waiter, wait, on_position) -> None:
+        """Block until the waiter is granted a slot, reporting its position meanwhile."""
+        start = time.monotonic()
+        try:
+            while True:
+                if on_position:
+                    on_position(self.position(backend, waiter))
+                if wait(POSITION_REPORT_INTERVAL_SEC):
+                    break
+                self._check_timeout(backend, waiter, start)
+        except BaseException:
+            self._abandon(backend, waiter)
+            raise
+        self._record_wait(backend, start)
+        if on_position:
+            on_position(0)
+
+    def _check_timeout(self, backend: str, waiter: _Waiter, start: float) -> None:
+        if time.monotonic() - start < self._queue_timeout_sec:
+            return
+        with self._lock:
+            if waiter.granted:
+                return  # Admitted just now; the caller will notice on its next check
+            self._backends[backend].queue.remove(waiter)
+            self._backends[backend].timed_out += 1
+        raise AdmissionRejected(f"Timed out waiting for {backend}. Please try again shortly.")
+
+    def _abandon(self, backend: str, waiter: _Waiter) -> None:
+        """Leave the queue, passing the slot on if it was granted in the meantime."""
+        with self._lock:
+            queue = self._backends[backend].queue
+            if waiter in queue:
+                queue.remove(waiter)
+            if not waiter.granted:
+                return
+        self._release(backend)
+
+    def _record_wait(self, backend: str, start: float) -> None:
+        with self._lock:
+            self._backends[backend].admitted += 1
+            self._backends[backend].wait_sec_total += time.monotonic() - start
+
+    def _release(self, backend: str) -> None:
+        """Hand the slot to the next waiter, or free it."""
+        with self._lock:
+            b = self._backends[backend]
+            if b.queue:
+                waiter = b.queue.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                b.in_use -= 1
+
+
+# Shared by every session in the process
+admission = AdmissionController(
+    limits=Config.ADMISSION_LIMITS,
+    max_queue=Config.ADMISSION_MAX_QUEUE,
+    queue_timeout_sec=Config.ADMISSION_QUEUE_TIMEOUT_SEC,
+)
+register_collector(admission.collect_metrics)
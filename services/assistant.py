@@ -1,28 +1,106 @@
+import hashlib
+import json
+import threading
 import streamlit as st
 from services.azure_client import get_azure_openai_client
+from services.thread_pool import get_thread_pool
 from tools.registry import TOOLS_LIST
 from config.settings import Config
 
-def ensure_assistant_and_thread():
-    """Create assistant/thread only when first needed to avoid blank page on load."""
+# Whether warm_thread_pool has already started in this process
+_warm_started = False
+_warm_lock = threading.Lock()
+
+
+def assistant_fingerprint() -> str:
+    """Hash the settings that define the assistant so changes can be detected."""
+    payload = json.dumps({
+        "instructions": Config.ASSISTANT_INSTRUCTIONS,
+        "model": Config.AZURE_OPENAI_MODEL,
+        "tools": TOOLS_LIST,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_assistant_id(fingerprint: str) -> str:
+    """Look up, update or create the assistant shared by every session in the process.
+
+    The assistant is tagged with the fingerprint in its metadata. An existing
+    assistant with the same name is reused as-is when its fingerprint matches
+    and updated in place when it does not, so a new one is only created the
+    first time the app is deployed against a resource.
+
+    Args:
+        fingerprint: Hash returned by assistant_fingerprint()
+
+    Returns:
+        The assistant ID
+    """
     client = get_azure_openai_client()
+    metadata = {"app": Config.ASSISTANT_METADATA_APP, "fingerprint": fingerprint}
+
+    stale = None
+    for assistant in client.beta.assistants.list(limit=100, order="desc"):
+        assistant_metadata = assistant.metadata or {}
+        if assistant_metadata.get("app") != Config.ASSISTANT_METADATA_APP:
+            continue
+        if assistant_metadata.get("fingerprint") == fingerprint:
+            return assistant.id
+        if stale is None and assistant.name == Config.ASSISTANT_NAME:
+            stale = assistant
 
+    if stale is not None:
+        assistant = client.beta.assistants.update(
+            stale.id,
+            instructions=Config.ASSISTANT_INSTRUCTIONS,
+            tools=TOOLS_LIST,
+            model=Config.AZURE_OPENAI_MODEL,
+            metadata=metadata,
+        )
+        return assistant.id
+
+    assistant = client.beta.assistants.create(
+        name=Config.ASSISTANT_NAME,
+        instructions=Config.ASSISTANT_INSTRUCTIONS,
+        tools=TOOLS_LIST,
+        model=Config.AZURE_OPENAI_MODEL,
+        metadata=metadata,
+    )
+    return assistant.id
+
+
+def warm_thread_pool():
+    """Start filling the thread pool early so the first message gets a ready thread.
+    
+    Creating the pool imports the OpenAI SDK and builds the client, so it is
+    done once per process on a background thread instead of in the render.
+    """
+    global _warm_started
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+
+    def warm():
+        try:
+            get_thread_pool()
+        except Exception:
+            pass  # Setup errors are surfaced when the first message is sent
+    threading.Thread(target=warm, name="thread-pool-warmup", daemon=True).start()
+
+
+def ensure_assistant_and_thread():
+    """Attach the shared assistant and create a thread only when first needed to avoid blank page on load."""
     if "assistant_id" not in st.session_state:
         try:
             with st.spinner("Setting up assistant..."):
-                assistant = client.beta.assistants.create(
-                    name=Config.ASSISTANT_NAME,
-                    instructions=Config.ASSISTANT_INSTRUCTIONS,
-                    tools=TOOLS_LIST,
-                    model=Config.AZURE_OPENAI_MODEL,
-                )
-                st.session_state.assistant_id = assistant.id
+                st.session_state.assistant_id = get_shared_assistant_id(assistant_fingerprint())
         except Exception as e:
             st.session_state.assistant_error = str(e)
 
     if "thread_id" not in st.session_state and "assistant_id" in st.session_state:
         try:
-            thread = client.beta.threads.create()
-            st.session_state.thread_id = thread.id
+            st.session_state.thread_id = get_thread_pool().acquire()
         except Exception as e:
-            st.session_state.assistant_error = str(e)
\ No newline at end of file
+            st.session_state.assistant_error = str(e)
@@ -0,0 +1,24 @@
+import asyncio
+import weakref
+import aiohttp
+from config.settings import Config
+
+# One pooled aiohttp session per event loop
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """Return the keep-alive aiohttp session for the running event loop."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=Config.ASYNC_HTTP_POOL_SIZE))
+        _sessions[loop] = session
+    return session
+
+
+async def close_aiohttp_session() -> None:
+    """Close the running event loop's session; call before the loop shuts down."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
@@ -1,12 +1,45 @@
+import asyncio
+import weakref
 import streamlit as st
-from openai import AzureOpenAI
 from config.settings import Config
 
 @st.cache_resource(show_spinner=False)
 def get_azure_openai_client():
     """Create and cache the Azure OpenAI client."""
+    from openai import AzureOpenAI  # Deferred: the SDK is slow to import
+
     return AzureOpenAI(
         azure_endpoint=Config.AZURE_OPENAI_ENDPOINT,
         api_key=Config.AZURE_OPENAI_API_KEY,
         api_version=Config.AZURE_OPENAI_API_VERSION,
-    )
\ No newline at end of file
+        max_retries=Config.OPENAI_MAX_RETRIES,
+    )
+
+def create_async_azure_openai_client():
+    """Create an async Azure OpenAI client.
+
+    Not cached: the client's connection pool is bound to the event loop it is
+    first used on, so create one per loop and close it with ``await client.close()``.
+    """
+    from openai import AsyncAzureOpenAI
+
+    return AsyncAzureOpenAI(
+        azure_endpoint=Config.AZURE_OPENAI_ENDPOINT,
+        api_key=Config.AZURE_OPENAI_API_KEY,
+        api_version=Config.AZURE_OPENAI_API_VERSION,
+        max_retries=Config.OPENAI_MAX_RETRIES,
+    )
+
+
+# One async client per event loop, since its connection pool is bound to the loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_azure_openai_client():
+    """Return the async Azure OpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = create_async_azure_openai_client()
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,184 @@
+import contextvars
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from config.settings import Config
+
+
+class BlobStore:
+    """Content-addressed byte store: an in-memory LRU over a disk spill directory.
+
+    Blobs are keyed by the SHA-256 of their bytes, so session state and tool
+    results only carry the short hex reference. Blobs pushed out of memory
+    (by the process budget or their session's budget) are written to the
+    spill directory and promoted back on the next read. The spill directory
+    has its own budget; blobs evicted from it are gone and get() returns None.
+    """
+
+    def __init__(self, spill_dir: str, memory_budget_bytes: int, session_budget_bytes: int, disk_budget_bytes: int):
+        self._spill_dir = spill_dir
+        self._memory_budget = memory_budget_bytes
+        self._session_budget = session_budget_bytes
+        self._disk_budget = disk_budget_bytes
+
+        self._memory = OrderedDict()  # ref -> bytes, least recently used first
+        self._memory_bytes = 0
+        self._sessions = {}  # session_id -> OrderedDict(ref -> size) of memory-resident blobs
+        self._disk = OrderedDict()  # ref -> size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(spill_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def put(self, data: bytes, session_id: str = None) -> str:
+        """Store bytes and return their reference."""
+        ref = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+            else:
+                self._memory[ref] = data
+                self._memory_bytes += len(data)
+
+            if session_id is not None:
+                owned = self._sessions.setdefault(session_id, OrderedDict())
+                owned[ref] = len(data)
+                owned.move_to_end(ref)
+                while sum(owned.values()) > self._session_budget and len(owned) > 1:
+                    self._spill(next(iter(owned)))
+
+            while self._memory_bytes > self._memory_budget and len(self._memory) > 1:
+                self._spill(next(iter(self._memory)))
+        return ref
+
+    def get(self, ref: str) -> bytes | None:
+        """Return the bytes for a reference, or None if they have been evicted."""
+        with self._lock:
+            data = self._memory.get(ref)
+            if data is not None:
+                self._memory.move_to_end(ref)
+                return data
+
+            if ref not in self._disk:
+                return None
+            try:
+                with open(self._path(ref), "rb") as f:
+                    data = f.read()
+            except OSError:
+                self._forget_disk(ref)
+                return None
+
+            self._disk.move_to_end(ref)
+            self._memory[ref] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self._memory_budget and len(self._memory) > 1:
+                self._spill(next(iter(self._memory)))
+            return data
+
+    def stats(self) -> dict:
+        """Return current memory and disk usage."""
+        with self._lock:
+            return {
+                "memory_blobs": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_blobs": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "sessions": len(self._sessions),
+            }
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self._spill_dir, ref)
+
+    def _load_disk_index(self) -> None:
+        """Index blobs spilled by earlier processes, oldest first."""
+        entries = []
+        for name in os.listdir(self._spill_dir):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(self._path(name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, ref, size in sorted(entries):
+            self._disk[ref] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _spill(self, ref: str) -> None:
+        """Move a blob from memory to the spill directory."""
+        data = self._memory.pop(ref)
+        self._memory_bytes -= len(data)
+        for session_id in list(self._sessions):
+            owned = self._sessions[session_id]
+            owned.pop(ref, None)
+            if not owned:
+                del self._sessions[session_id]
+
+        if ref in self._disk:
+            self._disk.move_to_end(ref)
+            return
+        tmp_path = self._path(ref) + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(ref))
+        except OSError:
+            return  # Blob is dropped if it cannot be spilled
+        self._disk[ref] = len(data)
+        self._disk_bytes += len(data)
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self._disk_budget and self._disk:
+            ref = next(iter(self._disk))
+            try:
+                os.remove(self._path(ref))
+            except OSError:
+                pass
+            self._forget_disk(ref)
+
+    def _forget_disk(self, ref: str) -> None:
+        size = self._disk.pop(ref, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+
+@st.cache_resource(show_spinner=False)
+def get_blob_store() -> BlobStore:
+    """Create and cache the process-wide image blob store."""
+    mb = 1024 * 1024
+    return BlobStore(
+        Config.BLOB_STORE_DIR,
+        memory_budget_bytes=Config.BLOB_MEMORY_BUDGET_MB * mb,
+        session_budget_bytes=Config.BLOB_SESSION_BUDGET_MB * mb,
+        disk_budget_bytes=Config.BLOB_DISK_BUDGET_MB * mb,
+    )
+
+
+# Session of the background job running in the current task or thread, which
+# has no Streamlit script run context to read it from
+job_session_id = contextvars.ContextVar("job_session_id", default=None)
+
+
+def current_session_id() -> str | None:
+    """Return the Streamlit session ID of the calling thread or job, if any."""
+    session_id = job_session_id.get()
+    if session_id is not None:
+        return session_id
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def put_blob(data: bytes, session_id: str = None) -> str:
+    """Store bytes against a session's budget (default: the current one) and return their reference."""
+    return get_blob_store().put(data, session_id=session_id or current_session_id())
+
+
+def get_blob(ref: str) -> bytes | None:
+    """Return the bytes for a reference, or None if they have been evicted."""
+    return get_blob_store().get(ref)
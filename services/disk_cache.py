@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class DiskLRUCache:
+    """Byte cache stored as files in a directory, evicting least recently used entries by total size.
+
+    Recency is kept in file modification times, so the LRU order survives
+    restarts and the index can be rebuilt from the directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached bytes for key, or None on a miss."""
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                self._misses += 1
+                return None
+            path = os.path.join(self._directory, name)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self._total_bytes -= self._entries.pop(name)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self._hits += 1
+            return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """Store bytes under key and evict old entries beyond the size budget."""
+        name = self._name(key)
+        path = os.path.join(self._directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # Caching is best-effort
+        with self._lock:
+            self._total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def stats(self) -> dict:
+        """Return hit/miss counts, entry count and total size."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self._max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
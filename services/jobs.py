@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+import uuid
+import streamlit as st
+from config.settings import Config
+from services.metrics import register_collector
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = {JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED}
+
+
+class Job:
+    """State of one background job, updated by the job and read by the UI.
+
+    Progress fields (run_status, run_id, current_tools, text) are set by the
+    job itself through update(); readers should use snapshot().
+    """
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = JOB_QUEUED
+        self.run_id = None
+        self.run_status = None
+        self.queue_position = 0
+        self.current_tools = []
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **fields) -> None:
+        """Set progress fields from the job."""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def snapshot(self) -> dict:
+        """Return a consistent copy of the job's state."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "run_id": self.run_id,
+                "run_status": self.run_status,
+                "queue_position": self.queue_position,
+                "current_tools": list(self.current_tools),
+                "text": self.text,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobRunner:
+    """Runs coroutine jobs on one background event loop shared by every session.
+
+    At most max_concurrent jobs run at a time; the rest wait in FIFO order.
+    Jobs are kept for result_ttl_sec after they finish so a session can pick
+    up the result on a later rerun.
+    """
+
+    def __init__(self, max_concurrent: int, result_ttl_sec: float):
+        self._result_ttl_sec = result_ttl_sec
+        self._jobs = {}  # job ID -> Job
+        self._futures = {}  # job ID -> concurrent.futures.Future of the running coroutine
+        self._lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._slots = asyncio.Semaphore(max_concurrent)
+        worker = threading.Thread(target=self._loop.run_forever, name="job-runner", daemon=True)
+        worker.start()
+
+    def submit(self, fn, *args, **kwargs) -> str:
+        """Start a job and return its ID.
+
+        Args:
+            fn: Async callable invoked as fn(job, *args, **kwargs); its return
+                value becomes the job's result
+        """
+        self._prune()
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._futures[job.id] = asyncio.run_coroutine_threadsafe(self._run(job, fn, args, kwargs), self._loop)
+        return job.id
+
+    def get(self, job_id: str) -> dict | None:
+        """Return a snapshot of a job, or None if it is unknown or was pruned."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job.
+
+        Returns:
+            True if the job was still unfinished and is now being cancelled
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None or future is None or job.status in FINISHED_STATES:
+            return False
+        job.update(status=JOB_CANCELLING)
+        # Cancels the task on the loop; the job sees CancelledError at its current await
+        future.cancel()
+        return True
+
+    def stats(self) -> dict:
+        """Return the number of jobs per status."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            status = job.snapshot()["status"]
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def collect_metrics(self) -> list[tuple]:
+        """Describe the jobs as metric families for services.metrics."""
+        counts = self.stats()
+        states = [JOB_QUEUED, JOB_RUNNING, JOB_CANCELLING, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED]
+        return [
+            ("jobs", "gauge", "Jobs known to the runner per status",
+             [({"status": status}, counts.get(status, 0)) for status in states]),
+        ]
+
+    async def _run(self, job: Job, fn, args, kwargs):
+        try:
+            async with self._slots:
+                job.update(status=JOB_RUNNING, started_at=time.time())
+                result = await fn(job, *args, **kwargs)
+            job.update(status=JOB_COMPLETED, result=result)
+        except asyncio.CancelledError:
+            job.update(status=JOB_CANCELLED)
+        except Exception as e:
+            job.update(status=JOB_FAILED, error=str(e))
+        finally:
+            job.update(finished_at=time.time(), current_tools=[])
+            with self._lock:
+                self._futures.pop(job.id, None)
+
+    def _prune(self) -> None:
+        """Forget finished jobs past the result TTL."""
+        cutoff = time.time() - self._result_ttl_sec
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                finished_at = job.snapshot()["finished_at"]
+                if finished_at is not None and finished_at < cutoff:
+                    del self._jobs[job_id]
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner() -> JobRunner:
+    """Create and cache the process-wide job runner."""
+    runner = JobRunner(max_concurrent=Config.JOB_MAX_CONCURRENT, result_ttl_sec=Config.JOB_RESULT_TTL_SEC)
+    register_collector(runner.collect_metrics)
+    return runner
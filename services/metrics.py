@@ -0,0 +1,92 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import streamlit as st
+from config.settings import Config
+
+METRIC_PREFIX = "visionbot_"
+
+# Callables returning metric families as (name, type, help, [(labels, value), ...])
+_collectors = []
+_collectors_lock = threading.Lock()
+
+
+def register_collector(collect) -> None:
+    """Add a source of metric families to the exporter.
+
+    Args:
+        collect: Callable returning a list of (name, type, help, samples)
+            tuples, where type is "gauge", "counter" or "histogram" and
+            samples is a list of (labels dict, value) pairs. Histogram
+            samples are (suffix, labels dict, value) triples, the suffix
+            being "_bucket", "_sum" or "_count"
+    """
+    with _collectors_lock:
+        _collectors.append(collect)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def format_value(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_prometheus() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    with _collectors_lock:
+        collectors = list(_collectors)
+
+    lines = []
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception:
+            continue  # One broken source should not hide the others
+        for name, metric_type, help_text, samples in families:
+            full_name = METRIC_PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for sample in samples:
+                suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+                lines.append(f"{full_name}{suffix}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are too frequent to log
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics on the given port from a daemon thread."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    return server
+
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_server() -> ThreadingHTTPServer | None:
+    """Start the process-wide metrics exporter once, if Config.METRICS_PORT is set."""
+    if not Config.METRICS_PORT:
+        return None
+    return start_metrics_server(Config.METRICS_PORT)
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from config.settings import Config
+from services.metrics import register_collector
+
+# Calls that keep an in-progress run moving (tool output submission, status
+# checks) go before calls that start new work
+PRIORITY_IN_PROGRESS = 0
+PRIORITY_NEW = 1
+
+# Statuses retried with backoff. A 429 means the request was not processed, so
+# every call is retried; after a 5xx a POST may already have taken effect, so
+# only idempotent calls (reads such as runs.retrieve) are retried
+THROTTLED_STATUS = 429
+IDEMPOTENT_RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class _MemoryState:
+    """Bucket state shared by the threads of one process."""
+
+    def __init__(self):
+        self._buckets = {}  # endpoint -> [tokens, updated_at, blocked_until]
+        self._lock = threading.Lock()
+
+    def try_take(self, endpoint: str, rate: float, burst: float, floor: float, now: float) -> float:
+        with self._lock:
+            bucket = self._buckets.setdefault(endpoint, [burst, now, 0.0])
+            return _take(bucket, rate, burst, floor, now)
+
+    def block(self, endpoint: str, until: float, burst: float, now: float) -> None:
+        with self._lock:
+            bucket = self._buckets.setdefault(endpoint, [burst, now, 0.0])
+            bucket[2] = max(bucket[2], until)
+
+
+class _SqliteState:
+    """Bucket state in a SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "endpoint TEXT PRIMARY KEY, tokens REAL, updated_at REAL, blocked_until REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _update(self, endpoint: str, burst: float, now: float, change) -> float:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE endpoint = ?", (endpoint,)
+            ).fetchone()
+            bucket = list(row) if row else [burst, now, 0.0]
+            result = change(bucket)
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (endpoint, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                (endpoint, *bucket),
+            )
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def try_take(self, endpoint: str, rate: float, burst: float, floor: float, now: float) -> float:
+        return self._update(endpoint, burst, now, lambda bucket: _take(bucket, rate, burst, floor, now))
+
+    def block(self, endpoint: str, until: float, burst: float, now: float) -> None:
+        def extend(bucket):
+            bucket[2] = max(bucket[2], until)
+        self._update(endpoint, burst, now, extend)
+
+
+def _take(bucket: list, rate: float, burst: float, floor: float, now: float) -> float:
+    """Refill a [tokens, updated_at, blocked_until] bucket and take a token if allowed.
+
+    A token is only taken while more than floor tokens remain, which keeps a
+    reserve for higher-priority callers.
+
+    Returns:
+        0 if a token was taken, otherwise the seconds to wait before retrying
+    """
+    tokens, updated_at, blocked_until = bucket
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    bucket[0], bucket[1] = tokens, now
+    if now < blocked_until:
+        return blocked_until - now
+    if tokens - 1 >= floor:
+        bucket[0] = tokens - 1
+        return 0.0
+    return (floor + 1 - tokens) / rate
+
+
+class RateLimiter:
+    """Token buckets per endpoint with priorities and 429-aware backoff.
+
+    Every call takes a token from its endpoint's bucket first. New work may
+    not take the last reserve share of the bucket, so calls of in-progress
+    runs still get through when traffic is heavy. Throttled (HTTP 429) and
+    5xx responses of idempotent calls are retried with jittered exponential
+    backoff, and a Retry-After on them pauses the whole endpoint for every
+    caller.
+
+    With a state path the buckets live in a SQLite file, so every process on
+    the host shares one budget; otherwise they are per process.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]], new_work_reserve: float,
+                 max_retries: int, backoff_sec: float, max_backoff_sec: float, state_path: str = ""):
+        self._limits = limits
+        self._new_work_reserve = new_work_reserve
+        self._max_retries = max_retries
+        self._backoff_sec = backoff_sec
+        self._max_backoff_sec = max_backoff_sec
+        self._state = _SqliteState(state_path) if state_path else _MemoryState()
+        self._lock = threading.Lock()
+        self._stats = {}  # endpoint -> {"calls", "throttled", "wait_sec_total"}
+
+    def call(self, endpoint: str, fn, *args, priority: int = PRIORITY_NEW, idempotent: bool = False, **kwargs):
+        """Call fn(*args, **kwargs) within the endpoint's rate, retrying throttled calls.
+
+        Calls marked idempotent are retried on 5xx responses too.
+        """
+        for attempt in range(self._max_retries + 1):
+            while (wait := self._try_take(endpoint, priority)) > 0:
+                self._record(endpoint, wait_sec=wait)
+                time.sleep(wait + random.uniform(0, 0.05))
+            try:
+                self._record(endpoint, calls=1)
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._throttled_delay(endpoint, e, attempt, idempotent)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def call_async(self, endpoint: str, fn, *args, priority: int = PRIORITY_NEW, idempotent: bool = False,
+                         **kwargs):
+        """Async counterpart of call for a coroutine function fn.
+
+        SQLite bucket state is read and written in a worker thread, so a busy
+        database does not stall the event loop.
+        """
+        for attempt in range(self._max_retries + 1):
+            while (wait := await self._off_loop(self._try_take, endpoint, priority)) > 0:
+                self._record(endpoint, wait_sec=wait)
+                await asyncio.sleep(wait + random.uniform(0, 0.05))
+            try:
+                self._record(endpoint, calls=1)
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = await self._off_loop(self._throttled_delay, endpoint, e, attempt, idempotent)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Return call, throttle and wait counts per endpoint."""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+
+    def collect_metrics(self) -> list[tuple]:
+        """Describe the limiter's counters as metric families for services.metrics."""
+        stats = self.stats()
+
+        def samples(field):
+            return [({"endpoint": endpoint}, counts[field]) for endpoint, counts in stats.items()]
+
+        return [
+            ("rate_limit_calls_total", "counter", "Calls made through the rate limiter", samples("calls")),
+            ("rate_limit_throttled_total", "counter", "Calls answered with HTTP 429", samples("throttled")),
+            ("rate_limit_wait_seconds_total", "counter", "Time spent waiting for a token", samples("wait_sec_total")),
+        ]
+
+    async def _off_loop(self, fn, *args):
+        """Run a bucket state operation, in a worker thread when the state is in SQLite."""
+        if isinstance(self._state, _SqliteState):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _try_take(self, endpoint: str, priority: int) -> float:
+        if endpoint not in self._limits:
+            return 0.0
+        rate, burst = self._limits[endpoint]
+        # The reserve never covers the whole bucket, so small bursts still admit new work
+        floor = max(0.0, min(burst * self._new_work_reserve, burst - 1)) if priority == PRIORITY_NEW else 0.0
+        return self._state.try_take(endpoint, rate, burst, floor, time.time())
+
+    def _throttled_delay(self, endpoint: str, error: Exception, attempt: int, idempotent: bool) -> float | None:
+        """Return the backoff before retrying a failed call, or None to give up.
+
+        A Retry-After on the response pauses the endpoint for every caller.
+        """
+        status = getattr(error, "status_code", None)
+        retryable = status == THROTTLED_STATUS or (idempotent and status in IDEMPOTENT_RETRY_STATUSES)
+        if not retryable or attempt == self._max_retries:
+            return None
+        if status == 429:
+            self._record(endpoint, throttled=1)
+
+        # Full jitter over the exponential backoff, never earlier than Retry-After
+        delay = random.uniform(0, min(self._max_backoff_sec, self._backoff_sec * (2 ** attempt)))
+        retry_after = retry_after_sec(error)
+        if retry_after is not None:
+            now = time.time()
+            burst = self._limits.get(endpoint, (1.0, 1.0))[1]
+            self._state.block(endpoint, now + retry_after, burst, now)
+            delay += retry_after
+        return delay
+
+    def _record(self, endpoint: str, calls: int = 0, throttled: int = 0, wait_sec: float = 0.0) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"calls": 0, "throttled": 0, "wait_sec_total": 0.0})
+            stats["calls"] += calls
+            stats["throttled"] += throttled
+            stats["wait_sec_total"] += wait_sec
+
+
+def retry_after_sec(error: Exception) -> float | None:
+    """Read the Retry-After delay from a throttled OpenAI or Azure SDK error."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass  # HTTP-date values fall back to the computed backoff
+    return None
+
+
+# Shared by every session in the process
+rate_limiter = RateLimiter(
+    limits=Config.RATE_LIMITS,
+    new_work_reserve=Config.RATE_LIMIT_NEW_WORK_RESERVE,
+    max_retries=Config.RATE_LIMIT_MAX_RETRIES,
+    backoff_sec=Config.RATE_LIMIT_BACKOFF_SEC,
+    max_backoff_sec=Config.RATE_LIMIT_MAX_BACKOFF_SEC,
+    state_path=Config.RATE_LIMIT_STATE_PATH,
+)
+register_collector(rate_limiter.collect_metrics)
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls so each key has at most one call in flight.
+
+    Keys are tuples whose first element names the backend (e.g. "vision"),
+    which is used to group the metrics. Callers that arrive while a call with
+    the same key is running wait for it and share its result or exception.
+    Threads coalesce through do() and coroutines on one event loop through
+    do_async().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}  # (event loop, key) -> asyncio.Task
+        self._stats = {}  # namespace -> {"calls": n, "coalesced": n}
+
+    def do(self, key: tuple, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs), or wait for the identical call already in flight."""
+        with self._lock:
+            stats = self._stats.setdefault(key[0], {"calls": 0, "coalesced": 0})
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                stats["calls"] += 1
+            else:
+                stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: tuple, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs), or the identical call already in flight on this event loop.
+
+        A caller that is cancelled stops waiting without cancelling the
+        shared call, which other callers may still be waiting for.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            stats = self._stats.setdefault(key[0], {"calls": 0, "coalesced": 0})
+            task = self._async_calls.get((loop, key))
+            if task is None:
+                task = loop.create_task(fn(*args, **kwargs))
+                self._async_calls[(loop, key)] = task
+                task.add_done_callback(lambda _: self._forget_async(loop, key))
+                stats["calls"] += 1
+            else:
+                stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget_async(self, loop, key: tuple) -> None:
+        with self._lock:
+            del self._async_calls[(loop, key)]
+
+    def stats(self) -> dict:
+        """Return executed and coalesced call counts per namespace."""
+        with self._lock:
+            keys = list(self._calls) + [key for _, key in self._async_calls]
+            return {
+                namespace: {**counts, "in_flight": sum(1 for k in keys if k[0] == namespace)}
+                for namespace, counts in self._stats.items()
+            }
+
+
+# Shared by every tool in the process
+single_flight = SingleFlight()
@@ -0,0 +1,249 @@
+import asyncio
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config.settings import Config
+from services.cache import TTLCache
+from services.metrics import format_value, register_collector
+
+# Upper bounds of the stage latency histogram buckets, in seconds
+LATENCY_BUCKETS_SEC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+
+# Span attributes that become histogram labels; the rest only appear in traces
+HISTOGRAM_LABELS = ("tool", "image_size")
+
+
+class Histogram:
+    """Cumulative histogram per label set, exported in the Prometheus format."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self._buckets = buckets
+        self._series = {}  # sorted label items -> [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: dict) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self._buckets) + [0.0, 0])
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect_metrics(self) -> list[tuple]:
+        """Describe the histogram as a metric family for services.metrics."""
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+
+        samples = []
+        for key, values in series.items():
+            labels = dict(key)
+            for bound, count in zip(self._buckets, values):
+                samples.append(("_bucket", {**labels, "le": format_value(bound)}, count))
+            samples.append(("_bucket", {**labels, "le": "+Inf"}, values[-1]))
+            samples.append(("_sum", labels, values[-2]))
+            samples.append(("_count", labels, values[-1]))
+        return [(self.name, "histogram", self.help_text, samples)]
+
+
+class Trace:
+    """The timed stages (spans) of one conversation turn.
+
+    Spans are recorded with their offset from the start of the turn, so the
+    turn can be drawn as a waterfall. Spans may be added from any thread.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._duration = None
+        self._outcome = None
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, outcome: str, attributes: dict) -> None:
+        """Add a finished span; start and end are time.perf_counter() values."""
+        with self._lock:
+            self._spans.append({
+                "name": name,
+                "start_ms": (start - self._start) * 1000,
+                "duration_ms": (end - start) * 1000,
+                "outcome": outcome,
+                "attributes": attributes,
+            })
+
+    def finish(self, outcome: str) -> float:
+        """Mark the turn as finished and return its duration in seconds."""
+        with self._lock:
+            self._duration = time.perf_counter() - self._start
+            self._outcome = outcome
+            return self._duration
+
+    def snapshot(self) -> dict:
+        """Return a copy of the trace with its spans ordered by start time."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "attributes": dict(self.attributes),
+                "started_at": self.started_at,
+                "duration_ms": self._duration * 1000 if self._duration is not None else None,
+                "outcome": self._outcome,
+                "spans": sorted((dict(span) for span in self._spans), key=lambda span: span["start_ms"]),
+            }
+
+
+# Trace of the turn running in the current thread or task
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Recent traces by ID, for the debug panel
+recent_traces = TTLCache(max_entries=Config.TRACE_MAX_ENTRIES, ttl_sec=Config.TRACE_TTL_SEC)
+
+# Size class per image reference; references are content hashes, so an image's class never changes
+image_size_classes = TTLCache(max_entries=4096, ttl_sec=24 * 3600)
+
+# Durations of every turn stage and tool call, shared by every session in the process
+stage_seconds = Histogram(
+    "stage_duration_seconds",
+    "Duration of conversation turn stages and tool calls",
+    LATENCY_BUCKETS_SEC,
+)
+register_collector(stage_seconds.collect_metrics)
+
+
+def start_trace(name: str = "turn", **attributes) -> Trace:
+    """Create a trace and keep it among the recent traces; activate it with use_trace()."""
+    trace = Trace(name, **attributes)
+    recent_traces.set(trace.id, trace)
+    return trace
+
+
+@contextmanager
+def use_trace(trace: Trace, finish: bool = True):
+    """Record spans of the block into a trace, and optionally finish it when the block ends.
+
+    The outcome of the trace is "error" or "cancelled" if the block raises.
+    """
+    token = current_trace.set(trace)
+    outcome = OUTCOME_OK
+    try:
+        yield trace
+    except asyncio.CancelledError:
+        outcome = OUTCOME_CANCELLED
+        raise
+    except BaseException:
+        outcome = OUTCOME_ERROR
+        raise
+    finally:
+        current_trace.reset(token)
+        if finish:
+            finish_trace(trace, outcome)
+
+
+def finish_trace(trace: Trace, outcome: str) -> None:
+    """Finish a trace and record the whole turn's duration in the histogram."""
+    duration = trace.finish(outcome)
+    stage_seconds.observe(duration, {"stage": trace.name, "outcome": outcome, **{label: "" for label in HISTOGRAM_LABELS}})
+
+
+def get_trace(trace_id: str) -> dict | None:
+    """Return a snapshot of a recent trace, or None if it has expired."""
+    trace = recent_traces.get(trace_id)
+    return trace.snapshot() if trace is not None else None
+
+
+def record_span(name: str, start: float, end: float = None, outcome: str = OUTCOME_OK, **attributes) -> None:
+    """Record a finished stage in the histogram and in the current trace, if any.
+
+    Args:
+        name: Stage name, e.g. "message_create" or "tool"
+        start: time.perf_counter() when the stage started
+        end: time.perf_counter() when it ended (default: now)
+        outcome: "ok", "error", "cancelled" or another short status
+        **attributes: Details such as tool and image_size; only those in
+            HISTOGRAM_LABELS become histogram labels
+    """
+    if end is None:
+        end = time.perf_counter()
+    labels = {label: attributes.get(label, "") for label in HISTOGRAM_LABELS}
+    stage_seconds.observe(end - start, {"stage": name, "outcome": outcome, **labels})
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, end, outcome, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a stage of the current turn; see record_span.
+
+    Yields the attributes dict, which the block may update. Setting its
+    "outcome" key overrides the default outcome: "ok", or "error" or
+    "cancelled" when the block raises.
+    """
+    start = time.perf_counter()
+    outcome = OUTCOME_OK
+    try:
+        yield attributes
+    except asyncio.CancelledError:
+        outcome = OUTCOME_CANCELLED
+        raise
+    except BaseException:
+        outcome = OUTCOME_ERROR
+        raise
+    finally:
+        outcome = attributes.pop("outcome", outcome)
+        record_span(name, start, outcome=outcome, **attributes)
+
+
+def classify_image(image_ref: str, image_bytes: bytes) -> str:
+    """Classify an image by megapixels, as a low-cardinality histogram label, and remember it for its reference.
+
+    Called when an image is uploaded, so tool spans can label it without
+    reading it again.
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    try:
+        width, height = Image.open(BytesIO(image_bytes)).size  # Reads the header only
+    except Exception:
+        size_class = "unknown"
+    else:
+        megapixels = width * height / 1_000_000
+        if megapixels < 0.5:
+            size_class = "small"
+        elif megapixels < 2:
+            size_class = "medium"
+        elif megapixels < 8:
+            size_class = "large"
+        else:
+            size_class = "xlarge"
+    image_size_classes.set(image_ref, size_class)
+    return size_class
+
+
+def image_size_class(image_ref: str | None) -> str:
+    """Return the size class of the stored image, reading and classifying it only if it is not known yet."""
+    if not image_ref:
+        return "none"
+    size_class = image_size_classes.get(image_ref)
+    if size_class is not None:
+        return size_class
+    from services.blob_store import get_blob
+
+    image_bytes = get_blob(image_ref)
+    if not image_bytes:
+        return "none"
+    return classify_image(image_ref, image_bytes)
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+import streamlit as st
+from services.azure_client import get_azure_openai_client
+from config.settings import Config
+
+
+class ThreadPool:
+    """Pool of pre-created Assistants threads kept full by a background replenisher.
+
+    Sessions take a ready thread with acquire(). When the pool is empty the
+    thread is created inline (a miss) and the replenisher is woken to refill.
+    Threads older than the TTL are discarded and deleted server-side.
+    """
+
+    def __init__(self, client, size: int, ttl_sec: float):
+        self._client = client
+        self._size = size
+        self._ttl_sec = ttl_sec
+        self._threads = deque()  # (thread_id, created_at), oldest first
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._metrics = {"hits": 0, "misses": 0, "expired": 0, "created": 0, "errors": 0}
+
+        if size > 0:
+            self._wakeup.set()  # fill the pool straight away
+            worker = threading.Thread(target=self._replenish_loop, name="thread-pool", daemon=True)
+            worker.start()
+
+    def acquire(self) -> str:
+        """Return a thread ID, from the pool when possible."""
+        expired = self._pop_expired()
+        with self._lock:
+            if self._threads:
+                thread_id, _ = self._threads.popleft()
+                self._metrics["hits"] += 1
+            else:
+                thread_id = None
+                self._metrics["misses"] += 1
+        self._wakeup.set()
+        self._delete(expired)
+
+        if thread_id is None:
+            thread_id = self._client.beta.threads.create().id
+        return thread_id
+
+    def stats(self) -> dict:
+        """Return pool metrics, including the current number of ready threads."""
+        with self._lock:
+            return {**self._metrics, "ready": len(self._threads), "size": self._size}
+
+    def _pop_expired(self) -> list[str]:
+        """Remove threads past the TTL from the pool and return their IDs."""
+        cutoff = time.time() - self._ttl_sec
+        expired = []
+        with self._lock:
+            while self._threads and self._threads[0][1] < cutoff:
+                expired.append(self._threads.popleft()[0])
+            self._metrics["expired"] += len(expired)
+        return expired
+
+    def _delete(self, thread_ids: list[str]) -> None:
+        """Best-effort deletion of discarded threads."""
+        for thread_id in thread_ids:
+            try:
+                self._client.beta.threads.delete(thread_id)
+            except Exception:
+                pass
+
+    def _replenish_loop(self) -> None:
+        backoff = 1.0
+        while True:
+            self._wakeup.wait(timeout=min(self._ttl_sec / 2, 60))
+            self._wakeup.clear()
+            self._delete(self._pop_expired())
+
+            while True:
+                with self._lock:
+                    if len(self._threads) >= self._size:
+                        break
+                try:
+                    thread_id = self._client.beta.threads.create().id
+                except Exception:
+                    with self._lock:
+                        self._metrics["errors"] += 1
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                    break
+                backoff = 1.0
+                with self._lock:
+                    self._threads.append((thread_id, time.time()))
+                    self._metrics["created"] += 1
+
+
+@st.cache_resource(show_spinner=False)
+def get_thread_pool() -> ThreadPool:
+    """Create and cache the process-wide pool of pre-created threads."""
+    return ThreadPool(
+        get_azure_openai_client(),
+        size=Config.THREAD_POOL_SIZE,
+        ttl_sec=Config.THREAD_POOL_TTL_SEC,
+    )
@@ -0,0 +1,150 @@
+import asyncio
+import aiohttp
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+from config.settings import Config
+from services.admission import admission
+from services.async_http import get_aiohttp_session
+
+
+class CappedRetry(Retry):
+    """urllib3 retry policy that gives up instead of honoring a Retry-After above max_retry_after_sec."""
+
+    def __init__(self, *args, max_retry_after_sec: float | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after_sec = max_retry_after_sec
+
+    def new(self, **kw) -> "CappedRetry":
+        retry = super().new(**kw)
+        retry.max_retry_after_sec = self.max_retry_after_sec
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and self.max_retry_after_sec is not None:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > self.max_retry_after_sec:
+                # With raise_on_status=False urllib3 hands the throttled response back to the caller
+                raise MaxRetryError(_pool, url, ResponseError(f"Retry-After of {retry_after:.0f}s is too long"))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class UpscalerClient:
+    """Client for the EDSR upscaling service with keep-alive pooling and retries.
+
+    Connections are pooled in a shared requests Session. 429 and 5xx
+    responses and connection failures are retried with exponential backoff,
+    honoring Retry-After up to max_retry_after_sec; a longer Retry-After
+    returns the throttled response instead of waiting. The read timeout grows
+    with the output size.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, endpoint: str, connect_timeout_sec: float, read_timeout_sec: float,
+                 read_timeout_per_mp_sec: float, max_read_timeout_sec: float,
+                 max_retries: int, backoff_sec: float, max_retry_after_sec: float, pool_size: int):
+        self.endpoint = endpoint
+        self._connect_timeout_sec = connect_timeout_sec
+        self._read_timeout_sec = read_timeout_sec
+        self._read_timeout_per_mp_sec = read_timeout_per_mp_sec
+        self._max_read_timeout_sec = max_read_timeout_sec
+        self._max_retries = max_retries
+        self._backoff_sec = backoff_sec
+        self._max_retry_after_sec = max_retry_after_sec
+
+        retry = CappedRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,  # The upload may already be processing; don't resend it on a read timeout
+            status=max_retries,
+            backoff_factor=backoff_sec,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            max_retry_after_sec=max_retry_after_sec,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def timeout_for(self, width: int, height: int, scale: int) -> tuple[float, float]:
+        """Return (connect, read) timeouts for an image of the given size and scale."""
+        output_megapixels = width * height * scale * scale / 1_000_000
+        read = self._read_timeout_sec + self._read_timeout_per_mp_sec * output_megapixels
+        return self._connect_timeout_sec, min(read, self._max_read_timeout_sec)
+
+    def upscale(self, image_bytes: bytes, scale: int, width: int, height: int,
+                filename: str = "image.jpg", content_type: str = "image/jpeg") -> requests.Response:
+        """POST an image to the service and return the response with its body read."""
+        with admission.admit("upscaler"):
+            response = self._session.post(
+                self.endpoint,
+                files={'file': (filename, image_bytes, content_type)},
+                params={'scale': scale},
+                timeout=self.timeout_for(width, height, scale),
+            )
+            response.content  # Read the body so the connection returns to the pool
+        return response
+
+    async def upscale_async(self, image_bytes: bytes, scale: int, width: int, height: int,
+                            filename: str = "image.jpg", content_type: str = "image/jpeg") -> tuple[int, bytes]:
+        """Async counterpart of upscale on the event loop's aiohttp session, with the same retry policy.
+
+        The admission slot is held per attempt, so other uploads can use it during backoff.
+
+        Returns:
+            (status code, response body)
+        """
+        connect_timeout, read_timeout = self.timeout_for(width, height, scale)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+        return await self._post_with_retries(image_bytes, scale, filename, content_type, timeout)
+
+    async def _post_with_retries(self, image_bytes: bytes, scale: int, filename: str, content_type: str,
+                                 timeout: aiohttp.ClientTimeout) -> tuple[int, bytes]:
+        for attempt in range(self._max_retries + 1):
+            form = aiohttp.FormData()
+            form.add_field('file', image_bytes, filename=filename, content_type=content_type)
+            retry_after = None
+            try:
+                async with admission.admit_async("upscaler"):
+                    async with get_aiohttp_session().post(self.endpoint, data=form, params={'scale': scale},
+                                                          timeout=timeout) as response:
+                        body = await response.read()
+                        if response.status not in self.RETRY_STATUSES or attempt == self._max_retries:
+                            return response.status, body
+                        retry_after = response.headers.get("Retry-After")
+                        if (retry_after is not None and retry_after.isdigit()
+                                and float(retry_after) > self._max_retry_after_sec):
+                            return response.status, body
+            except aiohttp.ServerTimeoutError:
+                raise  # The upload may already be processing; don't resend it
+            except aiohttp.ClientConnectionError:
+                if attempt == self._max_retries:
+                    raise
+
+            delay = self._backoff_sec * (2 ** attempt)
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+
+@st.cache_resource(show_spinner=False)
+def get_upscaler_client() -> UpscalerClient:
+    """Create and cache the shared upscaler client."""
+    return UpscalerClient(
+        endpoint=Config.UPSCALER_ENDPOINT,
+        connect_timeout_sec=Config.UPSCALER_CONNECT_TIMEOUT_SEC,
+        read_timeout_sec=Config.UPSCALER_READ_TIMEOUT_SEC,
+        read_timeout_per_mp_sec=Config.UPSCALER_READ_TIMEOUT_PER_MP_SEC,
+        max_read_timeout_sec=Config.UPSCALER_MAX_READ_TIMEOUT_SEC,
+        max_retries=Config.UPSCALER_MAX_RETRIES,
+        backoff_sec=Config.UPSCALER_BACKOFF_SEC,
+        max_retry_after_sec=Config.UPSCALER_MAX_RETRY_AFTER_SEC,
+        pool_size=Config.UPSCALER_POOL_SIZE,
+    )
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+from services.admission import AdmissionController
+
+THREADS = 16
+ROUNDS = 100
+
+
+class SlowEnqueueController(AdmissionController):
+    """Pauses after joining the queue, so slots are often released right after a waiter enqueues."""
+
+    def _enqueue(self, *args, **kwargs):
+        waiter = super()._enqueue(*args, **kwargs)
+        time.sleep(0.0005)
+        return waiter
+
+
+def run_threads(threads: list[threading.Thread], timeout_sec: float = 30) -> None:
+    """Run threads to completion; they are daemons, so a stuck waiter fails the test instead of hanging it."""
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    deadline = time.monotonic() + timeout_sec
+    for thread in threads:
+        thread.join(timeout=max(0, deadline - time.monotonic()))
+    assert not any(thread.is_alive() for thread in threads), "a waiter was never woken"
+
+
+def make_controller() -> AdmissionController:
+    return SlowEnqueueController(limits={"backend": 1}, max_queue={"backend": 1000}, queue_timeout_sec=30)
+
+
+def test_admit_hands_over_every_slot_with_limit_one():
+    controller = make_controller()
+    holders = []
+    overlaps = []
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(ROUNDS):
+                with controller.admit("backend"):
+                    holders.append(1)
+                    if len(holders) > 1:
+                        overlaps.append(len(holders))
+                    holders.pop()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    run_threads(threads)
+    assert not errors
+    assert not overlaps
+    stats = controller.stats()["backend"]
+    assert stats["in_use"] == 0
+    assert stats["queued"] == 0
+    assert stats["admitted"] == THREADS * ROUNDS
+
+
+def test_admit_and_admit_async_share_slots_with_limit_one():
+    controller = make_controller()
+    errors = []
+
+    def thread_worker():
+        try:
+            for _ in range(ROUNDS):
+                with controller.admit("backend"):
+                    pass
+        except Exception as e:
+            errors.append(e)
+
+    async def loop_worker():
+        for _ in range(ROUNDS):
+            async with controller.admit_async("backend"):
+                await asyncio.sleep(0)
+
+    async def loop_workers():
+        await asyncio.gather(*(loop_worker() for _ in range(THREADS // 2)))
+
+    threads = [threading.Thread(target=thread_worker) for _ in range(THREADS // 2)]
+    threads.append(threading.Thread(target=lambda: asyncio.run(loop_workers())))
+    run_threads(threads)
+    assert not errors
+    stats = controller.stats()["backend"]
+    assert stats["in_use"] == 0
+    assert stats["queued"] == 0
+    assert stats["admitted"] == THREADS * ROUNDS
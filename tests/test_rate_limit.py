@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.rate_limit import PRIORITY_IN_PROGRESS, PRIORITY_NEW, RateLimiter
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def failing_call(*statuses: int):
+    """Callable raising the given statuses in turn, then returning "ok"; counts its calls."""
+    def call():
+        call.count += 1
+        if call.count <= len(statuses):
+            raise StatusError(statuses[call.count - 1])
+        return "ok"
+    call.count = 0
+    return call
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter({}, new_work_reserve=0.2, max_retries=3, backoff_sec=0.001, max_backoff_sec=0.001)
+
+
+def test_throttled_calls_are_retried(limiter):
+    call = failing_call(429, 429)
+    assert limiter.call("openai", call) == "ok"
+    assert call.count == 3
+
+
+def test_server_errors_are_not_retried_for_non_idempotent_calls(limiter):
+    call = failing_call(502)
+    with pytest.raises(StatusError):
+        limiter.call("openai", call)
+    assert call.count == 1
+
+
+def test_server_errors_are_retried_for_idempotent_calls(limiter):
+    call = failing_call(500, 503)
+    assert limiter.call("openai", call, idempotent=True) == "ok"
+    assert call.count == 3
+
+
+def test_async_server_errors_are_retried_only_for_idempotent_calls(limiter):
+    post = failing_call(500)
+    read = failing_call(500)
+
+    async def run(call, **kwargs):
+        async def fn():
+            return call()
+        return await limiter.call_async("openai", fn, **kwargs)
+
+    with pytest.raises(StatusError):
+        asyncio.run(run(post))
+    assert asyncio.run(run(read, idempotent=True)) == "ok"
+    assert (post.count, read.count) == (1, 2)
+
+
+def bucket_limiter(rate: float, burst: float) -> RateLimiter:
+    return RateLimiter({"openai": (rate, burst)}, new_work_reserve=0.25, max_retries=3,
+                       backoff_sec=0.001, max_backoff_sec=0.001)
+
+
+@pytest.mark.parametrize("burst", [1.0, 1.2, 2.0])
+def test_new_work_gets_a_token_from_small_buckets(burst):
+    limiter = bucket_limiter(rate=1000.0, burst=burst)
+    assert limiter._try_take("openai", PRIORITY_NEW) == 0.0
+
+    # Once the bucket refills, new work gets a token again instead of waiting forever
+    wait = limiter._try_take("openai", PRIORITY_NEW)
+    time.sleep(wait)
+    assert limiter._try_take("openai", PRIORITY_NEW) == 0.0
+
+
+def test_reserve_is_kept_for_in_progress_calls():
+    limiter = bucket_limiter(rate=0.001, burst=4.0)
+    # New work may take 4 - 1 = 3 tokens, leaving the reserve of 1
+    assert [limiter._try_take("openai", PRIORITY_NEW) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter._try_take("openai", PRIORITY_NEW) > 0
+    assert limiter._try_take("openai", PRIORITY_IN_PROGRESS) == 0.0
+    assert limiter._try_take("openai", PRIORITY_IN_PROGRESS) > 0
+
+
+def test_calls_through_a_burst_of_one_complete():
+    limiter = bucket_limiter(rate=50.0, burst=1.0)
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(limiter.call("openai", lambda: "ok") for _ in range(3)),
+                              daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert results == ["ok"] * 3
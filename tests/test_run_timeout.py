@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import streamlit as st
+from openai import APITimeoutError
+
+from interface import conversation
+from interface.async_conversation import stream_run_completion_async
+
+RUN_CREATED = SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id="run_1", status="queued"))
+
+
+class StalledStream:
+    """Event stream that sends the run's creation, then nothing."""
+
+    def __init__(self, stall):
+        self._stall = stall
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        yield RUN_CREATED
+        self._stall()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        yield RUN_CREATED
+        await asyncio.Event().wait()
+
+
+class FakeRuns:
+    def __init__(self, stream):
+        self.stream = stream
+        self.cancelled = []
+
+    def create(self, **kwargs):
+        self.create_timeout = kwargs.get("timeout")
+        return self.stream
+
+    def cancel(self, thread_id, run_id):
+        self.cancelled.append(run_id)
+        return SimpleNamespace(status="cancelled")
+
+
+class AsyncFakeRuns(FakeRuns):
+    async def create(self, **kwargs):
+        return self.stream
+
+    async def cancel(self, thread_id, run_id):
+        return super().cancel(thread_id, run_id)
+
+
+def test_stalled_stream_times_out_and_cancels_the_run():
+    def read_timeout():
+        # Raised once the request's timeout passes
+        time.sleep(0.1)
+        raise APITimeoutError(request=None)
+
+    runs = FakeRuns(StalledStream(read_timeout))
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    st.session_state.thread_id = "thread_1"
+    st.session_state.assistant_id = "asst_1"
+
+    content, artifacts = conversation.stream_run_completion(client, max_wait_sec=1)
+
+    assert content.startswith("Timed out")
+    assert runs.create_timeout == 1
+    assert runs.cancelled == ["run_1"]
+
+
+def test_async_stalled_stream_times_out_and_cancels_the_run():
+    runs = AsyncFakeRuns(StalledStream(threading.Event().wait))
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+
+    start = time.perf_counter()
+    content, artifacts = asyncio.run(stream_run_completion_async(client, "thread_1", "asst_1", max_wait_sec=0.3))
+
+    assert content.startswith("Timed out")
+    assert time.perf_counter() - start < 5
+    assert runs.cancelled == ["run_1"]
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from config.settings import Config
+from services.blob_store import get_blob, put_blob
+from services.cache import TTLCache
+from tools import smart_crop
+
+
+def jpeg_bytes(size=(320, 240)) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size, "green").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_lossless_crop_does_not_decode_the_image(monkeypatch):
+    image_ref = put_blob(jpeg_bytes())
+    cropped = jpeg_bytes((64, 32))
+
+    def lossless_crop(image_bytes, image, x, y, width, height):
+        assert image.format == "JPEG" and image.size == (320, 240)
+        return cropped
+
+    monkeypatch.setattr(smart_crop, "lossless_jpeg_crop", lossless_crop)
+    monkeypatch.setattr(smart_crop.decoded_images, "get", lambda *args: pytest.fail("image decoded"))
+
+    result = smart_crop.crop_image_ref(image_ref, 16, 16, 64, 32)
+
+    data = result.artifacts["cropped_image_data"]
+    assert get_blob(data["cropped_image_ref"]) == cropped
+    assert data["original_size"] == {"width": 320, "height": 240}
+    assert json.loads(result.output)["success"]
+
+
+def test_unaligned_crop_falls_back_to_the_decoded_image(monkeypatch):
+    image_ref = put_blob(jpeg_bytes())
+    monkeypatch.setattr(smart_crop, "lossless_jpeg_crop", lambda *args: None)
+
+    result = smart_crop.crop_image_ref(image_ref, 3, 5, 50, 40)
+
+    data = result.artifacts["cropped_image_data"]
+    assert Image.open(BytesIO(get_blob(data["cropped_image_ref"]))).size == (50, 40)
+    assert data["format"] == "JPEG"
+
+
+@pytest.fixture
+def vision_calls(monkeypatch):
+    """Route smart crops to a fake Vision call on an empty cache; returns the ratios of each call."""
+    calls = []
+
+    def analyze(image_ref, image_bytes, ratios):
+        calls.append(ratios)
+        return {
+            "smart_crops": [{"aspect_ratio": r, "bounding_box": {"x": 0, "y": 0, "w": 10, "h": 10}} for r in ratios],
+            "image_height": 240,
+            "image_width": 320,
+            "model_version": "fake",
+        }
+
+    monkeypatch.setattr(Config, "SMART_CROP_BACKEND", "azure")
+    monkeypatch.setattr(smart_crop, "smart_crop_cache", TTLCache(max_entries=100, ttl_sec=60))
+    monkeypatch.setattr(smart_crop, "analyze_smart_crops_coalesced", analyze)
+    return calls
+
+
+def test_cached_crops_answer_without_vision(vision_calls):
+    image_ref = put_blob(jpeg_bytes())
+    first = json.loads(smart_crop.smart_crop_image_ref(image_ref, [0.9, 1.33]))
+    # A later request for one of the ratios needs no other cache entry
+    second = json.loads(smart_crop.smart_crop_image_ref(image_ref, [1.33]))
+
+    assert vision_calls == [[0.9, 1.33]]
+    assert second["smart_crops"] == first["smart_crops"][1:]
+    assert second["image_width"] == 320
+    stats = smart_crop.smart_crop_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_empty_aspect_ratios_are_rejected(vision_calls):
+    image_ref = put_blob(jpeg_bytes())
+
+    assert smart_crop.smart_crop_image_ref(image_ref, []).is_error
+    assert asyncio.run(smart_crop.smart_crop_image_async([], image_ref=image_ref)).is_error
+    assert vision_calls == []
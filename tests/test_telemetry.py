@@ -0,0 +1,24 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from services import telemetry
+from tools.result import ToolResult, as_tool_result, tool_error
+
+
+def test_tool_errors_are_flagged():
+    assert tool_error("Scale must be 2, 3, or 4").is_error
+    assert not ToolResult.from_dict({"success": True}).is_error
+    assert not as_tool_result('{"errors_found": 0}').is_error
+
+
+def test_image_size_class_is_remembered_from_upload(monkeypatch):
+    buffer = BytesIO()
+    Image.new("RGB", (1600, 1000)).save(buffer, "PNG")
+
+    assert telemetry.classify_image("uploaded-ref", buffer.getvalue()) == "medium"
+
+    monkeypatch.setattr("services.blob_store.get_blob", lambda ref: pytest.fail(f"blob {ref} read again"))
+    assert telemetry.image_size_class("uploaded-ref") == "medium"
+
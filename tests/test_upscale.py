@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from tools import upscale
+
+
+def png_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = upscale.DiskLRUCache(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr(upscale, "upscale_cache", cache)
+    return cache
+
+
+@pytest.mark.parametrize("body", [b"<html>Bad gateway</html>", png_bytes()[:100]])
+def test_invalid_remote_result_is_not_cached(cache, body):
+    with pytest.raises(upscale.UpscaleAPIError):
+        upscale.cache_upscaled("ref", 2, body)
+    assert cache.get(upscale.upscale_cache_key("ref", 2)) is None
+
+
+def test_cache_key_depends_on_endpoint(cache, monkeypatch):
+    upscale.cache_upscaled("ref", 2, png_bytes())
+    assert cache.get(upscale.upscale_cache_key("ref", 2)) == png_bytes()
+
+    monkeypatch.setattr(upscale.get_upscaler_client(), "endpoint", "http://other-upscaler/upscale")
+    assert cache.get(upscale.upscale_cache_key("ref", 2)) is None
+
+
+def failing_remote(*args):
+    raise upscale.UpscaleAPIError("API request failed with status 503: unavailable")
+
+
+def test_hedged_upscale_answers_locally_when_remote_fails(cache, monkeypatch):
+    monkeypatch.setattr(upscale.Config, "UPSCALE_HEDGE_SEC", 5.0)
+    monkeypatch.setattr(upscale, "upscale_bytes", failing_remote)
+    image = Image.open(BytesIO(png_bytes()))
+
+    upscaled_bytes, engine, pending_remote = upscale.upscale_hedged("ref", png_bytes(), image, 2)
+
+    assert engine == upscale.LOCAL_ENGINE
+    assert pending_remote is None
+    assert Image.open(BytesIO(upscaled_bytes)).size == (128, 128)
+
+
+def test_async_hedged_upscale_answers_locally_when_remote_fails(cache, monkeypatch):
+    monkeypatch.setattr(upscale.Config, "UPSCALE_HEDGE_SEC", 5.0)
+
+    async def failing_remote_async(*args):
+        failing_remote()
+
+    monkeypatch.setattr(upscale, "upscale_bytes_async", failing_remote_async)
+    monkeypatch.setattr(upscale, "get_blob", lambda ref: png_bytes())
+    monkeypatch.setattr(upscale, "put_blob", lambda data, session_id=None: "upscaled")
+
+    result = asyncio.run(upscale.upscale_image_async(2, image_ref="ref"))
+
+    assert result.artifacts["upscaled_image_data"]["engine"] == upscale.LOCAL_ENGINE
+    assert "unavailable" in json.loads(result.output)["message"]
+
+
+def test_hedged_upscale_does_not_queue_behind_pending_remote_calls(cache, monkeypatch):
+    monkeypatch.setattr(upscale.Config, "UPSCALE_HEDGE_SEC", 5.0)
+    monkeypatch.setattr(upscale, "hedge_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(upscale, "upscale_bytes", lambda *args: pytest.fail("remote call started"))
+    upscale.hedge_slots.acquire()
+    image = Image.open(BytesIO(png_bytes()))
+
+    start = time.perf_counter()
+    _, engine, pending_remote = upscale.upscale_hedged("ref", png_bytes(), image, 2)
+
+    assert engine == upscale.LOCAL_ENGINE
+    assert pending_remote is None
+    assert time.perf_counter() - start < upscale.Config.UPSCALE_HEDGE_SEC
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.upscale_tiles import tile_starts, upscale_tiled
+
+
+def lanczos_tile(mode: str):
+    """Tile upscaler standing in for the service, returning tiles in the given mode."""
+    def upscale_tile(tile_bytes: bytes, width: int, height: int) -> bytes:
+        tile = Image.open(BytesIO(tile_bytes)).convert(mode)
+        output = BytesIO()
+        tile.resize((width * 2, height * 2), Image.LANCZOS).save(output, format="PNG")
+        return output.getvalue()
+    return upscale_tile
+
+
+@pytest.mark.parametrize("service_mode", ["RGBA", "RGB"])
+def test_tiled_upscale_keeps_alpha(service_mode):
+    image = Image.new("RGBA", (200, 120), (200, 30, 30, 255))
+    image.paste((0, 0, 0, 0), (100, 0, 200, 120))
+
+    upscaled = Image.open(BytesIO(upscale_tiled(image, 2, lanczos_tile(service_mode), 64, 8, 4)))
+
+    assert upscaled.mode == "RGBA"
+    assert upscaled.size == (400, 240)
+    alpha = np.asarray(upscaled.getchannel("A"))
+    assert (alpha[:, :190] == 255).all()
+    assert (alpha[:, 210:] == 0).all()
+
+
+def test_tiled_upscale_of_opaque_image_is_rgb():
+    image = Image.new("RGB", (200, 120), (10, 120, 240))
+
+    upscaled = Image.open(BytesIO(upscale_tiled(image, 2, lanczos_tile("RGB"), 64, 8, 4)))
+
+    assert upscaled.mode == "RGB"
+    assert upscaled.getpixel((150, 100)) == (10, 120, 240)
+
+
+@pytest.mark.parametrize("length,tile_size,overlap", [(2000, 512, 32), (2000, 512, 511), (512, 512, 0), (100, 512, 32)])
+def test_tiles_cover_the_axis(length, tile_size, overlap):
+    starts = tile_starts(length, tile_size, overlap)
+    assert starts[0] == 0
+    assert min(starts[-1] + tile_size, length) == length
+    assert all(b - a <= tile_size - overlap for a, b in zip(starts, starts[1:]))
+
+
+@pytest.mark.parametrize("overlap", [512, 600, -1])
+def test_overlap_must_be_smaller_than_the_tile(overlap):
+    with pytest.raises(ValueError, match="overlap"):
+        tile_starts(2000, 512, overlap)
+
+
+@pytest.mark.parametrize("overlap", ["512", "-1"])
+def test_config_rejects_tile_overlap_not_smaller_than_tile_size(overlap):
+    env = {**os.environ, "UPSCALE_TILE_SIZE": "512", "UPSCALE_TILE_OVERLAP": overlap}
+    completed = subprocess.run([sys.executable, "-c", "import config.settings"], env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert completed.returncode != 0
+    assert "UPSCALE_TILE_OVERLAP" in completed.stderr
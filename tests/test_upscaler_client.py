@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.async_http import close_aiohttp_session
+from services.upscaler_client import UpscalerClient
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Answers every POST with 503 and the server's Retry-After; counts the requests."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        self.send_response(503)
+        self.send_header("Retry-After", self.server.retry_after)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    server.requests = 0
+    server.retry_after = "0"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_for(server) -> UpscalerClient:
+    return UpscalerClient(
+        endpoint=f"http://127.0.0.1:{server.server_address[1]}/upscale",
+        connect_timeout_sec=1, read_timeout_sec=5, read_timeout_per_mp_sec=0, max_read_timeout_sec=5,
+        max_retries=2, backoff_sec=0.001, max_retry_after_sec=1, pool_size=1,
+    )
+
+
+def upscale_async(client: UpscalerClient) -> tuple[int, bytes]:
+    async def run():
+        try:
+            return await client.upscale_async(b"image", 2, 8, 8)
+        finally:
+            await close_aiohttp_session()
+    return asyncio.run(run())
+
+
+def test_short_retry_after_is_honored(throttling_server):
+    client = client_for(throttling_server)
+    assert client.upscale(b"image", 2, 8, 8).status_code == 503
+    assert throttling_server.requests == 3
+
+    throttling_server.requests = 0
+    assert upscale_async(client)[0] == 503
+    assert throttling_server.requests == 3
+
+
+def test_long_retry_after_gives_up_without_waiting(throttling_server):
+    throttling_server.retry_after = "3600"
+    client = client_for(throttling_server)
+
+    started = time.monotonic()
+    assert client.upscale(b"image", 2, 8, 8).status_code == 503
+    assert upscale_async(client)[0] == 503
+    assert time.monotonic() - started < 5
+    assert throttling_server.requests == 2
@@ -1,33 +1,183 @@
+import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
 import requests
-import os
+from requests.adapters import HTTPAdapter
+from config.settings import Config
+from services.async_http import get_aiohttp_session
+from services.cache import TTLCache
+from services.singleflight import single_flight
 
+WEATHER_API_URL = "https://api.openweathermap.org/data/3.0/onecall"
 
-def get_weather(latitude, longitude):
-    """Get the weather condition for a given location using latitude and longitude."""
+# Shared keep-alive connection pool for OpenWeatherMap
+weather_session = requests.Session()
+weather_session.mount("https://", HTTPAdapter(pool_maxsize=Config.WEATHER_POOL_SIZE))
+
+# (latitude, longitude) grid cell -> (weather, fetched_at); entries outlive the
+# TTL by the stale window so they can be served while being refreshed
+weather_cache = TTLCache(
+    max_entries=Config.WEATHER_CACHE_MAX_ENTRIES,
+    ttl_sec=Config.WEATHER_CACHE_TTL_SEC + Config.WEATHER_STALE_SEC,
+)
+
+# Background refreshes started from async lookups, kept referenced until done
+refresh_tasks = set()
+
+# Runs background refreshes and batch lookups
+weather_executor = ThreadPoolExecutor(max_workers=Config.WEATHER_POOL_SIZE, thread_name_prefix="weather")
+
+
+def validate_coordinates(latitude, longitude) -> str | None:
+    """Return an error message for invalid coordinates, or None if they are valid."""
     if latitude is None:
-        return json.dumps({"weatherAPI_response": "Required argument latitude is not provided?"})
+        return "Required argument latitude is not provided?"
     if longitude is None:
-        return json.dumps({"weatherAPI_response": "Required argument longitude is not provided?"})
+        return "Required argument longitude is not provided?"
     if latitude > 90 or latitude < -90:
-        return json.dumps({"weatherAPI_response": "Invalid latitude value"})
+        return "Invalid latitude value"
     if longitude > 180 or longitude < -180:
-        return json.dumps({"weatherAPI_response": "Invalid longitude value"})
+        return "Invalid longitude value"
+    return None
+
 
-    api_key = os.getenv("OPENWEATHERMAP_API_KEY")
-    base_url = "https://api.openweathermap.org/data/3.0/onecall?"
-    complete_url = f"{base_url}lat={latitude}&lon={longitude}&appid={api_key}&units=metric"
+def grid_cell(latitude: float, longitude: float) -> tuple[float, float]:
+    """Snap coordinates to the cache grid so nearby points share an entry."""
+    grid = Config.WEATHER_GRID_DEG
+    return round(round(latitude / grid) * grid, 6), round(round(longitude / grid) * grid, 6)
 
-    response = requests.get(complete_url)
+
+def fetch_weather(cell: tuple[float, float]) -> dict:
+    """Fetch current conditions for a grid cell and store them in the cache."""
+    latitude, longitude = cell
+    response = weather_session.get(
+        WEATHER_API_URL,
+        params={"lat": latitude, "lon": longitude, "appid": Config.OPENWEATHERMAP_API_KEY, "units": "metric"},
+        timeout=(Config.WEATHER_CONNECT_TIMEOUT_SEC, Config.WEATHER_READ_TIMEOUT_SEC),
+    )
     response.raise_for_status()
     weather_data = response.json()
 
-    weather_condition = weather_data["current"]["weather"][0]["description"]
-    temperature = weather_data["current"]["temp"]
+    weather = {
+        "weather_condition": weather_data["current"]["weather"][0]["description"],
+        "temperature": weather_data["current"]["temp"],
+    }
+    weather_cache.set(cell, (weather, time.time()))
+    return weather
+
+
+async def fetch_weather_async(cell: tuple[float, float]) -> dict:
+    """Async counterpart of fetch_weather."""
+    latitude, longitude = cell
+    async with get_aiohttp_session().get(
+        WEATHER_API_URL,
+        params={"lat": latitude, "lon": longitude, "appid": Config.OPENWEATHERMAP_API_KEY, "units": "metric"},
+        timeout=aiohttp.ClientTimeout(sock_connect=Config.WEATHER_CONNECT_TIMEOUT_SEC, sock_read=Config.WEATHER_READ_TIMEOUT_SEC),
+    ) as response:
+        response.raise_for_status()
+        weather_data = await response.json()
+
+    weather = {
+        "weather_condition": weather_data["current"]["weather"][0]["description"],
+        "temperature": weather_data["current"]["temp"],
+    }
+    weather_cache.set(cell, (weather, time.time()))
+    return weather
+
+
+def refresh_in_background(cell: tuple[float, float]) -> None:
+    """Refresh a stale cell without blocking the caller."""
+    def refresh():
+        try:
+            single_flight.do(("weather", cell), fetch_weather, cell)
+        except Exception:
+            pass  # The stale value stays until the next attempt
+    weather_executor.submit(refresh)
+
+
+def finish_refresh(task: asyncio.Task) -> None:
+    """Drop a finished async refresh; a failed one leaves the stale value in place."""
+    refresh_tasks.discard(task)
+    if not task.cancelled():
+        task.exception()  # Mark the exception as retrieved
+
+
+def lookup_weather(latitude, longitude) -> dict:
+    """Return the weather for one location as a dict, using the cache when possible."""
+    error = validate_coordinates(latitude, longitude)
+    if error:
+        return {"weatherAPI_response": error}
+
+    cell = grid_cell(latitude, longitude)
+    entry = weather_cache.get(cell)
+    if entry is not None:
+        weather, fetched_at = entry
+        if time.time() - fetched_at >= Config.WEATHER_CACHE_TTL_SEC:
+            # Stale-while-revalidate: answer now, refresh for the next caller
+            refresh_in_background(cell)
+    else:
+        weather = single_flight.do(("weather", cell), fetch_weather, cell)
+
+    return {"latitude": latitude, "longitude": longitude, **weather}
+
+
+async def lookup_weather_async(latitude, longitude) -> dict:
+    """Async counterpart of lookup_weather."""
+    error = validate_coordinates(latitude, longitude)
+    if error:
+        return {"weatherAPI_response": error}
+
+    cell = grid_cell(latitude, longitude)
+    entry = weather_cache.get(cell)
+    if entry is not None:
+        weather, fetched_at = entry
+        if time.time() - fetched_at >= Config.WEATHER_CACHE_TTL_SEC:
+            # Stale-while-revalidate: answer now, refresh for the next caller
+            task = asyncio.ensure_future(fetch_weather_async(cell))
+            refresh_tasks.add(task)
+            task.add_done_callback(finish_refresh)
+    else:
+        weather = await fetch_weather_async(cell)
+
+    return {"latitude": latitude, "longitude": longitude, **weather}
+
+
+def get_weather(latitude, longitude):
+    """Get the weather condition for a given location using latitude and longitude."""
+    return json.dumps(lookup_weather(latitude, longitude))
+
+
+def get_weather_batch(locations: list[dict]) -> str:
+    """Get the weather for several locations concurrently.
+
+    Args:
+        locations: List of {"latitude": float, "longitude": float}
+
+    Returns:
+        JSON string with one result per location, in the given order
+    """
+    def lookup(location):
+        try:
+            return lookup_weather(location.get("latitude"), location.get("longitude"))
+        except Exception as e:
+            return {"weatherAPI_response": f"Failed to get weather: {str(e)}"}
+
+    return json.dumps({"results": list(weather_executor.map(lookup, locations or []))})
+
+
+async def get_weather_async(latitude, longitude) -> str:
+    """Async counterpart of get_weather."""
+    return json.dumps(await lookup_weather_async(latitude, longitude))
+
+
+async def get_weather_batch_async(locations: list[dict]) -> str:
+    """Async counterpart of get_weather_batch."""
+    async def lookup(location):
+        try:
+            return await lookup_weather_async(location.get("latitude"), location.get("longitude"))
+        except Exception as e:
+            return {"weatherAPI_response": f"Failed to get weather: {str(e)}"}
 
-    return json.dumps({
-        "latitude": latitude,
-        "longitude": longitude,
-        "weather_condition": weather_condition,
-        "temperature": temperature
-    })
\ No newline at end of file
+    return json.dumps({"results": await asyncio.gather(*(lookup(location) for location in locations or []))})
@@ -0,0 +1,127 @@
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from PIL import Image
+from config.settings import Config
+from services.blob_store import get_blob
+from services.cache import TTLCache
+
+
+class DecodedImageCache:
+    """LRU cache of decoded PIL images keyed by blob reference, bounded by total pixels.
+
+    Cached images are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_pixels: int):
+        self._max_pixels = max_pixels
+        self._images = OrderedDict()  # ref -> Image, least recently used first
+        self._pixels = 0
+        self._lock = threading.Lock()
+
+    def get(self, image_ref: str, image_bytes: bytes) -> Image.Image:
+        """Return the decoded image for a reference, decoding image_bytes on a miss."""
+        with self._lock:
+            image = self._images.get(image_ref)
+            if image is not None:
+                self._images.move_to_end(image_ref)
+                return image
+
+        image = Image.open(BytesIO(image_bytes))
+        image.load()
+
+        with self._lock:
+            if image_ref not in self._images:
+                self._images[image_ref] = image
+                self._pixels += image.width * image.height
+                while self._pixels > self._max_pixels and len(self._images) > 1:
+                    _, evicted = self._images.popitem(last=False)
+                    self._pixels -= evicted.width * evicted.height
+        return image
+
+
+decoded_images = DecodedImageCache(max_pixels=Config.DECODED_IMAGE_CACHE_MAX_PIXELS)
+
+# Encoded previews per (blob reference, max side)
+previews = TTLCache(max_entries=Config.PREVIEW_CACHE_MAX_ENTRIES, ttl_sec=Config.PREVIEW_CACHE_TTL_SEC)
+
+JPEGTRAN = shutil.which("jpegtran")
+
+
+def jpeg_mcu_size(image: Image.Image) -> tuple[int, int]:
+    """Return the (width, height) of a JPEG's minimum coded unit in pixels."""
+    layers = getattr(image, "layer", None) or [("", 1, 1, 0)]
+    return 8 * max(layer[1] for layer in layers), 8 * max(layer[2] for layer in layers)
+
+
+def lossless_jpeg_crop(image_bytes: bytes, image: Image.Image, x: int, y: int, width: int, height: int) -> bytes | None:
+    """Crop a JPEG in the DCT domain with jpegtran, without recompressing it.
+
+    Only possible when jpegtran is installed and the top-left corner is
+    aligned to the MCU grid, which jpegtran would otherwise snap it to.
+
+    Returns:
+        The cropped JPEG bytes, or None when the lossless path does not apply
+    """
+    if JPEGTRAN is None or image.format != "JPEG":
+        return None
+    if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > image.width or y + height > image.height:
+        return None
+    mcu_width, mcu_height = jpeg_mcu_size(image)
+    if x % mcu_width or y % mcu_height:
+        return None
+
+    try:
+        completed = subprocess.run(
+            [JPEGTRAN, "-crop", f"{width}x{height}+{x}+{y}", "-copy", "all"],
+            input=image_bytes, capture_output=True, check=True, timeout=10,
+        )
+        if Image.open(BytesIO(completed.stdout)).size != (width, height):
+            return None
+    except Exception:
+        return None
+    return completed.stdout
+
+
+def get_preview(image_ref: str, image_bytes: bytes, max_side: int) -> bytes:
+    """Return a downscaled preview, decoding JPEGs in draft mode at reduced size.
+
+    Previews are cached per reference and size, so repeated renders are free.
+    """
+    preview = previews.get((image_ref, max_side))
+    if preview is not None:
+        return preview
+
+    image = Image.open(BytesIO(image_bytes))
+    if max(image.size) <= max_side:
+        preview = image_bytes
+    else:
+        # Draft mode lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+        image.draft("RGB", (max_side, max_side))
+        image.thumbnail((max_side, max_side))
+        output_buffer = BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(output_buffer, format="PNG")
+        else:
+            image.convert("RGB").save(output_buffer, format="JPEG", quality=85)
+        preview = output_buffer.getvalue()
+
+    previews.set((image_ref, max_side), preview)
+    return preview
+
+
+def get_thumbnail(image_ref: str, max_side: int) -> bytes | None:
+    """Return the cached preview of a stored image, loading the blob only on a cache miss.
+    
+    Returns:
+        The preview bytes, or None if the image is no longer in the blob store
+    """
+    preview = previews.get((image_ref, max_side))
+    if preview is not None:
+        return preview
+    image_bytes = get_blob(image_ref)
+    if not image_bytes:
+        return None
+    return get_preview(image_ref, image_bytes, max_side)
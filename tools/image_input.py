@@ -0,0 +1,5 @@
+def get_uploaded_image_ref() -> str | None:
+    """Return the blob reference (SHA-256 of the bytes) of the most recently uploaded image."""
+    import streamlit as st
+
+    return getattr(st.session_state, 'uploaded_image_ref', None)
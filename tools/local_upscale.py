@@ -0,0 +1,41 @@
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+LOCAL_ENGINE = "local-lanczos"
+
+
+def gaussian_blur(a: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur over the first two axes of an H x W x C array."""
+    radius = max(1, int(round(3 * sigma)))
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    padded = np.pad(a, ((radius, radius), (0, 0), (0, 0)), mode="edge")
+    a = sum(k * padded[i:i + a.shape[0]] for i, k in enumerate(kernel))
+    padded = np.pad(a, ((0, 0), (radius, radius), (0, 0)), mode="edge")
+    return sum(k * padded[:, i:i + a.shape[1]] for i, k in enumerate(kernel))
+
+
+def unsharp_mask(rgb: np.ndarray, sigma: float, amount: float) -> np.ndarray:
+    """Sharpen by adding back the difference between the image and its blur."""
+    return np.clip(rgb + amount * (rgb - gaussian_blur(rgb, sigma)), 0, 255)
+
+
+def lanczos_upscale(image: Image.Image, scale: int, sharpen_amount: float = 0.0) -> bytes:
+    """Upscale on the CPU with Pillow's Lanczos filter and an optional unsharp pass.
+
+    Returns:
+        The upscaled image as PNG bytes
+    """
+    mode = "RGBA" if "A" in image.getbands() else "RGB"
+    upscaled = image.convert(mode).resize((image.width * scale, image.height * scale), Image.LANCZOS)
+
+    if sharpen_amount > 0:
+        pixels = np.asarray(upscaled, dtype=np.float32)
+        pixels[..., :3] = unsharp_mask(pixels[..., :3], sigma=0.5 * scale, amount=sharpen_amount)
+        upscaled = Image.fromarray((pixels + 0.5).astype(np.uint8), mode)
+
+    output = BytesIO()
+    upscaled.save(output, format="PNG", compress_level=1)  # favor latency over size
+    return output.getvalue()
@@ -1,6 +1,17 @@
-from tools.get_weather import get_weather
-from tools.smart_crop import smart_crop_image, crop_image
-from tools.upscale import upscale_image
+import importlib
+
+
+def lazy_tool(module_name: str, func_name: str):
+    """Return a callable that imports the tool's module on first use.
+    
+    Tool modules pull in PIL, NumPy, the Azure SDK and HTTP clients, so
+    deferring them keeps those imports out of app startup.
+    """
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), func_name)(*args, **kwargs)
+    call.__name__ = func_name
+    return call
+
 
 # Define the tool schema for the Assistant API
 WEATHER_TOOL_SCHEMA = {
@@ -22,6 +33,35 @@ WEATHER_TOOL_SCHEMA = {
     },
 }
 
+WEATHER_BATCH_TOOL_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": "get_weather_batch",
+        "description": (
+            "Get the weather condition for several locations at once using their latitudes and longitudes. "
+            "Use this instead of multiple get_weather calls when the user asks about more than one location."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "locations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "latitude": {"type": "number", "description": "Latitude of the location"},
+                            "longitude": {"type": "number", "description": "Longitude of the location"},
+                        },
+                        "required": ["latitude", "longitude"],
+                    },
+                    "description": "Locations to get the weather for",
+                },
+            },
+            "required": ["locations"],
+        },
+    },
+}
+
 SMART_CROP_TOOL_SCHEMA = {
     "type": "function",
     "function": {
@@ -50,7 +90,7 @@ CROP_IMAGE_TOOL_SCHEMA = {
         "name": "crop_image",
         "description": (
             "Crop the uploaded image using specified bounding box coordinates. "
-            "Returns the cropped image as base64 data along with metadata."
+            "Returns the cropped image along with metadata."
         ),
         "parameters": {
             "type": "object",
@@ -89,17 +129,35 @@ UPSCALE_IMAGE_TOOL_SCHEMA = {
 
 
 
-# Registry of all available tools
+# Registry of all available tools. A tool returns a JSON string for the
+# model, or a tools.result.ToolResult when it also produces artifacts, such
+# as an image, that are shown to the user instead of being sent to the model.
 TOOL_REGISTRY = {
-    "get_weather": get_weather,
-    "smart_crop_image": smart_crop_image,
-    "crop_image": crop_image,
-    "upscale_image": upscale_image,
+    "get_weather": lazy_tool("tools.get_weather", "get_weather"),
+    "get_weather_batch": lazy_tool("tools.get_weather", "get_weather_batch"),
+    "smart_crop_image": lazy_tool("tools.smart_crop", "smart_crop_image"),
+    "crop_image": lazy_tool("tools.smart_crop", "crop_image"),
+    "upscale_image": lazy_tool("tools.upscale", "upscale_image"),
+}
+
+# Async counterparts of TOOL_REGISTRY, used by the asyncio pipeline. Image
+# tools take the blob reference of the image as an image_ref keyword instead
+# of reading it from session state.
+ASYNC_TOOL_REGISTRY = {
+    "get_weather": lazy_tool("tools.get_weather", "get_weather_async"),
+    "get_weather_batch": lazy_tool("tools.get_weather", "get_weather_batch_async"),
+    "smart_crop_image": lazy_tool("tools.smart_crop", "smart_crop_image_async"),
+    "crop_image": lazy_tool("tools.smart_crop", "crop_image_async"),
+    "upscale_image": lazy_tool("tools.upscale", "upscale_image_async"),
 }
 
+# Tools in ASYNC_TOOL_REGISTRY that operate on the uploaded image
+IMAGE_TOOLS = {"smart_crop_image", "crop_image", "upscale_image"}
+
 # List of all tool schemas
 TOOLS_LIST = [
     WEATHER_TOOL_SCHEMA,
+    WEATHER_BATCH_TOOL_SCHEMA,
     SMART_CROP_TOOL_SCHEMA,
     CROP_IMAGE_TOOL_SCHEMA,
     UPSCALE_IMAGE_TOOL_SCHEMA,
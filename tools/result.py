@@ -0,0 +1,32 @@
+import json
+
+
+class ToolResult:
+    """Result of a tool call, split between what the model sees and what the app keeps.
+
+    output is the short JSON string submitted to the model. Artifacts never
+    reach the model: they map a chat message key such as "cropped_image_data"
+    to a dict describing the result, whose image bytes stay in the blob
+    store under a reference. Artifacts of a turn's tool calls are attached
+    to the assistant's reply message, which renders them. is_error marks
+    results reporting a failure, for telemetry.
+    """
+
+    def __init__(self, output: str, artifacts: dict = None, is_error: bool = False):
+        self.output = output
+        self.artifacts = artifacts or {}
+        self.is_error = is_error
+
+    @classmethod
+    def from_dict(cls, output: dict, artifacts: dict = None) -> "ToolResult":
+        return cls(json.dumps(output), artifacts)
+
+
+def tool_error(message: str) -> ToolResult:
+    """Return a result reporting an error to the model."""
+    return ToolResult(json.dumps({"error": message}), is_error=True)
+
+
+def as_tool_result(output) -> ToolResult:
+    """Wrap the plain JSON string returned by tools without artifacts."""
+    return output if isinstance(output, ToolResult) else ToolResult(output)
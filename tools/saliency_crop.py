@@ -0,0 +1,142 @@
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+LOCAL_MODEL_VERSION = "local-saliency-1"
+
+# Longest side of the downscaled image the saliency map is computed on
+ANALYSIS_MAX_SIDE = 256
+# Weights of the color, edge and entropy maps in the combined saliency map
+SALIENCY_WEIGHTS = (0.4, 0.3, 0.3)
+# Window sizes tried per aspect ratio, relative to the largest window that fits
+WINDOW_SCALES = (1.0, 0.85, 0.7)
+# Cost per unit of image area covered, so smaller windows only win when they
+# keep nearly all of the salient content
+AREA_PENALTY = 0.25
+
+
+def _integral_image(a: np.ndarray) -> np.ndarray:
+    """Summed-area table over the last two axes, zero-padded on top and left."""
+    ii = np.zeros(a.shape[:-2] + (a.shape[-2] + 1, a.shape[-1] + 1), dtype=np.float64)
+    ii[..., 1:, 1:] = a.cumsum(axis=-2).cumsum(axis=-1)
+    return ii
+
+
+def _window_sums(ii: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Sum of every h x w window, indexed by its top-left corner."""
+    return ii[..., h:, w:] - ii[..., :-h, w:] - ii[..., h:, :-w] + ii[..., :-h, :-w]
+
+
+def _box_mean(a: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over a (2r+1) x (2r+1) window around each pixel, same shape as a."""
+    pad = [(0, 0)] * (a.ndim - 2) + [(radius, radius), (radius, radius)]
+    size = 2 * radius + 1
+    return _window_sums(_integral_image(np.pad(a, pad, mode="edge")), size, size) / (size * size)
+
+
+def _normalize(a: np.ndarray) -> np.ndarray:
+    lo, hi = a.min(), a.max()
+    return (a - lo) / (hi - lo) if hi > lo else np.zeros_like(a)
+
+
+def _local_entropy(lum: np.ndarray, bins: int = 16, radius: int = 4) -> np.ndarray:
+    """Shannon entropy of quantized luminance in a window around each pixel."""
+    quantized = np.minimum((lum * bins).astype(np.int32), bins - 1)
+    one_hot = (quantized[None] == np.arange(bins)[:, None, None]).astype(np.float32)
+    p = _box_mean(one_hot, radius)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=0)
+
+
+def saliency_map(rgb: np.ndarray) -> np.ndarray:
+    """Combine color, edge and entropy maps into one saliency map in [0, 1].
+
+    Args:
+        rgb: H x W x 3 float array in [0, 1]
+    """
+    # Frequency-tuned color saliency: distance of the blurred color from the mean color
+    blurred = _box_mean(rgb.transpose(2, 0, 1), 2).transpose(1, 2, 0)
+    color = np.linalg.norm(blurred - rgb.reshape(-1, 3).mean(axis=0), axis=2)
+
+    lum = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gy, gx = np.gradient(lum)
+    edges = _box_mean(np.hypot(gx, gy), 1)
+
+    entropy = _local_entropy(lum)
+
+    w_color, w_edges, w_entropy = SALIENCY_WEIGHTS
+    saliency = w_color * _normalize(color) + w_edges * _normalize(edges) + w_entropy * _normalize(entropy)
+
+    # Mild center prior, which also breaks ties on flat images
+    h, w = lum.shape
+    yy, xx = np.mgrid[0:h, 0:w]
+    center = np.exp(-(((yy - h / 2) / h) ** 2 + ((xx - w / 2) / w) ** 2) * 2)
+    return _normalize(saliency * (0.75 + 0.25 * center))
+
+
+def best_window(ii: np.ndarray, height: int, width: int, aspect_ratio: float) -> tuple[int, int, int, int]:
+    """Find the window of the given aspect ratio that best covers the saliency.
+
+    Args:
+        ii: Integral image of the saliency map
+        height, width: Size of the saliency map
+        aspect_ratio: Target width / height
+
+    Returns:
+        (x, y, w, h) of the best window in saliency-map coordinates
+    """
+    total = ii[-1, -1] or 1.0
+    if width / height > aspect_ratio:
+        max_h, max_w = height, min(width, round(height * aspect_ratio))
+    else:
+        max_h, max_w = min(height, round(width / aspect_ratio)), width
+
+    best = None
+    for scale in WINDOW_SCALES:
+        h = max(1, round(max_h * scale))
+        w = max(1, round(max_w * scale))
+        scores = _window_sums(ii, h, w) / total - AREA_PENALTY * (h * w) / (height * width)
+        y, x = np.unravel_index(np.argmax(scores), scores.shape)
+        if best is None or scores[y, x] > best[0]:
+            best = (scores[y, x], int(x), int(y), w, h)
+    return best[1:]
+
+
+def local_smart_crops(image_bytes: bytes, aspect_ratios: list[float]) -> dict:
+    """Compute smart crops locally, in the same shape as the Azure Vision results.
+
+    Returns:
+        dict with "smart_crops" (one entry per requested ratio, in order),
+        "image_height", "image_width" and "model_version"
+    """
+    image = Image.open(BytesIO(image_bytes))
+    image_width, image_height = image.size
+    # JPEG draft mode decodes straight to a reduced size
+    image.draft("RGB", (ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE))
+    image = image.convert("RGB")
+    image.thumbnail((ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE), Image.BILINEAR)
+    rgb = np.asarray(image, dtype=np.float32) / 255.0
+
+    height, width = rgb.shape[:2]
+    ii = _integral_image(saliency_map(rgb))
+    fx, fy = image_width / width, image_height / height
+
+    smart_crops = []
+    for aspect_ratio in aspect_ratios:
+        x, y, w, h = best_window(ii, height, width, aspect_ratio)
+        # Scale back to the original image, keeping the ratio exact where possible
+        h_full = min(image_height, round(h * fy))
+        w_full = min(image_width, round(h_full * aspect_ratio)) or 1
+        x_full = min(round(x * fx), image_width - w_full)
+        y_full = min(round(y * fy), image_height - h_full)
+        smart_crops.append({
+            "aspect_ratio": round(w_full / h_full, 2),
+            "bounding_box": {"x": x_full, "y": y_full, "w": w_full, "h": h_full},
+        })
+
+    return {
+        "smart_crops": smart_crops,
+        "image_height": image_height,
+        "image_width": image_width,
+        "model_version": LOCAL_MODEL_VERSION,
+    }
@@ -1,65 +1,130 @@
 import os
-import base64
 import json
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from PIL import Image
-from azure.ai.vision.imageanalysis import ImageAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.vision.imageanalysis.models import VisualFeatures
-
 from config.settings import Config
+from services.admission import admission
+from services.blob_store import get_blob, put_blob
+from services.rate_limit import rate_limiter
+from services.cache import TTLCache
+from services.singleflight import single_flight
+from tools.image_cache import decoded_images, lossless_jpeg_crop
+from tools.image_input import get_uploaded_image_ref
+from tools.result import ToolResult, tool_error
+from tools.saliency_crop import LOCAL_MODEL_VERSION, local_smart_crops
 
 endpoint = Config.VISION_STUDIO_ENDPOINT
 key = Config.VISION_STUDIO_KEY
 
-client = ImageAnalysisClient(
-    endpoint=endpoint,
-    credential=AzureKeyCredential(key)
+# Sync Vision client, created on first use so the Azure SDK stays out of startup
+_vision_client = None
+_vision_client_lock = threading.Lock()
+
+# Async Vision clients, one per event loop
+async_vision_clients = weakref.WeakKeyDictionary()
+
+# Smart crop results, each with its image's metadata, per (image SHA-256,
+# aspect ratio, model version)
+smart_crop_cache = TTLCache(
+    max_entries=Config.SMART_CROP_CACHE_MAX_ENTRIES,
+    ttl_sec=Config.SMART_CROP_CACHE_TTL_SEC,
 )
 
-def smart_crop_image(aspect_ratios: list[float] = None) -> str:
-    """
-    Analyze the uploaded image and return smart crop suggestions.
-    Uses synchronous Azure client for compatibility with Streamlit.
-    
-    Args:
-        aspect_ratios: List of aspect ratios for smart cropping (default: [0.9, 1.33])
+# Crop results per (image SHA-256, x, y, width, height)
+crop_result_cache = TTLCache(
+    max_entries=Config.SMART_CROP_CACHE_MAX_ENTRIES,
+    ttl_sec=Config.SMART_CROP_CACHE_TTL_SEC,
+)
+
+# Runs Vision calls in "auto" mode so they can be abandoned for the local engine
+vision_executor = ThreadPoolExecutor(max_workers=Config.TOOL_MAX_WORKERS, thread_name_prefix="vision")
+
+
+def normalize_aspect_ratio(aspect_ratio: float) -> float:
+    """Round an aspect ratio to the two-decimal precision Azure Vision uses."""
+    return round(float(aspect_ratio), 2)
+
+
+def analyze_smart_crops(image_bytes: bytes, aspect_ratios: list[float]) -> dict:
+    """Call Azure Vision for smart crops of the given aspect ratios.
     
     Returns:
-        JSON string containing smart crop results and metadata
+        dict with "smart_crops" (one entry per requested ratio, in order),
+        "image_height", "image_width" and "model_version"
     """
-    import streamlit as st
-    
-    # Get image data from session state
-    image_data_b64 = getattr(st.session_state, 'uploaded_image_data', None)
-    if not image_data_b64:
-        return json.dumps({"error": "No image data available. Please upload an image first."})
-    
-    if aspect_ratios is None:
-        aspect_ratios_local = [0.9, 1.33]
-    else:
-        aspect_ratios_local = aspect_ratios
-    
-    # Decode base64 string to bytes
-    try:
-        image_bytes = base64.b64decode(image_data_b64)
-    except Exception as e:
-        return json.dumps({"error": f"Failed to decode base64 image data: {str(e)}"})
-    
-    visual_features = [VisualFeatures.SMART_CROPS]
-    
-    try:
-        # Use synchronous client for Streamlit compatibility
-        result = client.analyze(
+    from azure.ai.vision.imageanalysis.models import VisualFeatures
+
+    # Use synchronous client for Streamlit compatibility
+    with admission.admit("vision"):
+        # Analysis has no side effects, so 5xx responses are retried too
+        result = rate_limiter.call(
+            "vision", get_vision_client().analyze,
+            idempotent=True,
             image_data=image_bytes,
-            visual_features=visual_features,
-            smart_crops_aspect_ratios=aspect_ratios_local,
+            visual_features=[VisualFeatures.SMART_CROPS],
+            smart_crops_aspect_ratios=aspect_ratios,
             gender_neutral_caption=True,
-            language="en"
+            language="en",
+            model_version=Config.VISION_MODEL_VERSION,
         )
-    except Exception as e:
-        return json.dumps({"error": f"Failed to analyze image: {str(e)}"})
-    
+
+    return smart_crops_from_result(result)
+
+
+async def analyze_smart_crops_async(image_bytes: bytes, aspect_ratios: list[float]) -> dict:
+    """Async counterpart of analyze_smart_crops."""
+    from azure.ai.vision.imageanalysis.models import VisualFeatures
+
+    async with admission.admit_async("vision"):
+        result = await rate_limiter.call_async(
+            "vision", get_async_vision_client().analyze,
+            idempotent=True,
+            image_data=image_bytes,
+            visual_features=[VisualFeatures.SMART_CROPS],
+            smart_crops_aspect_ratios=aspect_ratios,
+            gender_neutral_caption=True,
+            language="en",
+            model_version=Config.VISION_MODEL_VERSION,
+        )
+    return smart_crops_from_result(result)
+
+
+def get_vision_client():
+    """Return the shared sync Vision client, creating it on first use."""
+    global _vision_client
+    with _vision_client_lock:
+        if _vision_client is None:
+            from azure.ai.vision.imageanalysis import ImageAnalysisClient
+            from azure.core.credentials import AzureKeyCredential
+
+            # Retries are left to the shared rate limiter, which also paces the calls
+            _vision_client = ImageAnalysisClient(
+                endpoint=endpoint,
+                credential=AzureKeyCredential(key),
+                retry_total=0,
+            )
+        return _vision_client
+
+
+def get_async_vision_client():
+    """Return the async Vision client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    async_client = async_vision_clients.get(loop)
+    if async_client is None:
+        from azure.ai.vision.imageanalysis.aio import ImageAnalysisClient as AsyncImageAnalysisClient
+        from azure.core.credentials import AzureKeyCredential
+
+        async_client = AsyncImageAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential(key), retry_total=0)
+        async_vision_clients[loop] = async_client
+    return async_client
+
+
+def smart_crops_from_result(result) -> dict:
+    """Convert an ImageAnalysisResult into the smart crop dict returned by the tools."""
     smart_crops = []
     if result.smart_crops is not None:
         for smart_crop in result.smart_crops.list:
@@ -72,16 +137,218 @@ def smart_crop_image(aspect_ratios: list[float] = None) -> str:
                     "h": smart_crop.bounding_box["h"]
                 }
             })
-    
-    return json.dumps({
+
+    return {
         "smart_crops": smart_crops,
         "image_height": result.metadata.height,
         "image_width": result.metadata.width,
         "model_version": result.model_version
+    }
+
+
+def smart_crop_image(aspect_ratios: list[float] = None) -> str | ToolResult:
+    """
+    Analyze the uploaded image and return smart crop suggestions.
+    Uses synchronous Azure client for compatibility with Streamlit.
+    
+    Results are cached per image, aspect ratio and model version, so only
+    ratios that have not been analyzed for this image are sent to Azure.
+    
+    Args:
+        aspect_ratios: List of aspect ratios for smart cropping (default: [0.9, 1.33])
+    
+    Returns:
+        JSON string containing smart crop results and metadata, or an
+        error ToolResult
+    """
+    return smart_crop_image_ref(get_uploaded_image_ref(), aspect_ratios)
+
+
+def smart_crop_image_ref(image_ref: str, aspect_ratios: list[float] = None) -> str | ToolResult:
+    """Smart crop suggestions for the image stored under a blob reference; see smart_crop_image."""
+    ratios = requested_ratios(aspect_ratios)
+    if not ratios:
+        return tool_error("aspect_ratios must contain at least one aspect ratio.")
+    image_bytes = get_blob(image_ref) if image_ref else None
+    if not image_bytes:
+        return tool_error("No image data available. Please upload an image first.")
+    
+    crops, metadata, missing = cached_smart_crops(image_ref, ratios)
+    if missing:
+        try:
+            result = fetch_smart_crops(image_ref, image_bytes, missing)
+        except Exception as e:
+            return tool_error(f"Failed to analyze image: {str(e)}")
+        metadata = merge_smart_crops(crops, missing, result)
+    
+    return json.dumps({
+        "smart_crops": [crops[r] for r in ratios if crops.get(r) is not None],
+        **metadata,
     })
 
 
-def crop_image(x: int, y: int, width: int, height: int) -> str:
+async def smart_crop_image_async(aspect_ratios: list[float] = None, *, image_ref: str = None) -> str | ToolResult:
+    """Async counterpart of smart_crop_image for the image stored under image_ref."""
+    ratios = requested_ratios(aspect_ratios)
+    if not ratios:
+        return tool_error("aspect_ratios must contain at least one aspect ratio.")
+    # The blob may have to be read back from disk
+    image_bytes = await asyncio.to_thread(get_blob, image_ref) if image_ref else None
+    if not image_bytes:
+        return tool_error("No image data available. Please upload an image first.")
+    
+    crops, metadata, missing = cached_smart_crops(image_ref, ratios)
+    if missing:
+        try:
+            result = await fetch_smart_crops_async(image_ref, image_bytes, missing)
+        except Exception as e:
+            return tool_error(f"Failed to analyze image: {str(e)}")
+        metadata = merge_smart_crops(crops, missing, result)
+    
+    return json.dumps({
+        "smart_crops": [crops[r] for r in ratios if crops.get(r) is not None],
+        **metadata,
+    })
+
+
+def requested_ratios(aspect_ratios: list[float] = None) -> list[float]:
+    """Normalize the requested aspect ratios, applying the default of [0.9, 1.33]."""
+    if aspect_ratios is None:
+        aspect_ratios = [0.9, 1.33]
+    return [normalize_aspect_ratio(r) for r in aspect_ratios]
+
+
+def cached_smart_crops(image_ref: str, ratios: list[float]) -> tuple[dict, dict | None, list[float]]:
+    """Look up cached crops for an image.
+    
+    Returns:
+        (crop or None per distinct ratio, cached image metadata or None,
+        ratios that still need to be analyzed). The metadata is only None
+        when no ratio is cached.
+    """
+    # The blob reference is the SHA-256 of the image bytes
+    model_version = cache_model_version()
+    entries = {r: smart_crop_cache.get((image_ref, r, model_version)) for r in dict.fromkeys(ratios)}
+    crops = {r: entry["crop"] if entry else None for r, entry in entries.items()}
+    metadata = next((entry["metadata"] for entry in entries.values() if entry), None)
+    missing = [r for r, crop in crops.items() if crop is None]
+    return crops, metadata, missing
+
+
+def merge_smart_crops(crops: dict, missing: list[float], result: dict) -> dict:
+    """Merge freshly analyzed crops into crops and return the image metadata."""
+    if len(result["smart_crops"]) == len(missing):
+        # One crop per requested ratio, in request order
+        crops.update(zip(missing, result["smart_crops"]))
+    else:
+        for crop in result["smart_crops"]:
+            crops[normalize_aspect_ratio(crop["aspect_ratio"])] = crop
+    return {
+        "image_height": result["image_height"],
+        "image_width": result["image_width"],
+        "model_version": result["model_version"],
+    }
+
+
+def analyze_smart_crops_coalesced(image_ref: str, image_bytes: bytes, ratios: list[float]) -> dict:
+    """Call Azure Vision, sharing one in-flight call between identical concurrent requests."""
+    key = ("vision", image_ref, tuple(ratios), Config.VISION_MODEL_VERSION)
+    return single_flight.do(key, analyze_smart_crops, image_bytes, ratios)
+
+
+async def analyze_smart_crops_coalesced_async(image_ref: str, image_bytes: bytes, ratios: list[float]) -> dict:
+    """Async counterpart of analyze_smart_crops_coalesced."""
+    key = ("vision", image_ref, tuple(ratios), Config.VISION_MODEL_VERSION)
+    return await single_flight.do_async(key, analyze_smart_crops_async, image_bytes, ratios)
+
+
+def cache_model_version() -> str:
+    """Return the model version smart crop results are cached under for the configured backend."""
+    if Config.SMART_CROP_BACKEND == "local":
+        return LOCAL_MODEL_VERSION
+    return Config.VISION_MODEL_VERSION
+
+
+def cache_smart_crops(image_ref: str, ratios: list[float], result: dict) -> None:
+    """Store the crops of a smart crop result in the cache, each with the image metadata.
+
+    Keeping the metadata in every entry means a request whose crops are all
+    cached never needs Vision, whatever else has been evicted.
+    """
+    model_version = cache_model_version()
+    metadata = {
+        "image_height": result["image_height"],
+        "image_width": result["image_width"],
+        "model_version": result["model_version"],
+    }
+    if len(result["smart_crops"]) == len(ratios):
+        for r, crop in zip(ratios, result["smart_crops"]):
+            smart_crop_cache.set((image_ref, r, model_version), {"crop": crop, "metadata": metadata})
+
+
+def fetch_smart_crops(image_ref: str, image_bytes: bytes, ratios: list[float]) -> dict:
+    """Compute smart crops with the backend selected by Config.SMART_CROP_BACKEND.
+    
+    "azure" always calls Azure Vision and "local" always uses the local
+    saliency engine. "auto" calls Azure Vision but answers from the local
+    engine if Vision fails or takes longer than SMART_CROP_FALLBACK_SEC; a
+    late Vision result is still cached for the next request, while local
+    fallback results are not cached.
+    """
+    backend = Config.SMART_CROP_BACKEND
+    if backend == "local":
+        result = local_smart_crops(image_bytes, ratios)
+        cache_smart_crops(image_ref, ratios, result)
+        return result
+
+    if backend != "auto":
+        result = analyze_smart_crops_coalesced(image_ref, image_bytes, ratios)
+        cache_smart_crops(image_ref, ratios, result)
+        return result
+
+    def cache_when_done(future):
+        if future.exception() is None:
+            cache_smart_crops(image_ref, ratios, future.result())
+
+    future = vision_executor.submit(analyze_smart_crops_coalesced, image_ref, image_bytes, ratios)
+    future.add_done_callback(cache_when_done)
+    try:
+        return future.result(timeout=Config.SMART_CROP_FALLBACK_SEC)
+    except Exception:
+        return local_smart_crops(image_bytes, ratios)
+
+
+async def fetch_smart_crops_async(image_ref: str, image_bytes: bytes, ratios: list[float]) -> dict:
+    """Async counterpart of fetch_smart_crops."""
+    backend = Config.SMART_CROP_BACKEND
+    if backend == "local":
+        result = await asyncio.to_thread(local_smart_crops, image_bytes, ratios)
+        cache_smart_crops(image_ref, ratios, result)
+        return result
+
+    if backend != "auto":
+        result = await analyze_smart_crops_coalesced_async(image_ref, image_bytes, ratios)
+        cache_smart_crops(image_ref, ratios, result)
+        return result
+
+    def cache_when_done(task):
+        if not task.cancelled() and task.exception() is None:
+            cache_smart_crops(image_ref, ratios, task.result())
+
+    task = asyncio.ensure_future(analyze_smart_crops_coalesced_async(image_ref, image_bytes, ratios))
+    task.add_done_callback(cache_when_done)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=Config.SMART_CROP_FALLBACK_SEC)
+    except Exception:
+        return await asyncio.to_thread(local_smart_crops, image_bytes, ratios)
+
+
+def smart_crop_cache_stats() -> dict:
+    """Return hit/miss counts and hit rate of the smart crop cache."""
+    return smart_crop_cache.stats()
+
+
+def crop_image(x: int, y: int, width: int, height: int) -> ToolResult:
     """
     Crop the uploaded image using the specified bounding box coordinates.
     
@@ -92,41 +359,69 @@ def crop_image(x: int, y: int, width: int, height: int) -> str:
         height: Height of the crop area
     
     Returns:
-        JSON string containing the cropped image as base64 and metadata
+        ToolResult with a short confirmation for the model and, as its
+        "cropped_image_data" artifact, a blob reference to the cropped image
+        and its metadata
     """
-    import streamlit as st
+    return crop_image_ref(get_uploaded_image_ref(), x, y, width, height)
+
+
+async def crop_image_async(x: int, y: int, width: int, height: int, *, image_ref: str = None) -> ToolResult:
+    """Async counterpart of crop_image; the CPU-bound crop runs in a worker thread."""
+    return await asyncio.to_thread(crop_image_ref, image_ref, x, y, width, height)
+
+
+def crop_image_ref(image_ref: str, x: int, y: int, width: int, height: int) -> ToolResult:
+    """Crop the image stored under a blob reference; see crop_image."""
+    image_bytes = get_blob(image_ref) if image_ref else None
+    if not image_bytes:
+        return tool_error("No image data available. Please upload an image first.")
     
-    # Get image data from session state
-    image_data_b64 = getattr(st.session_state, 'uploaded_image_data', None)
-    if not image_data_b64:
-        return json.dumps({"error": "No image data available. Please upload an image first."})
+    # Repeated crops of the same image and box are served from the cache, as long as
+    # the cropped blob is still stored; re-putting it charges it to this session too
+    cached = crop_result_cache.get((image_ref, x, y, width, height))
+    cropped_bytes = get_blob(cached["cropped_image_ref"]) if cached is not None else None
+    if cropped_bytes is not None:
+        put_blob(cropped_bytes)
+        return crop_tool_result(cached)
     
     try:
-        # Decode base64 to bytes
-        image_bytes = base64.b64decode(image_data_b64)
-        
-        # Open image with PIL
+        # MCU-aligned JPEG crops skip decoding and recompression entirely; the
+        # lossless path only needs the header
         image = Image.open(BytesIO(image_bytes))
+        cropped_bytes = lossless_jpeg_crop(image_bytes, image, x, y, width, height)
+        if cropped_bytes is not None:
+            cropped_size = {"width": width, "height": height}
+        else:
+            # Reuse the decoded image across crops of the same upload
+            image = decoded_images.get(image_ref, image_bytes)
+            cropped_image = image.crop((x, y, x + width, y + height))
+            cropped_size = {"width": cropped_image.width, "height": cropped_image.height}
+            
+            # Convert back to bytes
+            output_buffer = BytesIO()
+            cropped_image.save(output_buffer, format=image.format or 'JPEG')
+            cropped_bytes = output_buffer.getvalue()
         
-        # Crop the image
-        cropped_image = image.crop((x, y, x + width, y + height))
-        
-        # Convert back to bytes
-        output_buffer = BytesIO()
-        cropped_image.save(output_buffer, format=image.format or 'JPEG')
-        cropped_bytes = output_buffer.getvalue()
-        
-        # Encode as base64
-        cropped_b64 = base64.b64encode(cropped_bytes).decode('utf-8')
-        
-        return json.dumps({
+        result = {
             "success": True,
-            "cropped_image_b64": cropped_b64,
+            "cropped_image_ref": put_blob(cropped_bytes),
             "crop_coordinates": {"x": x, "y": y, "width": width, "height": height},
             "original_size": {"width": image.width, "height": image.height},
-            "cropped_size": {"width": cropped_image.width, "height": cropped_image.height},
+            "cropped_size": cropped_size,
             "format": image.format or 'JPEG'
-        })
+        }
+        crop_result_cache.set((image_ref, x, y, width, height), result)
+        return crop_tool_result(result)
         
     except Exception as e:
-        return json.dumps({"error": f"Failed to crop image: {str(e)}"})
\ No newline at end of file
+        return tool_error(f"Failed to crop image: {str(e)}")
+
+
+def crop_tool_result(result: dict) -> ToolResult:
+    """Confirm a crop to the model, keeping the cropped image as an artifact."""
+    size = result["cropped_size"]
+    return ToolResult.from_dict(
+        {"success": True, "message": f"Image cropped successfully to {size['width']}x{size['height']} pixels"},
+        artifacts={"cropped_image_data": result},
+    )
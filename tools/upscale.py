@@ -1,13 +1,186 @@
 import os
-import base64
-import json
 import requests
 import asyncio
+import threading
+import aiohttp
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from io import BytesIO
 from PIL import Image
 from typing import Optional
+from config.settings import Config
+from services.admission import AdmissionRejected
+from services.blob_store import current_session_id, get_blob, put_blob
+from services.cache import TTLCache
+from services.disk_cache import DiskLRUCache
+from services.singleflight import single_flight
+from services.upscaler_client import get_upscaler_client
+from tools.image_input import get_uploaded_image_ref
+from tools.local_upscale import LOCAL_ENGINE, lanczos_upscale
+from tools.result import ToolResult, tool_error
+from tools.upscale_tiles import upscale_tiled
 
-def upscale_image(scale: int = 2) -> str:
+# Upscaled outputs per (engine, endpoint, image SHA-256, scale), evicted by total size
+upscale_cache = DiskLRUCache(Config.UPSCALE_CACHE_DIR, Config.UPSCALE_CACHE_MAX_MB * 1024 * 1024)
+
+# Remote results that arrived after a local hedge answered, per local result reference
+remote_replacements = TTLCache(max_entries=1024, ttl_sec=24 * 3600)
+
+# Runs remote calls when hedging, so they can outlive the tool call
+hedge_executor = ThreadPoolExecutor(max_workers=Config.UPSCALE_HEDGE_MAX_PENDING, thread_name_prefix="upscale-hedge")
+
+# Held by each hedged remote call, sync or async, until it finishes, so calls
+# hung on the service cannot pile up behind one another
+hedge_slots = threading.BoundedSemaphore(Config.UPSCALE_HEDGE_MAX_PENDING)
+
+REMOTE_ENGINE = "remote-edsr"
+
+
+class UpscaleAPIError(Exception):
+    """Raised when the upscaling service answers with a non-200 status."""
+
+
+# Failures of the remote engine that a hedged upscale answers locally
+REMOTE_ERRORS = (UpscaleAPIError, AdmissionRejected, requests.exceptions.RequestException, aiohttp.ClientError)
+
+
+def request_upscale(image_bytes: bytes, scale: int, width: int, height: int, image_format: str) -> bytes:
+    """POST the image to the upscaling service, labeled with its real format.
+    
+    Returns:
+        The upscaled image bytes
+    """
+    image_format = image_format.upper()
+    response = get_upscaler_client().upscale(
+        image_bytes, scale, width, height,
+        filename=f"image.{image_format.lower()}",
+        content_type=Image.MIME.get(image_format, "application/octet-stream"),
+    )
+    if response.status_code != 200:
+        raise UpscaleAPIError(f"API request failed with status {response.status_code}: {response.text}")
+    return response.content
+
+
+def should_tile(width: int, height: int) -> bool:
+    """Decide whether to upscale in tiles, according to Config.UPSCALE_TILING."""
+    if Config.UPSCALE_TILING == "always":
+        return max(width, height) > Config.UPSCALE_TILE_SIZE
+    if Config.UPSCALE_TILING == "auto":
+        return width * height > Config.UPSCALE_TILING_MIN_MEGAPIXELS * 1_000_000
+    return False
+
+
+def upscale_bytes(image_bytes: bytes, image: Image.Image, scale: int) -> bytes:
+    """Upscale an image in one request, or as concurrent overlapping tiles if it is large."""
+    if not should_tile(image.width, image.height):
+        return request_upscale(image_bytes, scale, image.width, image.height, image.format or 'JPEG')
+
+    return upscale_tiled(
+        image, scale,
+        lambda tile_bytes, width, height: request_upscale(tile_bytes, scale, width, height, "PNG"),
+        tile_size=Config.UPSCALE_TILE_SIZE,
+        overlap=Config.UPSCALE_TILE_OVERLAP,
+        workers=Config.UPSCALE_TILE_WORKERS,
+    )
+
+
+def upscale_cache_key(image_ref: str, scale: int) -> str:
+    """Disk cache key of a remote upscale, so a different service or model does not serve old results."""
+    return f"{REMOTE_ENGINE}:{get_upscaler_client().endpoint}:{image_ref}:{scale}"
+
+
+def cache_upscaled(image_ref: str, scale: int, upscaled_bytes: bytes) -> None:
+    """Store a remote result in the disk cache once it is known to decode.
+
+    Raises:
+        UpscaleAPIError: If the service answered 200 with a truncated or non-image body
+    """
+    try:
+        Image.open(BytesIO(upscaled_bytes)).load()
+    except (OSError, SyntaxError, ValueError) as e:
+        raise UpscaleAPIError(f"API returned an invalid image: {e}") from e
+    upscale_cache.set(upscale_cache_key(image_ref, scale), upscaled_bytes)
+
+
+def upscale_remote(image_ref: str, image_bytes: bytes, image: Image.Image, scale: int) -> bytes:
+    """Upscale with the remote EDSR service and store the result in the disk cache."""
+    # Identical concurrent requests (same image content and scale) share one call
+    upscaled_bytes = single_flight.do(
+        ("upscaler", image_ref, scale),
+        upscale_bytes, image_bytes, image, scale,
+    )
+    cache_upscaled(image_ref, scale, upscaled_bytes)
+    return upscaled_bytes
+
+
+def upscale_hedged(image_ref: str, image_bytes: bytes, image: Image.Image, scale: int) -> tuple[bytes, str, Future | None]:
+    """Upscale remotely, falling back to the local engine if the remote call is slow or fails.
+    
+    When the remote service has not answered within Config.UPSCALE_HEDGE_SEC
+    (e.g. while it scales from zero), a local Lanczos result is returned and
+    the remote call keeps running in the background. When it fails, or
+    Config.UPSCALE_HEDGE_MAX_PENDING remote calls are already running, the
+    local result is returned alone.
+    
+    Returns:
+        (upscaled image bytes, name of the engine that produced them,
+        the still-running remote call if the local engine answered)
+    """
+    if Config.UPSCALE_HEDGE_SEC <= 0:
+        return upscale_remote(image_ref, image_bytes, image, scale), REMOTE_ENGINE, None
+
+    image.load()  # Decode once up front; both engines may read the image concurrently
+    if not hedge_slots.acquire(blocking=False):
+        return lanczos_upscale(image, scale, Config.UPSCALE_LOCAL_SHARPEN_AMOUNT), LOCAL_ENGINE, None
+    future = hedge_executor.submit(upscale_remote, image_ref, image_bytes, image, scale)
+    future.add_done_callback(lambda _: hedge_slots.release())
+    try:
+        return future.result(timeout=Config.UPSCALE_HEDGE_SEC), REMOTE_ENGINE, None
+    except FutureTimeoutError:
+        pending_remote = future
+    except REMOTE_ERRORS:
+        pending_remote = None
+    local_bytes = lanczos_upscale(image, scale, Config.UPSCALE_LOCAL_SHARPEN_AMOUNT)
+    return local_bytes, LOCAL_ENGINE, pending_remote
+
+
+def replace_when_done(local_ref: str, remote) -> None:
+    """Replace a local result with the remote one once the remote call succeeds.
+    
+    The remote result counts against the budget of the session that asked
+    for the upscale. An asyncio task's result is stored from a worker thread.
+    
+    Args:
+        local_ref: Blob reference of the local result
+        remote: concurrent.futures.Future or asyncio task of the remote call
+    """
+    session_id = current_session_id()
+
+    def store(upscaled_bytes: bytes) -> None:
+        remote_replacements.set(local_ref, put_blob(upscaled_bytes, session_id=session_id))
+
+    def record(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if isinstance(future, asyncio.Future):
+            asyncio.ensure_future(asyncio.to_thread(store, future.result()))
+        else:
+            store(future.result())
+    remote.add_done_callback(record)
+
+
+def resolve_upscaled_ref(upscaled_ref: str) -> tuple[str, bool]:
+    """Return the reference to display for an upscale result.
+    
+    Returns:
+        (reference, True if a late remote result replaced a local one)
+    """
+    remote_ref = remote_replacements.get(upscaled_ref)
+    if remote_ref is not None:
+        return remote_ref, True
+    return upscaled_ref, False
+
+
+def upscale_image(scale: int = 2) -> ToolResult:
     """
     Upscale the uploaded image using the deployed OpenCV service on Azure Container Apps.
     
@@ -15,78 +188,178 @@ def upscale_image(scale: int = 2) -> str:
         scale: Upscaling factor (2, 3, or 4, default: 2)
     
     Returns:
-        JSON string containing the upscaled image as base64 and metadata
+        ToolResult with a short confirmation for the model and, as its
+        "upscaled_image_data" artifact, a blob reference to the upscaled image
+        and its metadata
     """
-    import streamlit as st
-    
+    return upscale_image_ref(get_uploaded_image_ref(), scale)
+
+
+def upscale_image_ref(image_ref: str, scale: int = 2) -> ToolResult:
+    """Upscale the image stored under a blob reference; see upscale_image."""
     # Validate scale parameter
     if scale not in [2, 3, 4]:
-        return json.dumps({"error": "Scale must be 2, 3, or 4"})
+        return tool_error("Scale must be 2, 3, or 4")
     
-    # Get image data from session state
-    image_data_b64 = getattr(st.session_state, 'uploaded_image_data', None)
-    if not image_data_b64:
-        return json.dumps({"error": "No image data available. Please upload an image first."})
+    # Get image bytes from the blob store
+    image_bytes = get_blob(image_ref) if image_ref else None
+    if not image_bytes:
+        return tool_error("No image data available. Please upload an image first.")
     
     try:
-        # Decode base64 to bytes
-        image_bytes = base64.b64decode(image_data_b64)
-        
         # Open image with PIL to get metadata
         original_image = Image.open(BytesIO(image_bytes))
-        original_width, original_height = original_image.size
-        original_format = original_image.format or 'JPEG'
         
-        # Prepare the image file for upload to the API
-        files = {
-            'file': ('image.jpg', image_bytes, 'image/jpeg')
-        }
-        
-        # Call the Azure Container Apps endpoint
-        api_url = "https://willseff-upscaler.nicerock-8f679d6b.eastus.azurecontainerapps.io/upscale"
-        params = {'scale': scale}
-        
-        response = requests.post(
-            api_url,
-            files=files,
-            params=params,
-            timeout=30  # 30 second timeout
-        )
+        # Serve repeated requests from the disk cache without touching the network
+        upscaled_bytes = upscale_cache.get(upscale_cache_key(image_ref, scale))
+        cached = upscaled_bytes is not None
+        engine, pending_remote = REMOTE_ENGINE, None
+        if not cached:
+            upscaled_bytes, engine, pending_remote = upscale_hedged(image_ref, image_bytes, original_image, scale)
         
-        if response.status_code != 200:
-            return json.dumps({
-                "error": f"API request failed with status {response.status_code}: {response.text}"
-            })
-        
-        # Get the upscaled image bytes
-        upscaled_bytes = response.content
-        
-        # Convert to base64 for return
-        upscaled_b64 = base64.b64encode(upscaled_bytes).decode('utf-8')
-        
-        # Calculate expected dimensions
-        expected_width = original_width * scale
-        expected_height = original_height * scale
-        
-        return json.dumps({
-            "success": True,
-            "upscaled_image_b64": upscaled_b64,
-            "scale_factor": scale,
-            "original_size": {"width": original_width, "height": original_height},
-            "upscaled_size": {"width": expected_width, "height": expected_height},
-            "original_format": original_format,
-            "upscaled_format": "PNG",
-            "api_endpoint": api_url
-        })
+        result = upscale_result(original_image, scale, upscaled_bytes, cached, engine, pending_remote is not None)
+        if pending_remote is not None:
+            replace_when_done(result.artifacts["upscaled_image_data"]["upscaled_image_ref"], pending_remote)
+        return result
         
+    except UpscaleAPIError as e:
+        return tool_error(str(e))
     except requests.exceptions.Timeout:
-        return json.dumps({"error": "Request timed out. The upscaling process may take longer for large images."})
+        return tool_error("Request timed out. The upscaling process may take longer for large images.")
     except requests.exceptions.ConnectionError:
-        return json.dumps({"error": "Failed to connect to the upscaling service. Please check if the service is running."})
+        return tool_error("Failed to connect to the upscaling service. Please check if the service is running.")
     except requests.exceptions.RequestException as e:
-        return json.dumps({"error": f"Request failed: {str(e)}"})
+        return tool_error(f"Request failed: {str(e)}")
     except Exception as e:
-        return json.dumps({"error": f"Failed to upscale image: {str(e)}"})
+        return tool_error(f"Failed to upscale image: {str(e)}")
 
 
+async def upscale_image_async(scale: int = 2, *, image_ref: str = None) -> ToolResult:
+    """Async counterpart of upscale_image for the image stored under image_ref."""
+    # Validate scale parameter
+    if scale not in [2, 3, 4]:
+        return tool_error("Scale must be 2, 3, or 4")
+    
+    # Blob reads, decoding and hashing run in worker threads to keep the shared event loop free
+    image_bytes = await asyncio.to_thread(get_blob, image_ref) if image_ref else None
+    if not image_bytes:
+        return tool_error("No image data available. Please upload an image first.")
+    
+    try:
+        original_image = await asyncio.to_thread(Image.open, BytesIO(image_bytes))
+        
+        upscaled_bytes = await asyncio.to_thread(upscale_cache.get, upscale_cache_key(image_ref, scale))
+        cached = upscaled_bytes is not None
+        engine, pending_remote = REMOTE_ENGINE, None
+        if not cached and Config.UPSCALE_HEDGE_SEC <= 0:
+            upscaled_bytes = await upscale_remote_async(image_ref, image_bytes, original_image, scale)
+        elif not cached:
+            # Hedge: fall back to the local engine if the remote call is slow or fails
+            await asyncio.to_thread(original_image.load)
+            upscaled_bytes = None
+            if hedge_slots.acquire(blocking=False):
+                remote = asyncio.ensure_future(upscale_remote_async(image_ref, image_bytes, original_image, scale))
+                remote.add_done_callback(lambda _: hedge_slots.release())
+                try:
+                    upscaled_bytes = await asyncio.wait_for(asyncio.shield(remote), timeout=Config.UPSCALE_HEDGE_SEC)
+                except asyncio.TimeoutError:
+                    pending_remote = remote
+                except REMOTE_ERRORS:
+                    pass
+            if upscaled_bytes is None:
+                upscaled_bytes = await asyncio.to_thread(
+                    lanczos_upscale, original_image, scale, Config.UPSCALE_LOCAL_SHARPEN_AMOUNT
+                )
+                engine = LOCAL_ENGINE
+        
+        result = await asyncio.to_thread(
+            upscale_result, original_image, scale, upscaled_bytes, cached, engine, pending_remote is not None
+        )
+        if pending_remote is not None:
+            # asyncio tasks only take callbacks from the loop's own thread
+            replace_when_done(result.artifacts["upscaled_image_data"]["upscaled_image_ref"], pending_remote)
+        return result
+        
+    except UpscaleAPIError as e:
+        return tool_error(str(e))
+    except (asyncio.TimeoutError, aiohttp.ServerTimeoutError):
+        return tool_error("Request timed out. The upscaling process may take longer for large images.")
+    except aiohttp.ClientConnectionError:
+        return tool_error("Failed to connect to the upscaling service. Please check if the service is running.")
+    except aiohttp.ClientError as e:
+        return tool_error(f"Request failed: {str(e)}")
+    except Exception as e:
+        return tool_error(f"Failed to upscale image: {str(e)}")
+
+
+async def request_upscale_async(image_bytes: bytes, scale: int, width: int, height: int, image_format: str) -> bytes:
+    """Async counterpart of request_upscale."""
+    image_format = image_format.upper()
+    status, body = await get_upscaler_client().upscale_async(
+        image_bytes, scale, width, height,
+        filename=f"image.{image_format.lower()}",
+        content_type=Image.MIME.get(image_format, "application/octet-stream"),
+    )
+    if status != 200:
+        raise UpscaleAPIError(f"API request failed with status {status}: {body.decode('utf-8', errors='replace')}")
+    return body
+
+
+async def upscale_bytes_async(image_bytes: bytes, image: Image.Image, scale: int) -> bytes:
+    """Async counterpart of upscale_bytes; tiled upscales run on their thread pool."""
+    if should_tile(image.width, image.height):
+        return await asyncio.to_thread(upscale_bytes, image_bytes, image, scale)
+    return await request_upscale_async(image_bytes, scale, image.width, image.height, image.format or 'JPEG')
+
 
+async def upscale_remote_async(image_ref: str, image_bytes: bytes, image: Image.Image, scale: int) -> bytes:
+    """Async counterpart of upscale_remote."""
+    # Identical concurrent requests (same image content and scale) share one call
+    upscaled_bytes = await single_flight.do_async(
+        ("upscaler", image_ref, scale),
+        upscale_bytes_async, image_bytes, image, scale,
+    )
+    await asyncio.to_thread(cache_upscaled, image_ref, scale, upscaled_bytes)
+    return upscaled_bytes
+
+
+def upscale_result(original_image: Image.Image, scale: int, upscaled_bytes: bytes,
+                   cached: bool, engine: str, replacement_pending: bool = False) -> ToolResult:
+    """Store an upscaled image and describe it as the result of the upscale tools.
+
+    The caller registers a still-running remote call with replace_when_done
+    once the local result is stored.
+    """
+    original_width, original_height = original_image.size
+    
+    # Report the dimensions of the image actually returned
+    upscaled_image = Image.open(BytesIO(upscaled_bytes))
+    upscaled_width, upscaled_height = upscaled_image.size
+    
+    upscaled_ref = put_blob(upscaled_bytes)
+    
+    if engine == LOCAL_ENGINE and replacement_pending:
+        method = "a local Lanczos fallback while the EDSR service warms up; the EDSR result will replace it when ready"
+    elif engine == LOCAL_ENGINE:
+        method = "a local Lanczos fallback because the EDSR service is unavailable"
+    else:
+        method = "OpenCV EDSR model"
+    return ToolResult.from_dict(
+        {
+            "success": True,
+            "message": f"Image upscaled {scale}x successfully to {upscaled_width}x{upscaled_height} pixels using {method}",
+        },
+        artifacts={"upscaled_image_data": {
+            "success": True,
+            "upscaled_image_ref": upscaled_ref,
+            "scale_factor": scale,
+            "original_size": {"width": original_width, "height": original_height},
+            "upscaled_size": {"width": upscaled_width, "height": upscaled_height},
+            "original_format": original_image.format or 'JPEG',
+            "upscaled_format": upscaled_image.format or "PNG",
+            "cached": cached,
+            "engine": engine,
+            "tiled": should_tile(original_width, original_height),
+            "api_endpoint": get_upscaler_client().endpoint
+        }},
+    )
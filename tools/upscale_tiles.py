@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+
+def tile_starts(length: int, tile_size: int, overlap: int) -> list[int]:
+    """Start offsets of overlapping tiles covering [0, length); the last tile ends at length."""
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"Tile overlap must be at least 0 and less than the tile size {tile_size}, got {overlap}")
+    if length <= tile_size:
+        return [0]
+    step = tile_size - overlap
+    starts = list(range(0, length - tile_size + 1, step))
+    if starts[-1] + tile_size < length:
+        starts.append(length - tile_size)
+    return starts
+
+
+def axis_weights(starts: list[int], tile_len: list[int], length: int, scale: int) -> list[np.ndarray]:
+    """Per-tile blend weights along one axis, in output pixels.
+
+    Each tile ramps linearly across the regions it shares with its
+    neighbours, and the weights are normalized so they sum to one at every
+    position. Because the tiles form a grid, normalizing each axis on its own
+    normalizes the 2D weights too.
+    """
+    weights = []
+    for i, (start, size) in enumerate(zip(starts, tile_len)):
+        w = np.ones(size * scale, dtype=np.float32)
+        if i > 0:
+            ramp = (starts[i - 1] + tile_len[i - 1] - start) * scale
+            w[:ramp] = np.minimum(w[:ramp], (np.arange(ramp) + 0.5) / ramp)
+        if i < len(starts) - 1:
+            ramp = (start + size - starts[i + 1]) * scale
+            w[size * scale - ramp:] = np.minimum(w[size * scale - ramp:], (np.arange(ramp)[::-1] + 0.5) / ramp)
+        weights.append(w)
+
+    total = np.zeros(length * scale, dtype=np.float32)
+    for start, w in zip(starts, weights):
+        total[start * scale:start * scale + len(w)] += w
+    return [w / total[start * scale:start * scale + len(w)] for start, w in zip(starts, weights)]
+
+
+def has_alpha(image: Image.Image) -> bool:
+    return "A" in image.getbands() or "transparency" in image.info
+
+
+def encode_png(image: Image.Image) -> bytes:
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def upscale_tiled(image: Image.Image, scale: int, upscale_tile, tile_size: int, overlap: int, workers: int) -> bytes:
+    """Upscale an image as overlapping tiles in parallel and blend them seam-free.
+
+    Args:
+        image: Decoded source image
+        scale: Upscaling factor
+        upscale_tile: Callable (png_bytes, width, height) -> upscaled image bytes
+        tile_size: Tile side in source pixels
+        overlap: Overlap between neighbouring tiles in source pixels
+        workers: Maximum number of tiles upscaled concurrently
+
+    Images with transparency are tiled and blended in RGBA. When the service
+    returns a tile without its alpha channel, the tile's alpha is resized
+    locally with Lanczos instead.
+
+    Returns:
+        The blended upscaled image as PNG bytes
+    """
+    mode = "RGBA" if has_alpha(image) else "RGB"
+    source = image.convert(mode)
+    channels = len(mode)
+    width, height = source.size
+    xs = tile_starts(width, tile_size, overlap)
+    ys = tile_starts(height, tile_size, overlap)
+    tile_w = [min(tile_size, width - x) for x in xs]
+    tile_h = [min(tile_size, height - y) for y in ys]
+    wx = axis_weights(xs, tile_w, width, scale)
+    wy = axis_weights(ys, tile_h, height, scale)
+
+    def run_tile(row: int, col: int) -> np.ndarray:
+        box = (xs[col], ys[row], xs[col] + tile_w[col], ys[row] + tile_h[row])
+        tile = source.crop(box)
+        upscaled = Image.open(BytesIO(upscale_tile(encode_png(tile), tile_w[col], tile_h[row])))
+        expected = (tile_w[col] * scale, tile_h[row] * scale)
+        if mode == "RGBA" and not has_alpha(upscaled):
+            upscaled = upscaled.convert("RGB")
+            upscaled.putalpha(tile.getchannel("A").resize(upscaled.size, Image.LANCZOS))
+        upscaled = upscaled.convert(mode)
+        if upscaled.size != expected:
+            upscaled = upscaled.resize(expected, Image.LANCZOS)
+        return np.asarray(upscaled, dtype=np.float32)
+
+    output = np.empty((height * scale, width * scale, channels), dtype=np.uint8)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upscale-tile") as executor:
+        futures = [[executor.submit(run_tile, r, c) for c in range(len(xs))] for r in range(len(ys))]
+
+        # Blend one row of tiles at a time; rows shared with the next band stay
+        # in float until that band has been added
+        pending, pending_start = None, 0
+        for r, row_futures in enumerate(futures):
+            band = np.zeros((tile_h[r] * scale, width * scale, channels), dtype=np.float32)
+            for c, future in enumerate(row_futures):
+                x0 = xs[c] * scale
+                band[:, x0:x0 + tile_w[c] * scale] += future.result() * wx[c][None, :, None]
+            band *= wy[r][:, None, None]
+
+            band_start = ys[r] * scale
+            if pending is not None:
+                shared = pending_start + len(pending) - band_start
+                band[:shared] += pending[len(pending) - shared:]
+                output[pending_start:band_start] = np.clip(pending[:len(pending) - shared] + 0.5, 0, 255)
+            pending, pending_start = band, band_start
+
+        output[pending_start:] = np.clip(pending + 0.5, 0, 255)
+
+    return encode_png(Image.fromarray(output))